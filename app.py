@@ -1,89 +1,123 @@
 from __future__ import annotations
 
+import os
+
 import streamlit as st
 import pandas as pd
 from streamlit_autorefresh import st_autorefresh
 
-from src.binance_api import build_merged_frame
-from src.features import add_returns, add_oi_change, add_zscores
-from src.scoring import compute_clp, compute_thresholds, add_regime
+from src import metrics
+from src.alerts import config_key, get_alert_engine, recent_alerts
+from src.bar_store import INTERVAL_MS
+from src.cache import cache_stats, cached_figure, cached_snapshot, raw_frames
+from src.collector import read_state
+from src.cross_section import get_cross_section, load_cross_section, universe_key
+from src.pipeline import compute_watchlist, rank_watchlist, regime_grid
+from src.panel import Panel, compute_panel
+from src.resample import MAX_BASE_BARS, base_interval, base_lookback, resample_frames, usable_timeframes
+from src.stream import get_stream
 from src.risk import crowding_index
-from src.state import append_snapshot, load_snapshots
-from src.viz import fig_price_and_clp, fig_components
-from src.insights import current_regime_streak, regime_time_share
+from src.state import ROLLUPS, append_snapshot, load_history, load_snapshots
+from src.symbol_state import as_frame
+from src.insights import regime_index
+from src.universe import MIN_QUOTE_VOLUME, candidates, cached_scan
 
 WATERMARK = "Parham Lilian"
+METRICS_FILE = os.environ.get("CLP_METRICS_FILE")
+MAX_CROSS_SECTION_BARS = 5000
+
+
+def symbol_counters(counters: pd.DataFrame) -> pd.DataFrame:
+    if counters.empty or "symbol" not in counters.columns:
+        return pd.DataFrame()
+    c = counters[counters["symbol"].fillna("") != ""]
+    result = c["result"] if "result" in c.columns else pd.Series(None, index=c.index)
+    parts = {
+        "requests": c["metric"] == "http_requests_total",
+        "bytes": c["metric"] == "http_response_bytes_total",
+        "retries": c["metric"] == "http_retries_total",
+        "cache_hits": (c["metric"] == "cache_requests_total") & (result == "hit"),
+        "cache_misses": (c["metric"] == "cache_requests_total") & (result == "miss"),
+    }
+    return pd.DataFrame({k: c[m].groupby("symbol")["value"].sum() for k, m in parts.items()}).fillna(0)
 
 
-@st.cache_data(ttl=30)
-def compute_one(
-    symbol: str,
-    interval: str,
-    lookback: int,
-    zwin: int,
-    wF: float,
-    wOI: float,
-    wR: float,
-    thr_mode: str,
-    p_stress: float,
-    p_extreme: float,
-    k_stress: float,
-    k_extreme: float,
-):
-    df = build_merged_frame(symbol=symbol, interval=interval, lookback_limit=lookback)
-    df = add_returns(df)
-    df = add_oi_change(df)
-    df = add_zscores(df, zwin=zwin)
-    df = compute_clp(df, w_funding=wF, w_oi=wOI, w_absret=wR)
-    df = df.dropna().copy()
-
-    if thr_mode == "percentile":
-        stress_thr, extreme_thr = compute_thresholds(
-            df["clp"], "percentile", p_stress=p_stress, p_extreme=p_extreme
-        )
-    else:
-        stress_thr, extreme_thr = compute_thresholds(
-            df["clp"], "std", k_stress=k_stress, k_extreme=k_extreme
-        )
+def render_diagnostics() -> None:
+    st.subheader("Diagnostics")
+    if not metrics.ENABLED:
+        st.info("Instrumentation is off (CLP_METRICS=0).")
+        return
+    st.caption("Totals for this server process since start (or the last reset), shared by all sessions.")
 
-    df = add_regime(df, stress_thr=stress_thr, extreme_thr=extreme_thr)
-    latest = df.iloc[-1]
-
-    snap = {
-        "symbol": symbol,
-        "price": float(latest["Close"]),
-        "funding": float(latest.get("fundingRate", float("nan"))),
-        "oi": float(latest.get("openInterest", float("nan"))),
-        "clp": float(latest["clp"]),
-        "regime": str(latest["regime"]),
-        "stress_thr": float(stress_thr),
-        "extreme_thr": float(extreme_thr),
-    }
-    return df, snap
+    timers = pd.DataFrame(metrics.timer_rows())
+    counters = pd.DataFrame(metrics.counter_rows())
+    if timers.empty:
+        st.info("Nothing measured yet.")
+    else:
+        stages = timers[timers["metric"] != "http_request_seconds"].copy()
+        stage = stages["stage"] if "stage" in stages.columns else pd.Series(index=stages.index, dtype=object)
+        stages["stage"] = stage.fillna(stages["metric"].str.removesuffix("_seconds"))
+        by_stage = stages.groupby("stage").agg(count=("count", "sum"), total_ms=("total_ms", "sum"), max_ms=("max_ms", "max"))
+        by_stage["mean_ms"] = by_stage["total_ms"] / by_stage["count"]
+        st.write("**Per stage**")
+        st.dataframe(by_stage.sort_values("total_ms", ascending=False), use_container_width=True)
+
+        http = timers[timers["metric"] == "http_request_seconds"]
+        if not http.empty:
+            by_ep = http.groupby("endpoint").agg(count=("count", "sum"), total_ms=("total_ms", "sum"), max_ms=("max_ms", "max"))
+            by_ep["mean_ms"] = by_ep["total_ms"] / by_ep["count"]
+            st.write("**HTTP by endpoint**")
+            st.dataframe(by_ep, use_container_width=True)
+
+    per_symbol = symbol_counters(counters)
+    if not per_symbol.empty:
+        st.write("**Per symbol**")
+        st.dataframe(per_symbol, use_container_width=True)
+
+    st.write("**Cache layers**")
+    st.dataframe(pd.DataFrame(cache_stats()), use_container_width=True)
+
+    text = metrics.prometheus_text()
+    with st.expander("Prometheus text"):
+        st.code(text, language="text")
+    c1, c2 = st.columns(2)
+    c1.download_button("Download metrics.prom", text, file_name="metrics.prom")
+    if c2.button("Reset counters"):
+        metrics.reset()
 
 
 def main():
     st.set_page_config(page_title="CLP Live Monitor", layout="wide")
 
-    st_autorefresh(interval=30_000, key="clp_refresh")
-
     st.title("CLP Live Monitor (Binance Futures)")
     st.caption("Funding + Open Interest + Price → crowding/leverage pressure. Auto-updates every 30 seconds.")
-    st.info("⏱ Auto-refresh ON — updates every 30 seconds (public endpoints, no API key).")
 
-    if "prev_regimes" not in st.session_state:
-        st.session_state["prev_regimes"] = {}
-    if "flip_log" not in st.session_state:
-        st.session_state["flip_log"] = []
+    if "last_alert_id" not in st.session_state:
+        st.session_state["last_alert_id"] = None
 
     with st.sidebar:
         st.header("Mode")
         simple_mode = st.toggle("Simple Mode (beginner-friendly)", value=True)
+        use_collector = st.toggle(
+            "Read from collector",
+            value=False,
+            help="Show the state written by `python -m src.collector` instead of fetching in this session.",
+        )
+        streaming = st.toggle(
+            "Live streaming (WebSocket)",
+            value=False,
+            help="Keep candles and funding current from Binance streams instead of refetching over REST.",
+        )
 
         st.divider()
         st.header("Watchlist")
 
         wF, wOI, wR = 0.5, 0.3, 0.2
+        panel_mode = False
+        thr_window = None
+        fast_charts = True
+        universe_mode = False
+        timeframes: list = []
 
         if simple_mode:
             preset = st.selectbox(
@@ -126,9 +160,33 @@ def main():
                 ["BTCUSDT", "ETHUSDT", "SOLUSDT", "BNBUSDT", "XRPUSDT"],
                 default=["BTCUSDT", "ETHUSDT", "SOLUSDT"],
             )
+            universe_mode = st.toggle(
+                "Universe scan",
+                value=False,
+                help="Rank every USDT perpetual from two bulk requests (funding + 24h ticker) "
+                     "and run the full CLP pipeline only on the top K.",
+            )
+            if universe_mode:
+                top_k = st.slider("Top K candidates", 5, 50, 15, 5)
+                min_qv = st.select_slider(
+                    "Min 24h volume (USDT)",
+                    options=[1e6, 5e6, MIN_QUOTE_VOLUME, 1e8, 5e8],
+                    value=MIN_QUOTE_VOLUME,
+                    format_func=lambda v: f"{v / 1e6:.0f}M",
+                )
 
             interval = st.selectbox("Interval", ["5m", "15m", "1h", "4h", "1d"], index=2)
-            lookback = st.slider("Lookback candles", 200, 800, 500, 50)
+            lookback = st.slider(
+                "Lookback candles", 200, 10_000, 500, 50,
+                help="Longer windows are backfilled page by page. Binance keeps only ~30 days of OI history.",
+            )
+            timeframes = st.multiselect(
+                "Timeframe grid",
+                ["5m", "15m", "1h", "4h", "1d"],
+                default=[],
+                help="Fetch only the smallest of these plus the chosen interval, derive the rest by "
+                     "resampling, and show the regime of every symbol on every timeframe.",
+            )
             zwin = st.slider("Z-score window", 60, 240, 120, 10)
 
             st.divider()
@@ -157,49 +215,183 @@ def main():
                 k_extreme = st.slider("Extreme = mean + k·std", 1.0, 5.0, 2.0, 0.1)
                 p_stress, p_extreme = 0.85, 0.95
 
+            thr_window_ui = st.radio(
+                "Window", ["Full history", "Expanding", "Rolling"], index=0, horizontal=True,
+                help="Expanding/Rolling give each bar thresholds from past bars only (no look-ahead). "
+                     "Expanding starts at the first bar of the lookback.",
+            )
+            if thr_window_ui == "Expanding":
+                thr_window = 0
+            elif thr_window_ui == "Rolling":
+                thr_window = st.slider("Threshold window (bars)", 100, 2000, 500, 50)
+
+            st.divider()
+            fast_charts = st.toggle(
+                "Fast charts",
+                value=True,
+                help="WebGL traces downsampled (LTTB) to about the chart's pixel width. Pick a chart window to see full detail.",
+            )
+            panel_mode = st.toggle(
+                "Panel compute",
+                value=False,
+                help="Align the whole watchlist on one time index and score every symbol in a single vectorized pass.",
+            )
+
         st.divider()
         keep_history = st.checkbox("Log snapshots to history", value=True)
 
-    tabs = st.tabs(["Dashboard", "History", "About"])
+    if use_collector:
+        st_autorefresh(interval=5_000, key="clp_refresh")
+        st.info("🛰 Collector mode — a background collector fetches and logs history; this view only reads its state.")
+    elif streaming:
+        st_autorefresh(interval=5_000, key="clp_refresh")
+        st.info("⚡ Streaming ON — candles and funding arrive over WebSocket; the view re-renders every 5 seconds.")
+    else:
+        st_autorefresh(interval=30_000, key="clp_refresh")
+        st.info("⏱ Auto-refresh ON — updates every 30 seconds (public endpoints, no API key).")
+
+    tabs = st.tabs(["Dashboard", "History", "Diagnostics", "About"])
 
     snapshots = []
     frames = {}
-
-    for sym in symbols:
-        try:
-            df, snap = compute_one(
-                sym, interval, lookback, zwin,
+    panel_res = None
+    universe_scan = None
+    grid = None
+
+    if use_collector:
+        state = read_state()
+        if state is None:
+            st.error("No collector state found. Start one with `python -m src.collector`.")
+            return
+        cfg = state["config"]
+        interval, lookback = cfg["interval"], cfg["lookback"]
+        wF, wOI, wR = cfg["wF"], cfg["wOI"], cfg["wR"]
+        snapshots, frames = state["snapshots"], state["frames"]
+        alert_config = config_key(cfg)
+        xs_universe = state.get("universe") or universe_key(cfg["symbols"])
+        keep_history = False
+        st.caption(f"Read-only view of the collector state from {state['updated']:%Y-%m-%d %H:%M:%S} UTC.")
+    else:
+        if universe_mode:
+            try:
+                universe_scan = cached_scan(top_k, min_qv, wF, wR)
+            except Exception as e:
+                st.error(f"Universe scan failed: {e}")
+                return
+            symbols = candidates(universe_scan)
+
+        feed, feed_lookback = interval, lookback
+        if timeframes:
+            usable = usable_timeframes(lookback, timeframes, interval, zwin)
+            dropped = sorted(set(timeframes) - set(usable), key=INTERVAL_MS.__getitem__)
+            if dropped:
+                st.warning(
+                    f"Left out of the timeframe grid: {', '.join(dropped)}. One feed holds at most "
+                    f"{MAX_BASE_BARS:,} bars, so with {lookback} candles a timeframe would get fewer "
+                    f"bars than the {zwin}-bar Z-score window."
+                )
+            timeframes = usable
+            feed, feed_lookback = base_interval(timeframes), base_lookback(lookback, timeframes)
+        if streaming:
+            raw, fetch_errors = get_stream(symbols, feed, feed_lookback).frames(feed_lookback)
+        else:
+            raw, fetch_errors = raw_frames(symbols, feed, feed_lookback)
+        if timeframes:
+            by_interval = resample_frames(raw, feed, timeframes, lookback)
+            raw = by_interval[interval]
+
+        if panel_mode:
+            with metrics.timer("stage_seconds", stage="panel"):
+                panel_res = compute_panel(
+                    Panel(raw), zwin,
+                    wF, wOI, wR,
+                    thr_mode, p_stress, p_extreme,
+                    k_stress, k_extreme,
+                    thr_window=thr_window,
+                )
+            snapshots.extend(panel_res.latest_snapshots())
+            snapshots.extend({"symbol": sym, "error": err} for sym, err in fetch_errors.items())
+        else:
+            snapshots, frames = compute_watchlist(
+                raw, fetch_errors, symbols, interval, zwin,
                 wF, wOI, wR,
                 thr_mode, p_stress, p_extreme,
-                k_stress, k_extreme
+                k_stress, k_extreme,
+                thr_window=thr_window,
+                compute=cached_snapshot,
             )
-            frames[sym] = df
-            snapshots.append(snap)
-        except Exception as e:
-            snapshots.append({"symbol": sym, "error": str(e)})
+        if timeframes:
+            # The other timeframes reuse the same fetch; only scoring runs per timeframe.
+            tf_snapshots = {}
+            for tf in timeframes:
+                tf_snapshots[tf] = snapshots if tf == interval else compute_watchlist(
+                    by_interval[tf], fetch_errors, symbols, tf, zwin,
+                    wF, wOI, wR,
+                    thr_mode, p_stress, p_extreme,
+                    k_stress, k_extreme,
+                    thr_window=thr_window,
+                    compute=cached_snapshot,
+                )[0]
+            grid = regime_grid(tf_snapshots)
+
+        alert_config = config_key({
+            "zwin": zwin, "wF": wF, "wOI": wOI, "wR": wR, "thr_mode": thr_mode,
+            "p_stress": p_stress, "p_extreme": p_extreme, "k_stress": k_stress, "k_extreme": k_extreme,
+            "thr_window": thr_window,
+        })
+        get_alert_engine().evaluate_watchlist(snapshots, interval, config=alert_config)
+        # Market-wide per-bar metrics for this universe and these settings; only bars
+        # since the last stored one are scored.
+        xs_universe = universe_key(symbols, top_k if universe_mode else 0)
+        history = get_cross_section(interval, xs_universe, alert_config)
+        with metrics.timer("stage_seconds", stage="cross_section"):
+            if panel_res is not None:
+                history.update_arrays(panel_res.times, panel_res.symbols, panel_res.clp, panel_res.regime)
+            else:
+                history.update(frames)
 
     watch = pd.DataFrame(snapshots)
 
+    # Rendered before the dashboard so it is still there when the dashboard bails out early.
+    with tabs[2]:
+        render_diagnostics()
+    if METRICS_FILE and metrics.ENABLED:
+        metrics.write_prometheus(METRICS_FILE)
+
     with tabs[0]:
         st.subheader("Cross-Asset Snapshot")
 
+        if universe_scan is not None:
+            n_liquid = int(universe_scan["liquid"].sum())
+            with st.expander(f"Universe prefilter — top {len(symbols)} of {n_liquid} liquid perpetuals"):
+                st.dataframe(
+                    universe_scan.head(50)[[
+                        "symbol", "candidate", "score", "z_funding", "z_absret",
+                        "lastFundingRate", "priceChangePercent", "quoteVolume",
+                    ]],
+                    use_container_width=True,
+                )
+
         if "error" in watch.columns and watch["error"].notna().any():
             st.warning("Some symbols failed to load:")
             st.dataframe(watch[watch["error"].notna()][["symbol", "error"]], use_container_width=True)
 
-        good = watch.drop(columns=["error"], errors="ignore")
+        good = rank_watchlist(watch)
         if good.empty or ("clp" not in good.columns):
             st.error("No valid data loaded. Try fewer symbols or a different interval.")
             return
 
-        good = good.sort_values("clp", ascending=False).reset_index(drop=True)
-        good["rank"] = range(1, len(good) + 1)
-
         ci = crowding_index(good["clp"])
         colA, colB, colC = st.columns(3)
         colA.metric("Market Avg CLP", f"{good['clp'].mean():.2f}")
         colB.metric("Crowding Index", f"{ci:.2f}" if pd.notna(ci) else "NA", help="mean(|CLP| top10%) / mean(|CLP|)")
         colC.metric("Tracked Symbols", str(len(good)))
+
+        xs = load_cross_section(interval, xs_universe, alert_config, limit=MAX_CROSS_SECTION_BARS)
+        if len(xs) > 1:
+            st.caption(f"Market crowding per {interval} bar (breadth = share of symbols in Stress/Extreme)")
+            st.line_chart(xs.set_index("time")[["crowding_index", "dispersion", "breadth"]], use_container_width=True)
+            st.caption("Top contributors by |CLP| on the latest bar: " + (xs["top_symbols"].iloc[-1] or "—"))
         extreme = good[good["clp"] > good["extreme_thr"]]
         stress = good[(good["clp"] > good["stress_thr"]) & (good["clp"] <= good["extreme_thr"])]
 
@@ -209,27 +401,28 @@ def main():
             st.warning("⚠️ STRESS detected in: " + ", ".join(stress["symbol"].tolist()))
         else:
             st.success("✅ No stress flags right now (based on auto thresholds).")
-        changes = []
-        for _, r in good.iterrows():
-            sym = r["symbol"]
-            prev = st.session_state["prev_regimes"].get(sym)
-            cur = r["regime"]
-            if prev is not None and prev != cur:
-                msg = f"{sym}: {prev} → {cur}"
-                changes.append(msg)
-                st.session_state["flip_log"].append(msg)
-            st.session_state["prev_regimes"][sym] = cur
-
-        if changes:
-            st.warning("Regime shift detected:\n" + "\n".join(changes))
+        # Flips are detected by the alert engine and read back from its persisted log; each
+        # session only keeps a cursor so it shows every new flip once.
+        flips = recent_alerts(limit=50, symbols=good["symbol"].tolist(), interval=interval, config=alert_config)
+        seen = st.session_state["last_alert_id"]
+        st.session_state["last_alert_id"] = max(seen or 0, int(flips["id"].max()) if not flips.empty else 0)
+        if seen is not None:
+            changes = [f"{r.symbol}: {r.from_regime} → {r.to_regime}" for r in flips[flips["id"] > seen].itertuples()]
+            if changes:
+                st.warning("Regime shift detected:\n" + "\n".join(changes))
 
         st.dataframe(
             good[["rank", "symbol", "price", "clp", "regime", "funding", "oi"]],
             use_container_width=True
         )
 
+        if grid is not None:
+            st.caption("Regime by timeframe (derived from one " + base_interval(timeframes) + " feed):")
+            st.dataframe(grid, use_container_width=True)
+
         if keep_history:
-            append_snapshot(good)
+            # Every open session scores the same watchlist; log one row per symbol per 30 s.
+            append_snapshot(good, every_ms=30_000)
 
         st.divider()
 
@@ -240,7 +433,7 @@ def main():
         st.divider()
         focus = st.selectbox("Focus symbol", options=good["symbol"].tolist(), index=0)
 
-        df_focus = frames.get(focus)
+        df_focus = panel_res.symbol_frame(focus) if panel_res is not None else as_frame(frames.get(focus))
         if df_focus is None or df_focus.empty:
             st.error("No data for selected focus symbol.")
             return
@@ -249,15 +442,41 @@ def main():
         stress_thr = float(row["stress_thr"])
         extreme_thr = float(row["extreme_thr"])
 
+        windows = {"All": None, "Last 2000 bars": 2000, "Last 500 bars": 500, "Last 150 bars": 150}
+        chart_window = st.radio("Chart window", list(windows), index=0, horizontal=True)
+        n_win = windows[chart_window]
+        x_range = None
+        if n_win is not None and len(df_focus) > n_win:
+            x_range = (df_focus["time"].iloc[-n_win], df_focus["time"].iloc[-1])
+        from src.viz import DEFAULT_MAX_POINTS, fig_components, fig_price_and_clp  # Plotly loads on first chart
+
+        max_points = DEFAULT_MAX_POINTS if fast_charts else None
+
+        price_cols = ["time", "Close", "clp"] + [c for c in ("stress_thr", "extreme_thr") if c in df_focus.columns]
+        comp_df = df_focus.tail(300)
         left, right = st.columns([2, 1])
         with left:
-            st.plotly_chart(fig_price_and_clp(df_focus, stress_thr, extreme_thr), use_container_width=True)
+            with metrics.timer("stage_seconds", stage="plot", symbol=focus):
+                fig = cached_figure(
+                    focus, "price_clp", df_focus, price_cols,
+                    lambda: fig_price_and_clp(df_focus, stress_thr, extreme_thr, max_points, x_range, gl=fast_charts),
+                    stress_thr, extreme_thr, max_points, x_range, fast_charts,
+                )
+            st.plotly_chart(fig, use_container_width=True)
         with right:
-            st.plotly_chart(fig_components(df_focus.tail(300)), use_container_width=True)
+            with metrics.timer("stage_seconds", stage="plot", symbol=focus):
+                fig = cached_figure(
+                    focus, "components", comp_df, ["time", "z_funding", "z_oi", "z_absret"],
+                    lambda: fig_components(comp_df, max_points, gl=fast_charts),
+                    max_points, fast_charts,
+                )
+            st.plotly_chart(fig, use_container_width=True)
         st.divider()
         st.subheader("Regime Time-in-State")
 
-        streak = current_regime_streak(df_focus)
+        # Kept across reruns, so it is keyed by everything that changes the regime codes.
+        ridx = regime_index(df_focus, key=(focus, interval, alert_config, lookback))
+        streak = ridx.current_streak()
         bars = int(streak["streak_bars"])
 
         interval_to_min = {"5m": 5, "15m": 15, "1h": 60, "4h": 240, "1d": 1440}
@@ -265,8 +484,14 @@ def main():
 
         st.metric("Current regime streak", f"{bars} bars (~{bars * mins} min)")
 
-        share = regime_time_share(df_focus, lookback=300)
+        share = ridx.time_share(lookback=300)
         st.dataframe(share, use_container_width=True)
+
+        with st.expander("Regime episodes"):
+            st.caption("Durations of completed episodes (bars):")
+            st.dataframe(ridx.duration_stats(), use_container_width=True)
+            st.caption("Transition probabilities between consecutive episodes:")
+            st.dataframe(ridx.transition_matrix().style.format("{:.0%}"), use_container_width=True)
         st.divider()
         st.subheader("Top Contributor (Why is CLP high right now?)")
 
@@ -287,27 +512,44 @@ def main():
         st.bar_chart(comp.set_index("component")["contribution"])
         st.dataframe(comp, use_container_width=True)
 
-        if st.session_state["flip_log"]:
+        if not flips.empty:
             st.subheader("Recent regime flips")
-            st.write(st.session_state["flip_log"][-8:])
+            st.dataframe(
+                flips.head(8)[["ts", "symbol", "from_regime", "to_regime", "clp"]],
+                use_container_width=True, hide_index=True,
+            )
 
         st.caption(f"© {WATERMARK} — CLP is a heuristic monitoring index (not financial advice).")
 
     with tabs[1]:
-        st.subheader("Snapshot History (from snapshots.csv)")
-        hist = load_snapshots()
+        st.subheader("Snapshot History (from snapshots.db)")
+        range_hours = {"Last 6h": 6, "Last 24h": 24, "Last 7d": 24 * 7, "Last 30d": 24 * 30, "All": None}
+        c1, c2, c3 = st.columns(3)
+        hist_range = c1.selectbox("Range", list(range_hours), index=1)
+        hist_res = c2.selectbox("Resolution", ["Auto", *ROLLUPS], index=0)
+        hist_stat = c3.selectbox("CLP per bucket", ["last", "mean", "max", "min"], index=0)
+        hist, res = load_history(
+            hours=range_hours[hist_range],
+            resolution=None if hist_res == "Auto" else hist_res,
+        )
 
         if hist.empty:
             st.info("No history yet. Enable 'Log snapshots to history' and wait a few refresh cycles.")
         else:
-            pivot = hist.pivot_table(index="timestamp", columns="symbol", values="clp")
-            st.line_chart(pivot.tail(150), use_container_width=True)
+            pivot = hist.pivot(index="bucket", columns="symbol", values=f"clp_{hist_stat}")
+            st.caption(f"{len(pivot)} buckets at {res} resolution.")
+            st.line_chart(pivot, use_container_width=True)
+
+            share = hist.groupby("symbol")[["n_normal", "n_stress", "n_extreme"]].sum()
+            share = share.div(share.sum(axis=1), axis=0).rename(columns=lambda c: c.removeprefix("n_").title())
+            st.caption("Share of snapshots per regime in this range:")
+            st.dataframe(share, use_container_width=True)
 
             st.divider()
             st.caption("Raw snapshot rows (tail):")
-            st.dataframe(hist.tail(200), use_container_width=True)
+            st.dataframe(load_snapshots(hours=range_hours[hist_range], limit=200), use_container_width=True)
 
-    with tabs[2]:
+    with tabs[3]:
         st.header("About")
         st.write(
             """
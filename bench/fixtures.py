@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.bar_store import INTERVAL_MS, OI_HIST_MAX_AGE_MS
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+FUNDING_MS = 8 * 3_600_000
+
+
+def fixture_path(fixture_dir: str, symbol: str, interval: str) -> str:
+    return os.path.join(fixture_dir, f"{symbol}_{interval}.json")
+
+
+def save_fixture(fixture_dir: str, symbol: str, interval: str, fx: Dict[str, list]) -> str:
+    os.makedirs(fixture_dir, exist_ok=True)
+    path = fixture_path(fixture_dir, symbol, interval)
+    with open(path, "w") as f:
+        json.dump(fx, f)
+    return path
+
+
+def load_fixtures(fixture_dir: str, interval: str) -> Dict[str, Dict[str, list]]:
+    suffix = f"_{interval}.json"
+    out = {}
+    for name in sorted(os.listdir(fixture_dir)):
+        if name.endswith(suffix):
+            with open(os.path.join(fixture_dir, name)) as f:
+                out[name[: -len(suffix)]] = json.load(f)
+    return out
+
+
+def synthesize(symbol: str, interval: str, bars: int, seed: int = 0, end_ms: Optional[int] = None) -> Dict[str, list]:
+    # Raw Binance payloads (same field layout as the live endpoints) for a random walk.
+    step = INTERVAL_MS[interval]
+    end_ms = end_ms if end_ms is not None else int(time.time() * 1000) // step * step
+    rng = np.random.default_rng(seed)
+    t = end_ms - step * np.arange(bars - 1, -1, -1, dtype=np.int64)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(0, 0.004, bars)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.002, bars))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.002, bars))
+    vol = rng.uniform(100, 1000, bars)
+    klines = [
+        [int(t[i]), f"{open_[i]:.6f}", f"{high[i]:.6f}", f"{low[i]:.6f}", f"{close[i]:.6f}", f"{vol[i]:.3f}",
+         int(t[i] + step - 1), "0", 100, "0", "0", "0"]
+        for i in range(bars)
+    ]
+
+    ft = np.arange(t[0] // FUNDING_MS * FUNDING_MS + FUNDING_MS, end_ms + 1, FUNDING_MS, dtype=np.int64)
+    rates = 1e-4 + np.cumsum(rng.normal(0, 2e-5, len(ft)))
+    funding = [{"symbol": symbol, "fundingTime": int(ft[i]), "fundingRate": f"{rates[i]:.8f}"} for i in range(len(ft))]
+
+    oi_start = max(int(t[0]), end_ms - OI_HIST_MAX_AGE_MS)
+    ot = t[t >= oi_start]
+    oi = 1e6 * np.exp(np.cumsum(rng.normal(0, 0.002, len(ot))))
+    oi_rows = [{"symbol": symbol, "timestamp": int(ot[i]), "sumOpenInterest": f"{oi[i]:.3f}"} for i in range(len(ot))]
+    return {"klines": klines, "funding": funding, "oi": oi_rows}
+
+
+def _fetch_all(session, url: str, params: dict, page: int, key, step_ms: int, start_ms: int) -> List:
+    rows: List = []
+    start = start_ms
+    while True:
+        r = session.get(url, params={**params, "startTime": start, "limit": page}, timeout=15)
+        r.raise_for_status()
+        data = r.json()
+        rows.extend(data)
+        if len(data) < page:
+            return rows
+        start = key(data[-1]) + step_ms
+
+
+def record(symbol: str, interval: str, bars: int, base: str = "https://fapi.binance.com") -> Dict[str, list]:
+    # Snapshot the live endpoints once so later benchmark runs can replay them offline.
+    import requests
+
+    step = INTERVAL_MS[interval]
+    end_ms = int(time.time() * 1000)
+    start_ms = end_ms - bars * step
+    s = requests.Session()
+    return {
+        "klines": _fetch_all(s, f"{base}/fapi/v1/klines", {"symbol": symbol, "interval": interval},
+                             1500, lambda k: k[0], step, start_ms),
+        "funding": _fetch_all(s, f"{base}/fapi/v1/fundingRate", {"symbol": symbol},
+                              1000, lambda k: k["fundingTime"], 1, start_ms),
+        "oi": _fetch_all(s, f"{base}/futures/data/openInterestHist", {"symbol": symbol, "period": interval},
+                         500, lambda k: k["timestamp"], step, max(start_ms, end_ms - OI_HIST_MAX_AGE_MS + step)),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    p = argparse.ArgumentParser(description="Create benchmark fixtures (recorded or synthetic Binance payloads).")
+    p.add_argument("action", choices=["record", "synth"])
+    p.add_argument("--symbols", default="BTCUSDT,ETHUSDT,SOLUSDT,BNBUSDT,XRPUSDT")
+    p.add_argument("--interval", default="1h")
+    p.add_argument("--bars", type=int, default=10_500)
+    p.add_argument("--dir", default=FIXTURE_DIR)
+    args = p.parse_args(argv)
+
+    for i, sym in enumerate(s.strip().upper() for s in args.symbols.split(",") if s.strip()):
+        fx = record(sym, args.interval, args.bars) if args.action == "record" else synthesize(sym, args.interval, args.bars, seed=i)
+        path = save_fixture(args.dir, sym, args.interval, fx)
+        print(f"{path}: {len(fx['klines'])} klines, {len(fx['funding'])} funding, {len(fx['oi'])} oi")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from bench.fixtures import FIXTURE_DIR, load_fixtures
+from src.bar_store import INTERVAL_MS
+from src.scheduler import request_weight
+
+ROUTES = {
+    "/fapi/v1/klines": ("klines", 1500),
+    "/fapi/v1/fundingRate": ("funding", 1000),
+    "/futures/data/openInterestHist": ("oi", 500),
+}
+BULK_ROUTES = {"/fapi/v1/exchangeInfo", "/fapi/v1/premiumIndex", "/fapi/v1/ticker/24hr"}
+
+
+class _Series:
+    def __init__(self, rows: list, times: List[int]):
+        self.rows = rows
+        self.times = np.asarray(times, dtype=np.int64)
+
+    def select(self, limit: int, start: Optional[int], end: Optional[int]) -> list:
+        hi = len(self.times) if end is None else int(np.searchsorted(self.times, end, side="right"))
+        if start is None:
+            return self.rows[max(0, hi - limit):hi]
+        lo = int(np.searchsorted(self.times, start))
+        return self.rows[lo:min(hi, lo + limit)]
+
+
+def _anchor(fx: Dict[str, list], step: int, now_ms: int) -> Dict[str, _Series]:
+    # Shift a recorded fixture so its last candle is the currently open one.
+    shift = (now_ms // step * step) - fx["klines"][-1][0]
+    klines = [[k[0] + shift, *k[1:6], k[6] + shift, *k[7:]] for k in fx["klines"]]
+    funding = [{**f, "fundingTime": f["fundingTime"] + shift} for f in fx["funding"]]
+    oi = [{**o, "timestamp": o["timestamp"] + shift} for o in fx["oi"]]
+    return {
+        "klines": _Series(klines, [k[0] for k in klines]),
+        "funding": _Series(funding, [f["fundingTime"] for f in funding]),
+        "oi": _Series(oi, [o["timestamp"] for o in oi]),
+    }
+
+
+class MockBinance:
+    # Local stand-in for the three USD-M endpoints the refresh path uses. Any symbol is
+    # served from one of the fixtures (by hash), so a handful of recordings covers
+    # watchlists of hundreds of symbols.
+    def __init__(
+        self,
+        interval: str = "1h",
+        fixture_dir: str = FIXTURE_DIR,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: int = 0,
+        universe: int = 300,
+    ):
+        fixtures = load_fixtures(fixture_dir, interval)
+        if not fixtures:
+            raise FileNotFoundError(f"no {interval} fixtures in {fixture_dir} (run python -m bench.fixtures synth)")
+        now_ms = int(time.time() * 1000)
+        self.interval = interval
+        self.series = {sym: _anchor(fx, INTERVAL_MS[interval], now_ms) for sym, fx in fixtures.items()}
+        self.templates = list(self.series)
+        # Symbols listed by the bulk endpoints (exchangeInfo, premiumIndex, ticker/24hr).
+        self.universe = self.templates + [f"SYM{i:03d}USDT" for i in range(universe)]
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._minute = 0
+        self._weight = 0
+        self._settled: Dict[str, list] = {}  # funding rows added by settle(), per symbol
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def template(self, symbol: str) -> Dict[str, _Series]:
+        s = self.series.get(symbol)
+        return s if s is not None else self.series[self.templates[zlib.crc32(symbol.encode()) % len(self.templates)]]
+
+    def settle(self, symbol: str, funding_time: int, rate: float) -> None:
+        # Publish a settled funding rate (e.g. from bench.stream_server) on /fapi/v1/fundingRate.
+        with self._lock:
+            self._settled.setdefault(symbol, []).append(
+                {"symbol": symbol, "fundingTime": funding_time, "fundingRate": f"{rate:.8f}"}
+            )
+
+    def _account(self, weight: int) -> tuple[int, bool]:
+        with self._lock:
+            self.requests += 1
+            minute = int(time.time() // 60)
+            if minute != self._minute:
+                self._minute, self._weight = minute, 0
+            self._weight += weight
+            fail = self._rng.random() < self.error_rate
+            self.errors += fail
+            return self._weight, fail
+
+    def _bulk(self, path: str) -> object:
+        if path == "/fapi/v1/exchangeInfo":
+            return {"symbols": [
+                {"symbol": sym, "contractType": "PERPETUAL", "status": "TRADING", "quoteAsset": "USDT"}
+                for sym in self.universe
+            ]}
+        day = max(1, 86_400_000 // INTERVAL_MS[self.interval])
+        out = []
+        for sym in self.universe:
+            s = self.template(sym)
+            # Per-symbol tilt so symbols sharing a fixture do not tie.
+            tilt = 0.5 + (zlib.crc32(sym.encode()) % 1000) / 1000
+            last, prev = s["klines"].rows[-1], s["klines"].rows[max(0, len(s["klines"].rows) - 1 - day)]
+            close, close_24h = float(last[4]), float(prev[4])
+            if path == "/fapi/v1/premiumIndex":
+                out.append({
+                    "symbol": sym, "markPrice": f"{close:.6f}", "indexPrice": f"{close:.6f}",
+                    "lastFundingRate": f"{float(s['funding'].rows[-1]['fundingRate']) * tilt:.8f}",
+                    "time": int(time.time() * 1000),
+                })
+            else:
+                vol = sum(float(k[5]) * float(k[4]) for k in s["klines"].rows[-day:])
+                out.append({
+                    "symbol": sym, "lastPrice": f"{close:.6f}",
+                    "priceChangePercent": f"{(close / close_24h - 1) * 100 * tilt:.3f}",
+                    "quoteVolume": f"{vol * 1e3 * tilt:.2f}",
+                })
+        return out
+
+    def respond(self, path: str, query: Dict[str, str]) -> tuple[int, dict, bytes]:
+        route = ROUTES.get(path)
+        if route is None and path not in BULK_ROUTES:
+            return 404, {}, b'{"code":-1,"msg":"unknown endpoint"}'
+        used, fail = self._account(request_weight(path, query))
+        headers = {"X-MBX-USED-WEIGHT-1M": str(used)}
+        if fail:
+            if self.error_status in (418, 429):
+                headers["Retry-After"] = "1"
+            return self.error_status, headers, b'{"code":-1,"msg":"injected error"}'
+
+        if route is None:
+            return 200, headers, json.dumps(self._bulk(path)).encode()
+        key, max_limit = route
+        interval = query.get("interval") or query.get("period")
+        if interval is not None and interval != self.interval:
+            return 400, headers, b'{"code":-1120,"msg":"fixture interval mismatch"}'
+        limit = min(int(query.get("limit", 500)), max_limit)
+        start = int(query["startTime"]) if "startTime" in query else None
+        end = int(query["endTime"]) if "endTime" in query else None
+        symbol = query.get("symbol", "")
+        rows = self.template(symbol)[key].select(limit, start, end)
+        if key == "funding" and symbol in self._settled:
+            with self._lock:
+                extra = [r for r in self._settled[symbol]
+                         if (start is None or r["fundingTime"] >= start) and (end is None or r["fundingTime"] <= end)]
+            rows = (rows + extra)[:limit] if start is not None else (rows + extra)[-limit:]
+        return 200, headers, json.dumps(rows).encode()
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                if mock.latency or mock.jitter:
+                    time.sleep(mock.latency + mock._rng.random() * mock.jitter)
+                u = urlparse(self.path)
+                status, headers, body = mock.respond(u.path, {k: v[0] for k, v in parse_qs(u.query).items()})
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def start(self) -> "MockBinance":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="mock-binance", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "MockBinance":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    p = argparse.ArgumentParser(description="Serve benchmark fixtures as a local Binance USD-M mock.")
+    p.add_argument("--interval", default="1h")
+    p.add_argument("--dir", default=FIXTURE_DIR)
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    p.add_argument("--jitter", type=float, default=0.0, help="extra uniform random delay, seconds")
+    p.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with --error-status")
+    p.add_argument("--error-status", type=int, default=503)
+    p.add_argument("--universe", type=int, default=300, help="synthetic symbols listed by the bulk endpoints")
+    args = p.parse_args(argv)
+
+    mock = MockBinance(
+        args.interval, args.dir,
+        latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, error_status=args.error_status,
+        port=args.port, universe=args.universe,
+    )
+    print(f"serving {len(mock.templates)} {args.interval} fixtures on {mock.url} (CLP_FAPI_BASE={mock.url})")
+    mock.server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bench.fixtures import FIXTURE_DIR, load_fixtures, save_fixture, synthesize
+from bench.mock_server import MockBinance
+from src import binance_api
+from src.bar_store import clear_stores
+from src.features import clear_engines, streaming_features
+from src.panel import Panel, compute_panel
+from src.pipeline import compute_snapshot, compute_watchlist
+from src.scheduler import get_budget
+
+STAGES = ["fetch_cold", "fetch_warm", "features", "score", "refresh", "panel"]
+PARAMS = dict(zwin=120, wF=0.5, wOI=0.3, wR=0.2, thr_mode="percentile",
+              p_stress=0.85, p_extreme=0.95, k_stress=1.0, k_extreme=2.0)
+
+
+def _measure(fn: Callable[[], object], trace: bool) -> Tuple[float, Optional[int], object]:
+    gc.collect()
+    if trace:
+        tracemalloc.reset_peak()
+    t0 = time.perf_counter()
+    out = fn()
+    dt = time.perf_counter() - t0
+    return dt, tracemalloc.get_traced_memory()[1] if trace else None, out
+
+
+def _frames(res: Dict[str, object]) -> Dict[str, object]:
+    errors = {s: r for s, r in res.items() if isinstance(r, Exception)}
+    if errors:
+        sym, err = next(iter(errors.items()))
+        raise RuntimeError(f"{len(errors)} symbols failed, e.g. {sym}: {err}")
+    return res
+
+
+def run_case(symbols: List[str], interval: str, lookback: int, trace: bool = False) -> Dict[str, Tuple[float, Optional[int]]]:
+    # One cold refresh end to end, then the steady-state (warm) refresh.
+    clear_stores()
+    clear_engines()
+    out: Dict[str, Tuple[float, Optional[int]]] = {}
+
+    def stage(name: str, fn: Callable[[], object]) -> object:
+        dt, peak, res = _measure(fn, trace)
+        out[name] = (dt, peak)
+        return res
+
+    fetch = lambda: _frames(binance_api.build_merged_frames(symbols, interval=interval, lookback_limit=lookback))
+    stage("fetch_cold", fetch)
+    frames = stage("fetch_warm", fetch)
+    feats = stage("features", lambda: {
+        s: streaming_features(df, key=(s, interval), zwin=PARAMS["zwin"]) for s, df in frames.items()
+    })
+    p = PARAMS
+    stage("score", lambda: [
+        compute_snapshot(s, interval, df, p["zwin"], p["wF"], p["wOI"], p["wR"], p["thr_mode"],
+                         p["p_stress"], p["p_extreme"], p["k_stress"], p["k_extreme"], feats=feats[s])
+        for s, df in frames.items()
+    ])
+    stage("refresh", lambda: compute_watchlist(
+        frames, {}, symbols, interval, p["zwin"], p["wF"], p["wOI"], p["wR"], p["thr_mode"],
+        p["p_stress"], p["p_extreme"], p["k_stress"], p["k_extreme"],
+    ))
+    stage("panel", lambda: compute_panel(
+        Panel(frames), p["zwin"], p["wF"], p["wOI"], p["wR"], p["thr_mode"],
+        p["p_stress"], p["p_extreme"], p["k_stress"], p["k_extreme"],
+    ))
+    return out
+
+
+def ensure_fixtures(fixture_dir: str, interval: str, bars: int, n: int = 5) -> None:
+    have = load_fixtures(fixture_dir, interval) if os.path.isdir(fixture_dir) else {}
+    if have and min(len(fx["klines"]) for fx in have.values()) >= bars:
+        return
+    for i in range(n):
+        save_fixture(fixture_dir, f"SYN{i}USDT", interval, synthesize(f"SYN{i}USDT", interval, bars, seed=i))
+
+
+def _ints(s: str) -> List[int]:
+    return [int(x) for x in s.split(",") if x.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    p = argparse.ArgumentParser(description="Benchmark the refresh path against a local Binance mock.")
+    p.add_argument("--symbols", default="1,30,300", help="watchlist sizes")
+    p.add_argument("--lookbacks", default="200,2000,10000", help="lookback sizes in bars")
+    p.add_argument("--interval", default="1h")
+    p.add_argument("--repeat", type=int, default=3, help="timed runs per case (median is reported)")
+    p.add_argument("--latency", type=float, default=0.0)
+    p.add_argument("--jitter", type=float, default=0.0)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--error-status", type=int, default=503)
+    p.add_argument("--weight-limit", type=int, default=0,
+                   help="client weight budget per minute (0 = unlimited, 2400 = Binance default)")
+    p.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    p.add_argument("--fixtures", default=FIXTURE_DIR)
+    p.add_argument("--out", default=None, help="also write the report to this file")
+    args = p.parse_args(argv)
+
+    sizes, lookbacks = _ints(args.symbols), _ints(args.lookbacks)
+    ensure_fixtures(args.fixtures, args.interval, max(lookbacks) + 200)
+    if args.weight_limit:
+        get_budget().limit = args.weight_limit
+    else:
+        get_budget().limit = 10 ** 12
+
+    mock = MockBinance(
+        args.interval, args.fixtures,
+        latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, error_status=args.error_status,
+    ).start()
+    binance_api.FAPI_BASE = mock.url
+
+    lines = [
+        f"# interval={args.interval} repeat={args.repeat} latency={args.latency}s jitter={args.jitter}s "
+        f"error_rate={args.error_rate} weight_limit={args.weight_limit or 'unlimited'}",
+        f"{'symbols':>7} {'lookback':>8} " + " ".join(f"{s + '_ms':>14}" for s in STAGES),
+    ]
+    if not args.no_memory:
+        lines[-1] += "  " + " ".join(f"{s + '_MB':>14}" for s in STAGES)
+    print("\n".join(lines), flush=True)
+    try:
+        for n in sizes:
+            symbols = [f"SYM{i:03d}USDT" for i in range(n)]
+            for lookback in lookbacks:
+                runs = [run_case(symbols, args.interval, lookback) for _ in range(args.repeat)]
+                row = f"{n:>7} {lookback:>8} " + " ".join(
+                    f"{statistics.median(r[s][0] for r in runs) * 1000:>14.1f}" for s in STAGES
+                )
+                if not args.no_memory:
+                    tracemalloc.start()
+                    try:
+                        mem = run_case(symbols, args.interval, lookback, trace=True)
+                    finally:
+                        tracemalloc.stop()
+                    row += "  " + " ".join(f"{mem[s][1] / 2 ** 20:>14.1f}" for s in STAGES)
+                lines.append(row)
+                print(row, flush=True)
+    finally:
+        mock.stop()
+    lines.append(f"# mock served {mock.requests} requests ({mock.errors} injected errors)")
+    print(lines[-1])
+
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
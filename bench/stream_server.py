@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import argparse
+import base64
+import hashlib
+import json
+import math
+import random
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from bench.fixtures import FIXTURE_DIR, FUNDING_MS
+from bench.mock_server import MockBinance
+from src.bar_store import INTERVAL_MS
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def _send_frame(sock: socket.socket, payload: bytes, opcode: int = 0x1) -> None:
+    n = len(payload)
+    if n < 126:
+        head = struct.pack("!BB", 0x80 | opcode, n)
+    elif n < 1 << 16:
+        head = struct.pack("!BBH", 0x80 | opcode, 126, n)
+    else:
+        head = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+    sock.sendall(head + payload)
+
+
+def _recv_exact(f, n: int) -> bytes:
+    data = f.read(n)
+    if len(data) < n:
+        raise ConnectionError("client went away")
+    return data
+
+
+def _recv_frame(f) -> Tuple[int, bytes]:
+    b0, b1 = _recv_exact(f, 2)
+    n = b1 & 0x7F
+    if n == 126:
+        n = struct.unpack("!H", _recv_exact(f, 2))[0]
+    elif n == 127:
+        n = struct.unpack("!Q", _recv_exact(f, 8))[0]
+    mask = _recv_exact(f, 4) if b1 & 0x80 else b"\0\0\0\0"
+    data = _recv_exact(f, n)
+    return b0 & 0x0F, bytes(c ^ mask[i % 4] for i, c in enumerate(data))
+
+
+class _Candle:
+    # The open candle of one symbol. Intrabar moves replay the fixture's bar-to-bar
+    # returns, scaled down to the tick period, so every symbol keeps its recorded character.
+    def __init__(self, rows: list, iv: int, period: float, funding_rate: float, funding_time: int):
+        last = rows[-1]
+        self.t = int(last[0])
+        self.o, self.h, self.l, self.c, self.v = (float(x) for x in last[1:6])
+        closes = [float(k[4]) for k in rows]
+        self.returns = [math.log(b / a) for a, b in zip(closes, closes[1:]) if a > 0 and b > 0] or [0.0]
+        self.volume = sum(float(k[5]) for k in rows) / len(rows)
+        self.scale = math.sqrt(period * 1000 / iv)
+        self.share = period * 1000 / iv
+        self.cursor = 0
+        self.rate = funding_rate
+        self.next_funding = funding_time
+
+    def step(self, now_ms: int, iv: int) -> None:
+        bar = now_ms // iv * iv
+        if bar > self.t:
+            self.t, self.o, self.h, self.l, self.v = bar, self.c, self.c, self.c, 0.0
+        self.c *= math.exp(self.returns[self.cursor] * self.scale)
+        self.cursor = (self.cursor + 1) % len(self.returns)
+        self.h, self.l = max(self.h, self.c), min(self.l, self.c)
+        self.v += self.volume * self.share
+
+
+class MockStream:
+    # Local stand-in for the fstream combined kline + markPrice@1s streams, on top of a
+    # MockBinance so both sides serve the same fixtures. Every `period` seconds each
+    # subscribed symbol gets a kline update of its open candle and a markPriceUpdate with
+    # the predicted funding rate. When a funding time passes (every 8h, or every
+    # funding_every seconds), markPriceUpdate moves on to the next one and the mock's
+    # fundingRate endpoint starts returning the settled rate, which differs slightly from
+    # the last predicted one, as on the exchange.
+    def __init__(
+        self,
+        mock: MockBinance,
+        period: float = 1.0,
+        funding_every: float = 0.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: int = 0,
+    ):
+        self.mock = mock
+        self.interval = mock.interval
+        self.iv = INTERVAL_MS[mock.interval]
+        self.period = period
+        self.funding_ms = int(funding_every * 1000) or FUNDING_MS
+        self.messages = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._candles: Dict[str, _Candle] = {}
+        self._clients: Dict[socket.socket, List[str]] = {}
+        self._stop = threading.Event()
+        self.server = socketserver.ThreadingTCPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"ws://{host}:{port}"
+
+    def _candle(self, symbol: str) -> _Candle:
+        c = self._candles.get(symbol)
+        if c is None:
+            s = self.mock.template(symbol)
+            funding = s["funding"].rows
+            rate = float(funding[-1]["fundingRate"]) if funding else 0.0001
+            next_time = (int(time.time() * 1000) // self.funding_ms + 1) * self.funding_ms
+            c = self._candles[symbol] = _Candle(s["klines"].rows, self.iv, self.period, rate, next_time)
+        return c
+
+    def _funding(self, symbol: str, c: _Candle, now_ms: int) -> None:
+        if now_ms >= c.next_funding:
+            # Settles close to, but not exactly at, the last predicted rate.
+            self.mock.settle(symbol, c.next_funding, c.rate + self._rng.gauss(0, 2e-6))
+            c.next_funding += self.funding_ms
+        c.rate += self._rng.gauss(0, 5e-7)
+
+    def _events(self, names: List[str], now_ms: int) -> List[bytes]:
+        out = []
+        for name in names:
+            sym, _, kind = name.partition("@")
+            sym = sym.upper()
+            c = self._candles[sym]
+            if kind.startswith("kline_"):
+                data = {"e": "kline", "E": now_ms, "s": sym, "k": {
+                    "t": c.t, "T": c.t + self.iv - 1, "s": sym, "i": self.interval,
+                    "o": f"{c.o:.6f}", "h": f"{c.h:.6f}", "l": f"{c.l:.6f}", "c": f"{c.c:.6f}",
+                    "v": f"{c.v:.3f}", "x": False,
+                }}
+            elif kind.startswith("markPrice"):
+                data = {"e": "markPriceUpdate", "E": now_ms, "s": sym, "p": f"{c.c:.6f}",
+                        "r": f"{c.rate:.8f}", "T": c.next_funding}
+            else:
+                continue
+            out.append(json.dumps({"stream": name, "data": data}).encode())
+        return out
+
+    def _tick(self) -> None:
+        now_ms = int(time.time() * 1000)
+        with self._lock:
+            clients = list(self._clients.items())
+            for sym in {n.partition("@")[0].upper() for _, names in clients for n in names}:
+                c = self._candle(sym)
+                c.step(now_ms, self.iv)
+                self._funding(sym, c, now_ms)
+            batches = [(sock, self._events(names, now_ms)) for sock, names in clients]
+        for sock, events in batches:
+            try:
+                for e in events:
+                    _send_frame(sock, e)
+                self.messages += len(events)
+            except OSError:
+                with self._lock:
+                    self._clients.pop(sock, None)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.period):
+            self._tick()
+
+    def _handler(self):
+        stream = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                headers = {}
+                self.rfile.readline()
+                while True:
+                    line = self.rfile.readline().decode("latin-1").strip()
+                    if not line:
+                        break
+                    k, _, v = line.partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                key = headers.get("sec-websocket-key")
+                if key is None:
+                    self.wfile.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+                    return
+                accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+                self.wfile.write(
+                    "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                    f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+                )
+                try:
+                    while True:
+                        opcode, data = _recv_frame(self.rfile)
+                        if opcode == 0x8:
+                            _send_frame(self.request, data[:2], opcode=0x8)
+                            break
+                        if opcode == 0x9:
+                            _send_frame(self.request, data, opcode=0xA)
+                        elif opcode == 0x1:
+                            msg = json.loads(data)
+                            if msg.get("method") == "SUBSCRIBE":
+                                with stream._lock:
+                                    for name in msg["params"]:
+                                        stream._candle(name.partition("@")[0].upper())
+                                    stream._clients.setdefault(self.request, []).extend(msg["params"])
+                                _send_frame(self.request, json.dumps({"result": None, "id": msg.get("id")}).encode())
+                except (ConnectionError, OSError, ValueError):
+                    pass
+                finally:
+                    with stream._lock:
+                        stream._clients.pop(self.request, None)
+
+        return Handler
+
+    def start(self) -> "MockStream":
+        threading.Thread(target=self.server.serve_forever, name="mock-stream", daemon=True).start()
+        threading.Thread(target=self._run, name="mock-stream-tick", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "MockStream":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    p = argparse.ArgumentParser(description="Replay benchmark fixtures as local Binance USD-M REST + WebSocket mocks.")
+    p.add_argument("--interval", default="1h")
+    p.add_argument("--dir", default=FIXTURE_DIR)
+    p.add_argument("--port", type=int, default=8765, help="REST port")
+    p.add_argument("--ws-port", type=int, default=8766)
+    p.add_argument("--period", type=float, default=1.0, help="seconds between updates per symbol")
+    p.add_argument("--funding-every", type=float, default=0.0,
+                   help="settle a funding time every this many seconds instead of every 8h")
+    args = p.parse_args(argv)
+
+    mock = MockBinance(args.interval, args.dir, port=args.port).start()
+    stream = MockStream(mock, args.period, args.funding_every, port=args.ws_port)
+    print(f"serving {len(mock.templates)} {args.interval} fixtures (CLP_FAPI_BASE={mock.url} CLP_FSTREAM_BASE={stream.url})")
+    stream.start()
+    try:
+        stream._stop.wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import importlib
+
+# Headless entry points, imported on first use so `import src` stays cheap and a service
+# that only needs the signal never loads Streamlit or Plotly (only src.viz and app.py do).
+_EXPORTS = {
+    "build_merged_frames": "src.binance_api",
+    "compute_snapshot": "src.pipeline",
+    "compute_watchlist": "src.pipeline",
+    "rank_watchlist": "src.pipeline",
+    "score_watchlist": "src.api",
+    "SnapshotStore": "src.api",
+    "SnapshotServer": "src.api",
+    "Collector": "src.collector",
+    "read_state": "src.collector",
+    "load_history": "src.state",
+    "load_cross_section": "src.cross_section",
+    "recent_alerts": "src.alerts",
+}
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module 'src' has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,365 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+import requests
+
+from src import metrics
+from src.scoring import REGIMES
+from src.state import SNAPSHOT_DB
+
+ALERT_SINKS = os.environ.get("CLP_ALERT_SINKS", "")
+
+log = logging.getLogger("clp.alerts")
+
+Alert = Dict[str, object]
+Sink = Callable[[Alert], None]
+
+
+def format_alert(a: Alert) -> str:
+    return f"{a['symbol']} {a['interval']}: {a['from']} → {a['to']} (CLP {a['clp']:+.2f})"
+
+
+class StdoutSink:
+    name = "stdout"
+
+    def __call__(self, alert: Alert) -> None:
+        print(f"[{pd.Timestamp(alert['time'], unit='ms', tz='UTC'):%Y-%m-%d %H:%M:%S}] {format_alert(alert)}", flush=True)
+
+
+class FileSink:
+    # One JSON object per line.
+    name = "file"
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def __call__(self, alert: Alert) -> None:
+        line = json.dumps(alert) + "\n"
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+class WebhookSink:
+    name = "webhook"
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def __call__(self, alert: Alert) -> None:
+        self.session.post(self.url, json=alert, timeout=self.timeout).raise_for_status()
+
+
+def make_sink(spec: str) -> Sink:
+    # "stdout", "file:<path>" or "webhook:<url>".
+    kind, _, arg = spec.partition(":")
+    if kind == "stdout":
+        return StdoutSink()
+    if kind == "file" and arg:
+        return FileSink(arg)
+    if kind == "webhook" and arg:
+        return WebhookSink(arg)
+    raise ValueError(f"unknown alert sink {spec!r}; use stdout, file:<path> or webhook:<url>")
+
+
+# The scoring settings a regime depends on. Alerts and the confirmed regime are kept per
+# settings hash, so sessions scoring the same symbol differently never flip each other.
+SCORING_PARAMS = ["zwin", "wF", "wOI", "wR", "thr_mode", "p_stress", "p_extreme", "k_stress", "k_extreme", "thr_window"]
+
+
+def config_key(cfg: Dict[str, object]) -> str:
+    values = [round(v, 6) if isinstance(v, float) else v for v in (cfg.get(k) for k in SCORING_PARAMS)]
+    return hashlib.sha1(json.dumps(values).encode()).hexdigest()[:12]
+
+
+def _init_db(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS alerts ("
+        "id INTEGER PRIMARY KEY, ts INTEGER NOT NULL, bar_ts INTEGER NOT NULL, symbol TEXT NOT NULL, "
+        "interval TEXT NOT NULL, config TEXT NOT NULL, from_regime TEXT NOT NULL, to_regime TEXT NOT NULL, "
+        "clp REAL, stress_thr REAL, extreme_thr REAL, price REAL, "
+        "UNIQUE (symbol, interval, config, bar_ts, from_regime, to_regime))"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS alert_state ("
+        "symbol TEXT NOT NULL, interval TEXT NOT NULL, config TEXT NOT NULL, regime TEXT NOT NULL, "
+        "ts INTEGER NOT NULL, PRIMARY KEY (symbol, interval, config)) WITHOUT ROWID"
+    )
+    conn.commit()
+
+
+def connect(path: Optional[str] = None) -> sqlite3.Connection:
+    conn = sqlite3.connect(path or SNAPSHOT_DB, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    _init_db(conn)
+    return conn
+
+
+class AlertEngine:
+    # Regime-flip detection that runs wherever CLP is computed (collector tick, stream
+    # update, dashboard refresh) rather than per browser session.
+    # - hysteresis: a regime is only left once CLP falls this far below its threshold;
+    #   entering a higher regime needs just the crossing.
+    # - debounce: a new regime must hold this many seconds before it is confirmed.
+    # The confirmed regime per (symbol, interval, scoring settings) lives in `alert_state`
+    # and is read and updated in one transaction, so the collector and every dashboard
+    # process share it: whichever sees a flip first logs it, the others find it already
+    # applied. The `alerts` table's unique key backs this up for a flapping open candle.
+    def __init__(self, sinks: Iterable[Sink] = (), hysteresis: float = 0.0, debounce: float = 0.0,
+                 path: Optional[str] = None):
+        self.sinks = list(sinks)
+        self.hysteresis = float(hysteresis)
+        self.debounce = float(debounce)
+        self.lock = threading.Lock()
+        self.conn = connect(path)
+        self.conn.isolation_level = None  # explicit BEGIN IMMEDIATE below
+        self._pending: Dict[Tuple[str, str, str], Tuple[str, float, int]] = {}
+        self._queue: "queue.Queue[Alert]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+
+    def classify(self, prev: Optional[str], clp: float, stress_thr: float, extreme_thr: float) -> str:
+        level = 2 if clp > extreme_thr else 1 if clp > stress_thr else 0
+        if prev is not None and level < REGIMES.index(prev):
+            h = self.hysteresis
+            held = 2 if clp > extreme_thr - h else 1 if clp > stress_thr - h else 0
+            level = min(REGIMES.index(prev), held)
+        return REGIMES[level]
+
+    def evaluate(self, symbol: str, interval: str, bar_time, clp: float, stress_thr: float, extreme_thr: float,
+                 price: float = float("nan"), now: Optional[float] = None, config: str = "") -> Optional[Alert]:
+        # Returns the alert if this call confirmed a new, not yet logged flip. `config` is
+        # config_key() of the settings that produced clp and the thresholds.
+        if clp != clp:
+            return None
+        now = time.time() if now is None else now
+        key = (symbol, interval, config)
+        bar_ts = int(pd.Timestamp(bar_time).value // 1_000_000)
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT regime FROM alert_state WHERE symbol = ? AND interval = ? AND config = ?", key
+                ).fetchone()
+                prev = row[0] if row else None
+                cur = self.classify(prev, clp, stress_thr, extreme_thr)
+                alert = None
+                if prev is None:
+                    self._set_regime(key, cur, now)
+                elif cur == prev:
+                    self._pending.pop(key, None)
+                else:
+                    pending = self._pending.get(key)
+                    if pending is None or pending[0] != cur:
+                        pending = self._pending[key] = (cur, now, bar_ts)
+                    if now - pending[1] >= self.debounce:
+                        del self._pending[key]
+                        self._set_regime(key, cur, now)
+                        alert = {
+                            "time": int(now * 1000), "bar_time": pending[2], "symbol": symbol,
+                            "interval": interval, "config": config, "from": prev, "to": cur, "clp": float(clp),
+                            "stress_thr": float(stress_thr), "extreme_thr": float(extreme_thr), "price": float(price),
+                        }
+                        new = self.conn.execute(
+                            "INSERT OR IGNORE INTO alerts (ts, bar_ts, symbol, interval, config, from_regime, "
+                            "to_regime, clp, stress_thr, extreme_thr, price) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            (alert["time"], alert["bar_time"], symbol, interval, config, prev, cur,
+                             alert["clp"], alert["stress_thr"], alert["extreme_thr"], alert["price"]),
+                        ).rowcount
+                        if not new:
+                            metrics.inc("alerts_deduplicated_total", symbol=symbol)
+                            alert = None
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        if alert is None:
+            return None
+        metrics.inc("alerts_total", symbol=symbol, regime=cur)
+        if self.sinks:
+            self._dispatch(alert)
+        return alert
+
+    def evaluate_watchlist(self, snapshots: Iterable[dict], interval: str, now: Optional[float] = None,
+                           config: str = "") -> List[Alert]:
+        out = []
+        for s in snapshots:
+            if "error" in s or "time" not in s:
+                continue
+            a = self.evaluate(s["symbol"], interval, s["time"], s["clp"], s["stress_thr"], s["extreme_thr"],
+                              s.get("price", float("nan")), now=now, config=config)
+            if a is not None:
+                out.append(a)
+        return out
+
+    def _set_regime(self, key: Tuple[str, str, str], regime: str, now: float) -> None:
+        # Runs inside evaluate()'s transaction.
+        self.conn.execute(
+            "INSERT INTO alert_state (symbol, interval, config, regime, ts) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (symbol, interval, config) DO UPDATE SET regime = excluded.regime, ts = excluded.ts",
+            (*key, regime, int(now * 1000)),
+        )
+
+    def _dispatch(self, alert: Alert) -> None:
+        # Sinks run on one background thread so a slow webhook never holds up scoring.
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run_sinks, daemon=True)
+            self._worker.start()
+        self._queue.put(alert)
+
+    def _run_sinks(self) -> None:
+        while True:
+            alert = self._queue.get()
+            for sink in self.sinks:
+                name = getattr(sink, "name", type(sink).__name__)
+                try:
+                    with metrics.timer("alert_sink_seconds", sink=name):
+                        sink(alert)
+                except Exception as e:
+                    metrics.inc("alert_sink_errors_total", sink=name)
+                    log.warning("alert sink %s failed: %s", name, e)
+            self._queue.task_done()
+
+    def flush(self) -> None:
+        self._queue.join()
+
+
+def recent_alerts(limit: int = 50, symbols: Optional[Iterable[str]] = None, interval: Optional[str] = None,
+                  config: Optional[str] = None, path: Optional[str] = None) -> pd.DataFrame:
+    clauses, params = [], []
+    if config is not None:
+        clauses.append("config = ?")
+        params.append(config)
+    if symbols is not None:
+        symbols = list(symbols)
+        clauses.append(f"symbol IN ({', '.join('?' * len(symbols))})")
+        params += symbols
+    if interval is not None:
+        clauses.append("interval = ?")
+        params.append(interval)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    conn = connect(path)
+    try:
+        df = pd.read_sql_query(
+            f"SELECT * FROM alerts {where} ORDER BY id DESC LIMIT ?", conn, params=[*params, int(limit)]
+        )
+    finally:
+        conn.close()
+    df["ts"] = pd.to_datetime(df["ts"], unit="ms", utc=True)
+    df["bar_ts"] = pd.to_datetime(df["bar_ts"], unit="ms", utc=True)
+    return df
+
+
+_engine: Optional[AlertEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_alert_engine() -> AlertEngine:
+    # Shared by every dashboard session in this process; sinks come from CLP_ALERT_SINKS.
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AlertEngine([make_sink(s.strip()) for s in ALERT_SINKS.split(",") if s.strip()])
+        return _engine
+
+
+class StreamAlerts:
+    # Re-scores a symbol as soon as its stream data changes and feeds the engine, so alert
+    # latency follows data arrival instead of the refresh cycle. Updates are coalesced:
+    # each symbol is scored at most once per min_interval seconds.
+    def __init__(self, engine: AlertEngine, stream, score: Callable[[str, pd.DataFrame], Tuple[pd.DataFrame, dict]],
+                 config: str = "", min_interval: float = 1.0):
+        self.engine = engine
+        self.config = config
+        self.stream = stream
+        self.score = score
+        self.min_interval = min_interval
+        self._dirty: set = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        stream.listeners.append(self.mark)
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def mark(self, symbol: str) -> None:
+        with self._lock:
+            self._dirty.add(symbol)
+        self._wake.set()
+
+    def stop(self) -> None:
+        if self.mark in self.stream.listeners:
+            self.stream.listeners.remove(self.mark)
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            started = time.time()
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+            for sym in dirty:
+                try:
+                    df = self.stream.frame(sym)
+                    if df is None:
+                        continue
+                    _, snap = self.score(sym, df)
+                    self.engine.evaluate_watchlist([snap], self.stream.interval, config=self.config)
+                except Exception as e:
+                    log.debug("stream alert scoring failed for %s: %s", sym, e)
+            self._stop.wait(max(0.0, self.min_interval - (time.time() - started)))
+
+
+class _Receiver(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            print(format_alert(json.loads(body)), flush=True)
+        except Exception:
+            print(body.decode("utf-8", "replace"), flush=True)
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    p = argparse.ArgumentParser(description="Inspect the persisted alert log or run a local webhook receiver.")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    ls = sub.add_parser("list", help="print the most recent alerts")
+    ls.add_argument("--limit", type=int, default=20)
+    rx = sub.add_parser("receive", help="local stand-in for a webhook endpoint; prints what it is sent")
+    rx.add_argument("--host", default="127.0.0.1")
+    rx.add_argument("--port", type=int, default=8099)
+    args = p.parse_args(argv)
+
+    if args.cmd == "list":
+        df = recent_alerts(args.limit)
+        print(df.to_string(index=False) if not df.empty else "no alerts logged yet")
+        return
+    server = ThreadingHTTPServer((args.host, args.port), _Receiver)
+    print(f"listening on http://{args.host}:{args.port}/", file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import math
+import sys
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+import numpy as np
+import pandas as pd
+
+from src import metrics
+from src.symbol_state import as_frame
+
+# Read-only JSON view of the latest scored watchlist for pollers that are not the
+# dashboard. It only ever serves what a collector tick already computed: responses are
+# serialised once per published state, conditional requests (If-None-Match) get a 304, and
+# series queries take `since` so pollers only pull the bars they have not seen.
+API_HOST = "127.0.0.1"
+API_PORT = 8050
+SERIES_COLS = ["Close", "clp", "stress_thr", "extreme_thr"]
+
+log = logging.getLogger("clp.api")
+
+
+def _clean(v: Any) -> Any:
+    # JSON-safe copy of a snapshot value: NaN -> null, timestamps -> ISO 8601.
+    if isinstance(v, dict):
+        return {k: _clean(x) for k, x in v.items()}
+    if isinstance(v, (list, tuple)):
+        return [_clean(x) for x in v]
+    if isinstance(v, (pd.Timestamp, datetime)):
+        return v.isoformat()
+    if isinstance(v, np.generic):
+        v = v.item()
+    if isinstance(v, float) and not math.isfinite(v):
+        return None
+    return v
+
+
+def _column(x: np.ndarray) -> list:
+    return np.where(np.isnan(x), None, x.astype(object)).tolist()
+
+
+def parse_since(value: Optional[str]) -> Optional[int]:
+    # Epoch milliseconds or an ISO 8601 timestamp (naive = UTC).
+    if not value:
+        return None
+    if value.lstrip("-").isdigit():
+        return int(value)
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+    return int(ts.value // 1_000_000)
+
+
+def _etag(*parts: bytes) -> str:
+    # Derived from the content, so every server process (and a restarted one) hands out
+    # the same tag for the same data.
+    h = hashlib.sha1()
+    for b in parts:
+        h.update(b)
+    return f'"{h.hexdigest()[:16]}"'
+
+
+def _series_etag(s: Dict[str, np.ndarray]) -> str:
+    return _etag(*(np.ascontiguousarray(s[c]).tobytes() for c in ["t", *SERIES_COLS]), "\0".join(s["regime"]).encode())
+
+
+class SnapshotStore:
+    # The last published collector state. A series ETag only changes when that symbol's
+    # series did, so it survives ticks that did not touch it.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.updated: Optional[datetime] = None
+        self.snapshot_body = b'{"updated": null, "snapshots": []}'
+        self.snapshot_etag = _etag(self.snapshot_body)
+        self.series: Dict[str, Dict[str, np.ndarray]] = {}
+        self.series_etags: Dict[str, str] = {}
+        self._source: Any = None
+        self._source_lock = threading.Lock()
+
+    def publish(self, state: Dict[str, Any]) -> str:
+        snaps = {s["symbol"]: s for s in state.get("snapshots", []) if "error" not in s}
+        series = {}
+        for sym, f in state.get("frames", {}).items():
+            df = as_frame(f)
+            if df is None or df.empty or "clp" not in df.columns:
+                continue
+            s = {"t": df["time"].values.astype("datetime64[ms]").astype(np.int64)}
+            for c in SERIES_COLS:
+                s[c] = df[c].to_numpy(dtype=float) if c in df.columns else np.full(len(df), np.nan)
+                if c.endswith("_thr") and np.isnan(s[c]).all():
+                    # Full-history thresholds are one value per symbol; repeat it per bar.
+                    s[c] = np.full(len(df), float(snaps.get(sym, {}).get(c, np.nan)))
+            s["regime"] = np.asarray(df["regime"].astype(str))
+            series[sym] = s
+
+        updated = state.get("updated")
+        body = json.dumps(_clean({
+            "updated": updated,
+            "interval": state.get("config", {}).get("interval"),
+            "snapshots": state.get("snapshots", []),
+        })).encode()
+        etags = {sym: _series_etag(s) for sym, s in series.items()}
+        with self.lock:
+            self.snapshot_body = body
+            self.snapshot_etag = _etag(body)
+            self.series = series
+            self.series_etags = etags
+            self.updated = updated
+            return self.snapshot_etag
+
+    def publish_from(self, source: Any) -> None:
+        # Cheap no-op unless `source` (e.g. read_state()'s cached object) is a new state.
+        with self._source_lock:
+            if source is not None and source is not self._source:
+                self.publish(source)
+                self._source = source
+
+    def snapshot(self) -> Tuple[str, bytes]:
+        with self.lock:
+            return self.snapshot_etag, self.snapshot_body
+
+    def series_rows(self, symbol: str, since: Optional[int] = None, limit: Optional[int] = None) -> Optional[Tuple[str, dict]]:
+        # Bars at or after `since`, so a poller passing its last seen bar also gets that bar
+        # back when it was the open candle and has changed since.
+        with self.lock:
+            s = self.series.get(symbol)
+            if s is None:
+                return None
+            etag = self.series_etags[symbol]
+        lo = int(np.searchsorted(s["t"], since)) if since is not None else 0
+        if limit is not None:
+            lo = max(lo, len(s["t"]) - limit)
+        out = {"symbol": symbol, "t": s["t"][lo:].tolist()}
+        for c in SERIES_COLS:
+            out[c] = _column(s[c][lo:])
+        out["regime"] = s["regime"][lo:].tolist()
+        return etag, out
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "SnapshotServer"
+
+    def do_GET(self):
+        with metrics.timer("api_request_seconds"):
+            url = urlparse(self.path)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            parts = [unquote(p) for p in url.path.strip("/").split("/") if p]
+            self.server.refresh()
+            store = self.server.store
+            try:
+                since = parse_since(query.get("since"))
+                limit = int(query["limit"]) if "limit" in query else None
+            except ValueError as e:
+                return self._send(400, {"error": str(e)})
+
+            if parts == ["health"]:
+                return self._send(200, {"etag": store.snapshot_etag.strip('"'), "updated": _clean(store.updated)})
+            if parts == ["snapshot"]:
+                etag, body = store.snapshot()
+                return self._send(200, body, etag)
+            if len(parts) == 2 and parts[0] == "series":
+                res = store.series_rows(parts[1].upper(), since, limit)
+                if res is None:
+                    return self._send(404, {"error": f"unknown symbol {parts[1]}"})
+                etag, rows = res
+                # The representation also depends on the query.
+                return self._send(200, rows, etag[:-1] + f'-{since}-{limit}"')
+            return self._send(404, {"error": "not found", "paths": ["/snapshot", "/series/<symbol>?since=&limit=", "/health"]})
+
+    def _send(self, status: int, body: Any, etag: Optional[str] = None) -> None:
+        if etag is not None and etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+            metrics.inc("api_requests_total", status=304)
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        metrics.inc("api_requests_total", status=status)
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "no-cache")
+        if etag is not None:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class SnapshotServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, store: SnapshotStore, host: str = API_HOST, port: int = API_PORT, state_dir: Optional[str] = None):
+        super().__init__((host, port), _Handler)
+        self.store = store
+        self.state_dir = state_dir
+
+    def refresh(self) -> None:
+        # Standalone mode follows the collector's state file; read_state only re-reads it
+        # after the collector replaced it.
+        if self.state_dir is not None:
+            from src.collector import read_state
+
+            self.store.publish_from(read_state(self.state_dir))
+
+    def start(self) -> "SnapshotServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        log.info("serving snapshots on http://%s:%s/", *self.server_address[:2])
+        return self
+
+
+def score_watchlist(
+    symbols: Iterable[str],
+    interval: str = "1h",
+    lookback: int = 500,
+    zwin: int = 120,
+    wF: float = 0.5,
+    wOI: float = 0.3,
+    wR: float = 0.2,
+    thr_mode: str = "percentile",
+    p_stress: float = 0.85,
+    p_extreme: float = 0.95,
+    k_stress: float = 1.0,
+    k_extreme: float = 2.0,
+    thr_window: Optional[int] = None,
+) -> Tuple[List[dict], Dict[str, pd.DataFrame]]:
+    # Headless fetch + score with the dashboard's defaults and caches.
+    from src.cache import cached_snapshot, raw_frames
+    from src.pipeline import compute_watchlist
+
+    symbols = list(symbols)
+    raw, errors = raw_frames(symbols, interval, lookback)
+    snapshots, states = compute_watchlist(
+        raw, errors, symbols, interval, zwin,
+        wF, wOI, wR,
+        thr_mode, p_stress, p_extreme,
+        k_stress, k_extreme,
+        thr_window=thr_window,
+        compute=cached_snapshot,
+    )
+    # The cache keeps compact SymbolStates; callers get plain frames.
+    return snapshots, {sym: as_frame(st) for sym, st in states.items()}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    p = argparse.ArgumentParser(description="Serve the collector's latest snapshot and CLP series as JSON.")
+    p.add_argument("--state-dir", default=None, help="collector state directory to follow")
+    p.add_argument("--host", default=API_HOST)
+    p.add_argument("--port", type=int, default=API_PORT)
+    args = p.parse_args(argv)
+
+    from src.collector import STATE_DIR
+
+    server = SnapshotServer(SnapshotStore(), args.host, args.port, state_dir=args.state_dir or STATE_DIR)
+    print(f"serving http://{args.host}:{args.port}/snapshot from {server.state_dir}", file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import argparse
+import itertools
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.features import pct_change_2d, rolling_zscore_2d
+from src.scoring import DEFAULT_THRESHOLDS, MIN_THRESHOLD_OBS, RollingThresholds
+
+DATA_DIR = os.environ.get("CLP_BACKTEST_DIR", "backtest_data")
+INPUTS = ["time", "Close", "fundingRate", "openInterest"]
+HORIZON = 24
+CONFIG_COLS = ["zwin", "wF", "wOI", "wR", "thr_mode", "thr_window", "stress", "extreme"]
+
+log = logging.getLogger("clp.backtest")
+
+# (mode, window, [(stress level, extreme level), ...]): p's for percentile, k's for std.
+ThresholdGroup = Tuple[str, int, List[Tuple[float, float]]]
+
+
+def data_path(data_dir: str, symbol: str, interval: str) -> str:
+    return os.path.join(data_dir, f"{symbol}_{interval}.npy")
+
+
+def save_frames(frames: Dict[str, pd.DataFrame], interval: str, data_dir: str = DATA_DIR) -> Dict[str, str]:
+    # One (inputs x bars) float64 array per symbol, rows in INPUTS order; ms timestamps
+    # are exact in float64. Workers memory-map these read-only instead of unpickling copies.
+    os.makedirs(data_dir, exist_ok=True)
+    paths = {}
+    for sym, df in frames.items():
+        t = df["time"].values.astype("datetime64[ms]").astype(np.int64).astype(np.float64)
+        arr = np.vstack([t] + [df[c].to_numpy(dtype=np.float64) for c in INPUTS[1:]])
+        paths[sym] = data_path(data_dir, sym, interval)
+        np.save(paths[sym], arr)
+    return paths
+
+
+def list_data(data_dir: str, interval: str, symbols: Optional[Sequence[str]] = None) -> Dict[str, str]:
+    suffix = f"_{interval}.npy"
+    found = {n[: -len(suffix)]: os.path.join(data_dir, n) for n in sorted(os.listdir(data_dir)) if n.endswith(suffix)}
+    return {s: p for s, p in found.items() if not symbols or s in symbols}
+
+
+def prepare(symbols: Sequence[str], interval: str, lookback: int, data_dir: str = DATA_DIR) -> Dict[str, str]:
+    from src.binance_api import build_merged_frames
+
+    frames = {}
+    for sym, r in build_merged_frames(symbols, interval=interval, lookback_limit=lookback).items():
+        if isinstance(r, Exception):
+            log.warning("skipping %s: %s", sym, r)
+        else:
+            frames[sym] = r
+    return save_frames(frames, interval, data_dir)
+
+
+_inputs: Dict[str, np.ndarray] = {}
+
+
+def _open(path: str) -> np.ndarray:
+    # Opened once per worker process; the pages are shared through the OS page cache.
+    arr = _inputs.get(path)
+    if arr is None:
+        arr = _inputs[path] = np.load(path, mmap_mode="r")
+    return arr
+
+
+def replay_features(x: np.ndarray, zwin: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Trailing-window features for every bar at once; bar i only sees bars <= i, so this
+    # is the same as replaying the series bar by bar. Returns the (3 x bars) z-scores
+    # (funding, dOI%, |return|) and the rows the live pipeline would keep.
+    close, funding, oi = (np.asarray(x[i])[:, None] for i in (1, 2, 3))
+    ret = np.full(close.shape, np.nan)
+    ret[1:] = np.diff(np.log(close), axis=0)
+    abs_ret = np.abs(ret)
+    oi_chg = pct_change_2d(oi)
+    z = np.stack([rolling_zscore_2d(funding, zwin), rolling_zscore_2d(oi_chg, zwin), rolling_zscore_2d(abs_ret, zwin)])[:, :, 0]
+    valid = ~(np.isnan(close) | np.isnan(funding) | np.isnan(oi) | np.isnan(ret) | np.isnan(oi_chg))[:, 0]
+    valid &= ~np.isnan(z).any(axis=0)
+    return z, valid
+
+
+def threshold_paths(x: np.ndarray, mode: str, window: int, levels: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+    # One RollingThresholds pass serves every level: quantiles for percentile mode,
+    # mean + level * std for std mode. Returns (levels x bars) and the warmed-up mask.
+    rt = RollingThresholds(mode, window)
+    levels = np.asarray(levels, dtype=float)
+    out = np.full((len(levels), len(x)), np.nan)
+    warm = np.zeros(len(x), dtype=bool)
+    for i in np.flatnonzero(~np.isnan(x)):
+        rt.push(float(x[i]))
+        if len(rt.sorted) < MIN_THRESHOLD_OBS:
+            continue
+        warm[i] = True
+        if mode == "percentile":
+            out[:, i] = [rt.quantile(q) for q in levels]
+        else:
+            mu, sd = rt.moments()
+            out[:, i] = mu + levels * sd
+    return out, warm
+
+
+def forward_absret(close: np.ndarray, horizon: int) -> np.ndarray:
+    fwd = np.full(len(close), np.nan)
+    if horizon < len(close):
+        fwd[:-horizon] = np.abs(np.log(close[horizon:] / close[:-horizon]))
+    return fwd
+
+
+def score_regimes(codes: np.ndarray, valid: np.ndarray, fwd: np.ndarray) -> dict:
+    # Raw sums per symbol so they can be pooled across symbols before taking ratios.
+    c = np.where(valid, codes, 255).astype(np.int16)
+    starts = np.r_[0, np.flatnonzero(np.diff(c)) + 1] if len(c) else np.empty(0, dtype=np.int64)
+    run_codes = c[starts]
+    ext = starts[run_codes == 2]
+    both = valid[1:] & valid[:-1]
+    elevated = np.where(valid, codes > 0, False)
+    el_starts = np.flatnonzero(elevated & ~np.r_[False, elevated[:-1]])
+    fwd_ext = fwd[ext]
+    fwd_all = fwd[valid]
+    return {
+        "bars": int(valid.sum()),
+        "flips": int((both & (codes[1:] != codes[:-1])).sum()),
+        "stress_bars": int((c == 1).sum()),
+        "extreme_bars": int((c == 2).sum()),
+        "extreme_episodes": len(ext),
+        "elevated_episodes": len(el_starts),
+        "fwd_extreme_sum": float(np.nansum(fwd_ext)),
+        "fwd_extreme_n": int((~np.isnan(fwd_ext)).sum()),
+        "fwd_all_sum": float(np.nansum(fwd_all)),
+        "fwd_all_n": int((~np.isnan(fwd_all)).sum()),
+    }
+
+
+def _run_task(task) -> List[dict]:
+    symbol, path, zwin, (wF, wOI, wR), groups, horizon = task
+    x = _open(path)
+    z, valid = replay_features(x, zwin)
+    fwd = forward_absret(np.asarray(x[1]), horizon)
+    clp = np.where(valid, wF * z[0] + wOI * z[1] + wR * z[2], np.nan)
+    rows = []
+    for mode, window, pairs in groups:
+        levels = sorted({v for pair in pairs for v in pair})
+        paths, warm = threshold_paths(clp, mode, window, levels)
+        at = {v: j for j, v in enumerate(levels)}
+        for lo, hi in pairs:
+            stress = np.where(warm, paths[at[lo]], DEFAULT_THRESHOLDS[0])
+            extreme = np.where(warm, paths[at[hi]], DEFAULT_THRESHOLDS[1])
+            codes = (clp > stress).astype(np.uint8)
+            codes[clp > extreme] = 2
+            rows.append({
+                "symbol": symbol, "zwin": zwin, "wF": wF, "wOI": wOI, "wR": wR,
+                "thr_mode": mode, "thr_window": window, "stress": lo, "extreme": hi,
+                **score_regimes(codes, valid, fwd),
+            })
+    return rows
+
+
+def summarize(per_symbol: pd.DataFrame) -> pd.DataFrame:
+    agg = per_symbol.drop(columns="symbol").groupby(CONFIG_COLS, sort=False).sum().reset_index()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        agg["flips_per_1k"] = 1000 * agg["flips"] / agg["bars"]
+        agg["stress_share"] = agg["stress_bars"] / agg["bars"]
+        agg["extreme_share"] = agg["extreme_bars"] / agg["bars"]
+        agg["mean_extreme_bars"] = agg["extreme_bars"] / agg["extreme_episodes"]
+        agg["mean_elevated_bars"] = (agg["stress_bars"] + agg["extreme_bars"]) / agg["elevated_episodes"]
+        agg["fwd_absret_extreme"] = agg["fwd_extreme_sum"] / agg["fwd_extreme_n"]
+        agg["fwd_absret_all"] = agg["fwd_all_sum"] / agg["fwd_all_n"]
+        agg["lift"] = agg["fwd_absret_extreme"] / agg["fwd_absret_all"]
+    keep = CONFIG_COLS + [
+        "bars", "flips", "flips_per_1k", "stress_share", "extreme_share", "extreme_episodes",
+        "mean_extreme_bars", "mean_elevated_bars", "fwd_extreme_n", "fwd_absret_extreme", "fwd_absret_all", "lift",
+    ]
+    return agg[keep].sort_values("lift", ascending=False, na_position="last").reset_index(drop=True)
+
+
+def threshold_groups(
+    modes: Sequence[str],
+    windows: Sequence[int],
+    p_stress: Sequence[float],
+    p_extreme: Sequence[float],
+    k_stress: Sequence[float],
+    k_extreme: Sequence[float],
+) -> List[ThresholdGroup]:
+    pairs = {
+        "percentile": [(a, b) for a in p_stress for b in p_extreme if b > a],
+        "std": [(a, b) for a in k_stress for b in k_extreme if b > a],
+    }
+    return [(m, w, pairs[m]) for m in modes for w in windows if pairs[m]]
+
+
+def sweep(
+    paths: Dict[str, str],
+    zwins: Sequence[int],
+    weights: Sequence[Tuple[float, float, float]],
+    groups: List[ThresholdGroup],
+    horizon: int = HORIZON,
+    workers: Optional[int] = None,
+) -> pd.DataFrame:
+    # One task per (symbol, zwin, weights): features once, then one threshold pass per
+    # (mode, window) shared by all its stress/extreme pairs. Tasks carry file paths only.
+    tasks = [(sym, path, zwin, w, groups, horizon) for sym, path in paths.items() for zwin in zwins for w in weights]
+    if workers == 1:
+        rows = list(itertools.chain.from_iterable(map(_run_task, tasks)))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rows = list(itertools.chain.from_iterable(pool.map(_run_task, tasks, chunksize=4)))
+    return summarize(pd.DataFrame(rows))
+
+
+def weight_grid(step: float) -> List[Tuple[float, float, float]]:
+    n = int(round(1 / step))
+    return [(i / n, j / n, (n - i - j) / n) for i in range(n + 1) for j in range(n + 1 - i)]
+
+
+def _floats(s: str) -> List[float]:
+    return [float(v) for v in s.split(",") if v.strip()]
+
+
+def _ints(s: str) -> List[int]:
+    return [int(v) for v in s.split(",") if v.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    p = argparse.ArgumentParser(description="Replay stored merged frames through CLP scoring and sweep its settings.")
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    prep = sub.add_parser("prepare", help="fetch merged frames and store them for replay")
+    prep.add_argument("--symbols", default="BTCUSDT,ETHUSDT,SOLUSDT", help="comma-separated symbols")
+    prep.add_argument("--interval", default="1h")
+    prep.add_argument("--lookback", type=int, default=5000)
+    prep.add_argument("--data", default=DATA_DIR)
+
+    sw = sub.add_parser("sweep", help="grid-sweep zwin x weights x thresholds over the stored frames")
+    sw.add_argument("--interval", default="1h")
+    sw.add_argument("--data", default=DATA_DIR)
+    sw.add_argument("--symbols", default="", help="restrict to these symbols (default: all stored)")
+    sw.add_argument("--zwin", default="90,120,180")
+    sw.add_argument("--weights", default="0.5:0.3:0.2", help="comma-separated wF:wOI:wR triples")
+    sw.add_argument("--weight-step", type=float, default=None,
+                    help="sweep every weight triple on this simplex grid instead of --weights")
+    sw.add_argument("--thr-mode", default="percentile,std")
+    sw.add_argument("--thr-window", default="0", help="threshold windows in bars (0 = expanding)")
+    sw.add_argument("--p-stress", default="0.80,0.85,0.90")
+    sw.add_argument("--p-extreme", default="0.92,0.95,0.97")
+    sw.add_argument("--k-stress", default="0.9,1.0,1.2")
+    sw.add_argument("--k-extreme", default="1.8,2.0,2.4")
+    sw.add_argument("--horizon", type=int, default=HORIZON, help="bars ahead for the forward |return| after Extreme")
+    sw.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    sw.add_argument("--out", default=None, help="write the full result table as CSV")
+    sw.add_argument("--top", type=int, default=20)
+    args = p.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.cmd == "prepare":
+        paths = prepare([s.strip().upper() for s in args.symbols.split(",") if s.strip()],
+                        args.interval, args.lookback, args.data)
+        log.info("stored %d symbols in %s", len(paths), args.data)
+        return
+
+    paths = list_data(args.data, args.interval, [s.strip().upper() for s in args.symbols.split(",") if s.strip()])
+    if not paths:
+        raise SystemExit(f"no {args.interval} data in {args.data}; run `python -m src.backtest prepare` first")
+    if args.weight_step:
+        weights = weight_grid(args.weight_step)
+    else:
+        weights = [tuple(float(v) for v in w.split(":")) for w in args.weights.split(",")]
+    weights = [tuple(v / sum(w) for v in w) for w in weights if sum(w) > 0]
+    groups = threshold_groups(
+        [m.strip() for m in args.thr_mode.split(",")], _ints(args.thr_window),
+        _floats(args.p_stress), _floats(args.p_extreme), _floats(args.k_stress), _floats(args.k_extreme),
+    )
+    zwins = _ints(args.zwin)
+    n_configs = len(zwins) * len(weights) * sum(len(g[2]) for g in groups)
+    log.info("sweeping %d configurations over %d symbols", n_configs, len(paths))
+
+    started = time.time()
+    res = sweep(paths, zwins, weights, groups, args.horizon, args.workers)
+    log.info("done in %.1fs", time.time() - started)
+    if args.out:
+        res.to_csv(args.out, index=False)
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(res.head(args.top).to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from src.scheduler import PRIORITY_BACKFILL, PRIORITY_LIVE
+
+INTERVAL_MS = {
+    "1m": 60_000, "3m": 180_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000,
+    "1h": 3_600_000, "2h": 7_200_000, "4h": 14_400_000, "6h": 21_600_000,
+    "8h": 28_800_000, "12h": 43_200_000, "1d": 86_400_000,
+}
+
+# Per-request row caps of each endpoint; longer ranges are split into pages.
+KLINES_PAGE = 1500
+FUNDING_PAGE = 1000
+OI_PAGE = 500
+
+MIN_FUNDING_INTERVAL_MS = 3_600_000
+MAX_FUNDING_INTERVAL_MS = 8 * 3_600_000
+OI_HIST_MAX_AGE_MS = 30 * 86_400_000
+
+
+def _ms(ts: pd.Timestamp) -> int:
+    return int(ts.value // 1_000_000)
+
+
+def page_windows(start_ms: int, end_ms: int, span_ms: int) -> List[Tuple[int, int]]:
+    return [(s, min(s + span_ms, end_ms + 1) - 1) for s in range(start_ms, end_ms + 1, span_ms)]
+
+
+def _pages(start_ms: int, end_ms: int, rows: int, step_ms: int, priority: int) -> List[Dict[str, Any]]:
+    return [
+        {"start_time": s, "end_time": e, "limit": min(rows, (e - s) // step_ms + 1), "priority": priority}
+        for s, e in page_windows(start_ms, end_ms, rows * step_ms)
+    ]
+
+
+def stitch(parts: List[pd.DataFrame], on: str) -> Optional[pd.DataFrame]:
+    if not parts:
+        return None
+    full = [p for p in parts if not p.empty]
+    if not full:
+        return parts[0]
+    out = pd.concat(full, ignore_index=True) if len(full) > 1 else full[0]
+    return out.sort_values(on, kind="stable").drop_duplicates(on, keep="last").reset_index(drop=True)
+
+
+def _append(old: Optional[pd.DataFrame], new: pd.DataFrame, on: str) -> pd.DataFrame:
+    if old is None or old.empty:
+        return new.reset_index(drop=True)
+    if new.empty:
+        return old
+    # Overlapping rows (e.g. the still-open candle) are replaced by the fresh copy.
+    out = pd.concat([old[old[on] < new[on].iloc[0]], new], ignore_index=True)
+    return out.drop_duplicates(on, keep="last").reset_index(drop=True)
+
+
+def _trim_before(df: pd.DataFrame, on: str, start: pd.Timestamp) -> pd.DataFrame:
+    # Keep the last row at or before `start` so merge_asof still has a value for the first bar.
+    i = max(int(df[on].searchsorted(start, side="right")) - 1, 0)
+    return df.iloc[i:].reset_index(drop=True) if i else df
+
+
+class BarStore:
+    def __init__(self, symbol: str, interval: str):
+        self.symbol = symbol
+        self.interval = interval
+        self.interval_ms = INTERVAL_MS[interval]
+        self.window = 0
+        self.price: Optional[pd.DataFrame] = None
+        self.funding: Optional[pd.DataFrame] = None
+        self.oi: Optional[pd.DataFrame] = None
+        # Funding times whose row came from the stream's predicted rate; REST re-reads
+        # them until it returns the settled rate.
+        self.provisional: List[int] = []
+        self.lock = threading.Lock()
+
+    def plan(self, lookback: int, now_ms: Optional[int] = None) -> Dict[str, Any]:
+        # Page lists per endpoint: a full backfill on first use / larger lookback / long gap,
+        # otherwise only the rows after what is already stored.
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        iv = self.interval_ms
+        with self.lock:
+            reset = self.price is None or self.price.empty or lookback > self.window
+            if not reset:
+                last = _ms(self.price["open_time"].iloc[-1])
+                reset = (now_ms - last) // iv + 1 >= self.window
+
+            if reset:
+                start = (now_ms // iv - lookback + 1) * iv
+                return {
+                    "reset": True,
+                    "window": lookback,
+                    "klines": _pages(start, now_ms, KLINES_PAGE, iv, PRIORITY_BACKFILL),
+                    "funding": _pages(
+                        start - MAX_FUNDING_INTERVAL_MS, now_ms,
+                        FUNDING_PAGE, MIN_FUNDING_INTERVAL_MS, PRIORITY_BACKFILL,
+                    ),
+                    "oi": _pages(
+                        max(start - iv, (now_ms - OI_HIST_MAX_AGE_MS) // iv * iv + iv), now_ms,
+                        OI_PAGE, iv, PRIORITY_BACKFILL,
+                    ),
+                }
+
+            plan: Dict[str, Any] = {
+                "reset": False,
+                "window": self.window,
+                "klines": _pages(last, now_ms, KLINES_PAGE, iv, PRIORITY_LIVE),
+                "funding": [],
+                "oi": [],
+            }
+            first = _ms(self.price["open_time"].iloc[0])
+            f_last = _ms(self.funding["time"].iloc[-1]) if not self.funding.empty else first
+            if self.provisional:
+                plan["funding"] = _pages(self.provisional[0], now_ms, FUNDING_PAGE, MIN_FUNDING_INTERVAL_MS, PRIORITY_LIVE)
+            elif now_ms >= f_last + MIN_FUNDING_INTERVAL_MS:
+                plan["funding"] = _pages(f_last + 1, now_ms, FUNDING_PAGE, MIN_FUNDING_INTERVAL_MS, PRIORITY_LIVE)
+            o_last = _ms(self.oi["time"].iloc[-1]) if not self.oi.empty else first
+            if now_ms >= o_last + iv:
+                plan["oi"] = _pages(o_last + 1, now_ms, OI_PAGE, iv, PRIORITY_LIVE)
+            return plan
+
+    def apply(
+        self,
+        plan: Dict[str, Any],
+        price: Optional[pd.DataFrame],
+        funding: Optional[pd.DataFrame] = None,
+        oi: Optional[pd.DataFrame] = None,
+    ) -> None:
+        with self.lock:
+            if plan["reset"]:
+                self.window = plan["window"]
+                self.price = self.funding = self.oi = None
+                self.provisional = []
+            if price is not None:
+                self.price = _append(self.price, price, "open_time").tail(self.window).reset_index(drop=True)
+            start = self.price["open_time"].iloc[0]
+            streamed = None
+            if funding is not None and not funding.empty and self.funding is not None and not self.funding.empty:
+                # Rows streamed in while the REST pages were in flight are newer than the page.
+                streamed = self.funding[self.funding["time"] > funding["time"].iloc[-1]]
+            for attr, col, new in (("funding", "fundingRate", funding), ("oi", "openInterest", oi)):
+                cur = getattr(self, attr)
+                if new is not None:
+                    cur = _append(cur, new, "time")
+                if cur is None:
+                    cur = pd.DataFrame(columns=["time", col])
+                setattr(self, attr, _trim_before(cur, "time", start) if not cur.empty else cur)
+            if streamed is not None and not streamed.empty:
+                self.funding = pd.concat([self.funding, streamed], ignore_index=True)
+            if funding is not None and not funding.empty and self.provisional:
+                # A REST page covers everything up to its last row, so any provisional row up
+                # to there has been replaced by (or dropped for) the settled rate.
+                settled = _ms(funding["time"].iloc[-1])
+                self.provisional = [t for t in self.provisional if t > settled]
+
+    def apply_kline(self, open_time_ms: int, o: float, h: float, l: float, c: float, v: float) -> bool:
+        # Streamed candle update. Returns False when it does not continue the stored
+        # series (nothing stored yet, or bars were missed) so the caller can catch up over REST.
+        with self.lock:
+            if self.price is None or self.price.empty:
+                return False
+            last = _ms(self.price["open_time"].iloc[-1])
+            if open_time_ms == last:
+                self.price.iloc[-1, 1:6] = [o, h, l, c, v]
+            elif open_time_ms == last + self.interval_ms:
+                row = pd.DataFrame({
+                    "open_time": [pd.Timestamp(open_time_ms, unit="ms", tz="UTC")],
+                    "Open": [o], "High": [h], "Low": [l], "Close": [c], "Volume": [v],
+                })
+                self.price = pd.concat([self.price, row], ignore_index=True).tail(self.window).reset_index(drop=True)
+            elif open_time_ms > last:
+                return False
+            return True
+
+    def apply_funding(self, time_ms: int, rate: float) -> None:
+        # Streamed funding row, provisional until the next REST plan re-reads it.
+        with self.lock:
+            if self.funding is None:
+                return
+            row = pd.DataFrame({"time": [pd.Timestamp(time_ms, unit="ms", tz="UTC")], "fundingRate": [rate]})
+            if self.funding.empty or row["time"].iloc[0] > self.funding["time"].iloc[-1]:
+                self.funding = _append(self.funding, row, "time")
+                self.provisional.append(time_ms)
+
+    def frames(self, lookback: int) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+        with self.lock:
+            price = self.price.tail(lookback).reset_index(drop=True)
+            start = price["open_time"].iloc[0]
+            return (
+                price,
+                _trim_before(self.funding, "time", start) if not self.funding.empty else self.funding,
+                _trim_before(self.oi, "time", start) if not self.oi.empty else self.oi,
+            )
+
+
+_stores: Dict[Tuple[str, str], BarStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(symbol: str, interval: str) -> BarStore:
+    key = (symbol, interval)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = BarStore(symbol, interval)
+        return store
+
+
+def clear_stores() -> None:
+    with _stores_lock:
+        _stores.clear()
@@ -1,85 +1,220 @@
 from __future__ import annotations
 
+import os
+import threading
 import time
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Optional, Union
+from urllib.parse import urlparse
 
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 
-FAPI_BASE = "https://fapi.binance.com"
+from src import metrics
+from src.bar_store import get_store, stitch
+from src.scheduler import (
+    PRIORITY_LIVE,
+    RETRYABLE_STATUSES,
+    PriorityExecutor,
+    RateLimitedError,
+    backoff_delay,
+    get_budget,
+    request_weight,
+)
+
+FAPI_BASE = os.environ.get("CLP_FAPI_BASE", "https://fapi.binance.com")
+MAX_WORKERS = 16
+
+_session: Optional[requests.Session] = None
+_executor: Optional[PriorityExecutor] = None
+_lock = threading.Lock()
 
 
 class BinanceAPIError(RuntimeError):
     pass
 
 
-def _get(url: str, params: Dict[str, Any], timeout: int = 15, retries: int = 3) -> Any:
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_WORKERS)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                _session = s
+    return _session
+
+
+def get_executor() -> PriorityExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = PriorityExecutor(max_workers=MAX_WORKERS, thread_name_prefix="binance")
+    return _executor
+
+
+def _get(
+    url: str,
+    params: Dict[str, Any],
+    timeout: int = 15,
+    retries: int = 3,
+    priority: int = PRIORITY_LIVE,
+) -> Any:
+    budget = get_budget()
+    weight = request_weight(url, params)
+    labels = {"endpoint": urlparse(url).path, "symbol": params.get("symbol") or ""}
     last_err: Optional[Exception] = None
     for i in range(retries):
         try:
-            r = requests.get(url, params=params, timeout=timeout)
-            if r.status_code != 200:
-                raise BinanceAPIError(f"HTTP {r.status_code}: {r.text[:250]}")
-            return r.json()
-        except Exception as e:
+            with metrics.timer("rate_limit_wait_seconds", **labels):
+                budget.acquire(weight, priority)
+        except RateLimitedError as e:
+            raise BinanceAPIError(str(e)) from e
+
+        try:
+            with metrics.timer("http_request_seconds", **labels):
+                r = get_session().get(url, params=params, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            metrics.inc("http_requests_total", status="error", **labels)
             last_err = e
-            time.sleep(0.8 * (i + 1))
+        else:
+            metrics.inc("http_requests_total", status=r.status_code, **labels)
+            metrics.inc("http_response_bytes_total", len(r.content), **labels)
+            budget.record(r.headers)
+            if r.status_code in (418, 429):
+                budget.penalize(float(r.headers.get("Retry-After", 60)))
+            if r.status_code == 200:
+                try:
+                    return r.json()
+                except ValueError as e:
+                    last_err = e
+            else:
+                last_err = BinanceAPIError(f"HTTP {r.status_code}: {r.text[:250]}")
+                if r.status_code not in RETRYABLE_STATUSES:
+                    raise last_err
+
+        if i + 1 < retries:
+            metrics.inc("http_retries_total", **labels)
+            time.sleep(backoff_delay(i))
     raise BinanceAPIError(f"Binance request failed after retries: {last_err}")
 
 
-def fetch_klines(symbol: str, interval: str, limit: int = 500) -> pd.DataFrame:
+def fetch_klines(
+    symbol: str,
+    interval: str,
+    limit: int = 500,
+    start_time: Optional[int] = None,
+    end_time: Optional[int] = None,
+    priority: int = PRIORITY_LIVE,
+) -> pd.DataFrame:
     url = f"{FAPI_BASE}/fapi/v1/klines"
-    data = _get(url, {"symbol": symbol, "interval": interval, "limit": limit})
+    params = {
+        "symbol": symbol, "interval": interval, "limit": limit,
+        "startTime": start_time, "endTime": end_time,
+    }
+    data = _get(url, params, priority=priority)
 
-    cols = [
-        "open_time", "Open", "High", "Low", "Close", "Volume",
-        "close_time", "quote_asset_volume", "num_trades",
-        "taker_buy_base", "taker_buy_quote", "ignore"
-    ]
-    df = pd.DataFrame(data, columns=cols)
+    with metrics.timer("parse_seconds", endpoint="/fapi/v1/klines", symbol=symbol):
+        cols = [
+            "open_time", "Open", "High", "Low", "Close", "Volume",
+            "close_time", "quote_asset_volume", "num_trades",
+            "taker_buy_base", "taker_buy_quote", "ignore"
+        ]
+        df = pd.DataFrame(data, columns=cols)
 
-    for c in ["Open", "High", "Low", "Close", "Volume"]:
-        df[c] = pd.to_numeric(df[c], errors="coerce")
+        for c in ["Open", "High", "Low", "Close", "Volume"]:
+            df[c] = pd.to_numeric(df[c], errors="coerce")
 
-    df["open_time"] = pd.to_datetime(df["open_time"], unit="ms", utc=True)
-    df = df.sort_values("open_time").reset_index(drop=True)
-    return df[["open_time", "Open", "High", "Low", "Close", "Volume"]]
+        df["open_time"] = pd.to_datetime(df["open_time"], unit="ms", utc=True)
+        df = df.sort_values("open_time").reset_index(drop=True)
+        return df[["open_time", "Open", "High", "Low", "Close", "Volume"]]
 
 
-def fetch_funding_rate(symbol: str, limit: int = 200) -> pd.DataFrame:
+def fetch_funding_rate(
+    symbol: str,
+    limit: int = 200,
+    start_time: Optional[int] = None,
+    end_time: Optional[int] = None,
+    priority: int = PRIORITY_LIVE,
+) -> pd.DataFrame:
     url = f"{FAPI_BASE}/fapi/v1/fundingRate"
-    data = _get(url, {"symbol": symbol, "limit": limit})
+    params = {"symbol": symbol, "limit": limit, "startTime": start_time, "endTime": end_time}
+    data = _get(url, params, priority=priority)
 
-    df = pd.DataFrame(data)
-    if df.empty:
-        return pd.DataFrame(columns=["time", "fundingRate"])
+    with metrics.timer("parse_seconds", endpoint="/fapi/v1/fundingRate", symbol=symbol):
+        df = pd.DataFrame(data)
+        if df.empty:
+            return pd.DataFrame(columns=["time", "fundingRate"])
 
-    df["time"] = pd.to_datetime(df["fundingTime"], unit="ms", utc=True)
-    df["fundingRate"] = pd.to_numeric(df["fundingRate"], errors="coerce")
-    df = df.sort_values("time").reset_index(drop=True)
-    return df[["time", "fundingRate"]]
+        df["time"] = pd.to_datetime(df["fundingTime"], unit="ms", utc=True)
+        df["fundingRate"] = pd.to_numeric(df["fundingRate"], errors="coerce")
+        df = df.sort_values("time").reset_index(drop=True)
+        return df[["time", "fundingRate"]]
 
 
-def fetch_open_interest_hist(symbol: str, period: str, limit: int = 200) -> pd.DataFrame:
+def fetch_open_interest_hist(
+    symbol: str,
+    period: str,
+    limit: int = 200,
+    start_time: Optional[int] = None,
+    end_time: Optional[int] = None,
+    priority: int = PRIORITY_LIVE,
+) -> pd.DataFrame:
     url = f"{FAPI_BASE}/futures/data/openInterestHist"
-    data = _get(url, {"symbol": symbol, "period": period, "limit": limit})
+    params = {
+        "symbol": symbol, "period": period, "limit": limit,
+        "startTime": start_time, "endTime": end_time,
+    }
+    data = _get(url, params, priority=priority)
 
+    with metrics.timer("parse_seconds", endpoint="/futures/data/openInterestHist", symbol=symbol):
+        df = pd.DataFrame(data)
+        if df.empty:
+            return pd.DataFrame(columns=["time", "openInterest"])
+
+        df["time"] = pd.to_datetime(df["timestamp"], unit="ms", utc=True)
+        df["openInterest"] = pd.to_numeric(df["sumOpenInterest"], errors="coerce")
+        df = df.sort_values("time").reset_index(drop=True)
+        return df[["time", "openInterest"]]
+
+
+def fetch_exchange_info() -> pd.DataFrame:
+    data = _get(f"{FAPI_BASE}/fapi/v1/exchangeInfo", {})
+    df = pd.DataFrame(data.get("symbols", []))
+    if df.empty:
+        return pd.DataFrame(columns=["symbol", "contractType", "status", "quoteAsset"])
+    return df[["symbol", "contractType", "status", "quoteAsset"]]
+
+
+def fetch_premium_index() -> pd.DataFrame:
+    # One call (weight 10) for mark price and last funding of every symbol.
+    data = _get(f"{FAPI_BASE}/fapi/v1/premiumIndex", {})
     df = pd.DataFrame(data)
     if df.empty:
-        return pd.DataFrame(columns=["time", "openInterest"])
+        return pd.DataFrame(columns=["symbol", "markPrice", "lastFundingRate", "time"])
 
-    df["time"] = pd.to_datetime(df["timestamp"], unit="ms", utc=True)
-    df["openInterest"] = pd.to_numeric(df["sumOpenInterest"], errors="coerce")
-    df = df.sort_values("time").reset_index(drop=True)
-    return df[["time", "openInterest"]]
+    for c in ["markPrice", "lastFundingRate"]:
+        df[c] = pd.to_numeric(df[c], errors="coerce")
+    df["time"] = pd.to_datetime(df["time"], unit="ms", utc=True)
+    return df[["symbol", "markPrice", "lastFundingRate", "time"]]
 
 
-def build_merged_frame(symbol: str, interval: str, lookback_limit: int = 500) -> pd.DataFrame:
+def fetch_ticker_24h() -> pd.DataFrame:
+    # One call (weight 40) for the rolling 24h stats of every symbol.
+    data = _get(f"{FAPI_BASE}/fapi/v1/ticker/24hr", {})
+    df = pd.DataFrame(data)
+    if df.empty:
+        return pd.DataFrame(columns=["symbol", "priceChangePercent", "quoteVolume", "lastPrice"])
+
+    for c in ["priceChangePercent", "quoteVolume", "lastPrice"]:
+        df[c] = pd.to_numeric(df[c], errors="coerce")
+    return df[["symbol", "priceChangePercent", "quoteVolume", "lastPrice"]]
 
-    price = fetch_klines(symbol=symbol, interval=interval, limit=lookback_limit)
-    oi = fetch_open_interest_hist(symbol=symbol, period=interval, limit=min(200, lookback_limit))
-    fr = fetch_funding_rate(symbol=symbol, limit=200)
 
+def merge_frames(price: pd.DataFrame, fr: pd.DataFrame, oi: pd.DataFrame) -> pd.DataFrame:
     df = price.rename(columns={"open_time": "time"}).copy()
 
     df = pd.merge_asof(
@@ -95,4 +230,48 @@ def build_merged_frame(symbol: str, interval: str, lookback_limit: int = 500) ->
         direction="backward",
     )
 
-    return df
\ No newline at end of file
+    return df
+
+
+def build_merged_frames(
+    symbols: Iterable[str],
+    interval: str,
+    lookback_limit: int = 500,
+) -> Dict[str, Union[pd.DataFrame, Exception]]:
+    # Every page of every endpoint for every symbol goes to the shared pool at once.
+    # Each symbol's BarStore decides what is needed: a paged backfill of the whole
+    # window, only the bars after what it already has, or nothing at all.
+    pool = get_executor()
+    jobs = {}
+    for sym in dict.fromkeys(symbols):
+        store = get_store(sym, interval)
+        plan = store.plan(lookback_limit)
+        jobs[sym] = (
+            store,
+            plan,
+            [pool.submit(fetch_klines, symbol=sym, interval=interval, **kw) for kw in plan["klines"]],
+            [pool.submit(fetch_funding_rate, symbol=sym, **kw) for kw in plan["funding"]],
+            [pool.submit(fetch_open_interest_hist, symbol=sym, period=interval, **kw) for kw in plan["oi"]],
+        )
+
+    out: Dict[str, Union[pd.DataFrame, Exception]] = {}
+    for sym, (store, plan, f_price, f_fr, f_oi) in jobs.items():
+        try:
+            price = stitch([f.result() for f in f_price], "open_time")
+            fr = stitch([f.result() for f in f_fr], "time")
+            oi = stitch([f.result() for f in f_oi], "time")
+            with metrics.timer("stage_seconds", stage="store", symbol=sym):
+                store.apply(plan, price, fr, oi)
+                parts = store.frames(lookback_limit)
+            with metrics.timer("stage_seconds", stage="merge", symbol=sym):
+                out[sym] = merge_frames(*parts)
+        except Exception as e:
+            out[sym] = e
+    return out
+
+
+def build_merged_frame(symbol: str, interval: str, lookback_limit: int = 500) -> pd.DataFrame:
+    res = build_merged_frames([symbol], interval=interval, lookback_limit=lookback_limit)[symbol]
+    if isinstance(res, Exception):
+        raise res
+    return res
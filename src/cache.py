@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src import metrics
+from src.bar_store import INTERVAL_MS
+from src.binance_api import build_merged_frames
+from src.features import streaming_features
+from src.pipeline import compute_snapshot
+from src.shared_cache import get_shared_cache
+from src.symbol_state import SymbolState
+
+RAW_MAX_AGE_SECONDS = 30.0
+
+_MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, name: str, maxsize: int = 256):
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            hit = value is not _MISSING
+            if hit:
+                self._data.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        # Keys of every layer start with the symbol.
+        metrics.inc("cache_requests_total", layer=self.name, symbol=key[0], result="hit" if hit else "miss")
+        return value if hit else default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = fn()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+# Raw merged frames only depend on (symbol, interval, lookback); features add zwin;
+# CLP/regimes add weights and threshold settings. Moving a UI knob therefore only
+# recomputes the layers below it and never touches the network.
+RAW_CACHE = LRUCache("raw", 256)
+FEATURE_CACHE = LRUCache("features", 512)
+CLP_CACHE = LRUCache("clp", 1024)
+FIGURE_CACHE = LRUCache("figures", 64)
+
+
+def frame_version(df: pd.DataFrame) -> Tuple:
+    # Content signature: a hash over the bar times and every numeric column, so an edit
+    # anywhere in the frame (a late funding fill, a revised bar) gives a new version.
+    if df.empty:
+        return (0,)
+    h = hashlib.sha1(df["time"].to_numpy("datetime64[ns]").view("int64").tobytes())
+    for c in df.columns:
+        if c != "time" and pd.api.types.is_numeric_dtype(df[c]):
+            h.update(c.encode())
+            h.update(df[c].to_numpy("float64", na_value=np.nan).tobytes())
+    return (len(df), h.hexdigest())
+
+
+def raw_frames(
+    symbols: Iterable[str],
+    interval: str,
+    lookback: int,
+    max_age: float = RAW_MAX_AGE_SECONDS,
+) -> Tuple[Dict[str, pd.DataFrame], Dict[str, str]]:
+    # An entry stays fresh until its open candle closes or max_age passes, whichever is first.
+    # With CLP_SHARED_CACHE_DIR set, local misses go through the cross-process cache.
+    now = time.time()
+    frames: Dict[str, pd.DataFrame] = {}
+    stale: List[str] = []
+    for sym in dict.fromkeys(symbols):
+        entry = RAW_CACHE.get((sym, interval, lookback))
+        if entry is not None and now < entry[1]:
+            frames[sym] = entry[0]
+        else:
+            stale.append(sym)
+
+    errors: Dict[str, str] = {}
+    if stale:
+        fetch = lambda syms: _fetch_frames(syms, interval, lookback, max_age)
+        shared = get_shared_cache()
+        fetched, errors = shared.frames(stale, interval, lookback, fetch, now) if shared else fetch(stale)
+        for sym, (df, expires) in fetched.items():
+            RAW_CACHE.put((sym, interval, lookback), (df, expires))
+            frames[sym] = df
+    return frames, errors
+
+
+def _fetch_frames(
+    symbols: List[str],
+    interval: str,
+    lookback: int,
+    max_age: float,
+) -> Tuple[Dict[str, Tuple[pd.DataFrame, float]], Dict[str, str]]:
+    now = time.time()
+    iv = INTERVAL_MS[interval] / 1000
+    out: Dict[str, Tuple[pd.DataFrame, float]] = {}
+    errors: Dict[str, str] = {}
+    for sym, res in build_merged_frames(symbols, interval=interval, lookback_limit=lookback).items():
+        if isinstance(res, Exception):
+            errors[sym] = str(res)
+            continue
+        bar_close = res["time"].iloc[-1].timestamp() + iv if not res.empty else now
+        out[sym] = (res, min(now + max_age, bar_close))
+    return out, errors
+
+
+def _features(symbol: str, interval: str, df: pd.DataFrame, zwin: int) -> np.ndarray:
+    with metrics.timer("stage_seconds", stage="features", symbol=symbol):
+        return streaming_features(df, key=(symbol, interval), zwin=zwin)
+
+
+def cached_features(symbol: str, interval: str, df: pd.DataFrame, zwin: int) -> Tuple[np.ndarray, Tuple]:
+    version = frame_version(df)
+    feats = FEATURE_CACHE.get_or_compute(
+        (symbol, interval, zwin, version),
+        lambda: _features(symbol, interval, df, zwin),
+    )
+    return feats, version
+
+
+def cached_snapshot(
+    symbol: str,
+    interval: str,
+    df: pd.DataFrame,
+    zwin: int,
+    wF: float,
+    wOI: float,
+    wR: float,
+    thr_mode: str,
+    p_stress: float,
+    p_extreme: float,
+    k_stress: float,
+    k_extreme: float,
+    thr_window: Optional[int] = None,
+) -> Tuple[SymbolState, dict]:
+    feats, version = cached_features(symbol, interval, df, zwin)
+    key = (symbol, interval, zwin, version, wF, wOI, wR,
+           thr_mode, p_stress, p_extreme, k_stress, k_extreme, thr_window)
+
+    def compute():
+        out, snap = compute_snapshot(
+            symbol, interval, df, zwin,
+            wF, wOI, wR,
+            thr_mode, p_stress, p_extreme,
+            k_stress, k_extreme,
+            feats=feats, thr_window=thr_window,
+        )
+        # Entries are kept as compact float32 buffers; the frame is materialised when rendered.
+        return SymbolState.from_frame(out, symbol, interval), snap
+
+    return CLP_CACHE.get_or_compute(key, compute)
+
+
+def frame_fingerprint(df: pd.DataFrame, cols: List[str]) -> int:
+    # Content hash of just the plotted columns; far cheaper than rebuilding a figure.
+    return int(pd.util.hash_pandas_object(df[cols], index=False).to_numpy().sum())
+
+
+def cached_figure(symbol: str, name: str, df: pd.DataFrame, cols: List[str], fn: Callable[[], Any], *params: Any) -> Any:
+    # Reruns with unchanged data and settings get the very same figure object back.
+    key = (symbol, name, len(df), frame_fingerprint(df, cols), params)
+    return FIGURE_CACHE.get_or_compute(key, fn)
+
+
+def cache_stats() -> List[Dict[str, Any]]:
+    rows = [
+        {"layer": c.name, "entries": len(c), "maxsize": c.maxsize, "hits": c.hits, "misses": c.misses}
+        for c in (RAW_CACHE, FEATURE_CACHE, CLP_CACHE, FIGURE_CACHE)
+    ]
+    shared = get_shared_cache()
+    if shared is not None:
+        rows.append(shared.stats())
+    return rows
@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import pickle
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import pandas as pd
+
+from src import metrics
+from src.binance_api import build_merged_frames
+from src.alerts import AlertEngine, StreamAlerts, config_key, make_sink
+from src.cross_section import get_cross_section, universe_key
+from src.pipeline import compute_snapshot, compute_watchlist, rank_watchlist
+from src.state import append_snapshot
+from src.symbol_state import sync_states
+
+STATE_DIR = os.environ.get("CLP_STATE_DIR", "collector_state")
+STATE_FILE = "latest.pkl"
+METRICS_FILE = "metrics.prom"
+
+log = logging.getLogger("clp.collector")
+
+_cache: Dict[str, Any] = {"path": None, "mtime": None, "state": None}
+_cache_lock = threading.Lock()
+
+
+def write_state(state: Dict[str, Any], state_dir: Optional[str] = None) -> str:
+    state_dir = state_dir or STATE_DIR
+    os.makedirs(state_dir, exist_ok=True)
+    path = os.path.join(state_dir, STATE_FILE)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    return path
+
+
+def read_state(state_dir: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    # Re-reads the file only when the collector has replaced it.
+    path = os.path.join(state_dir or STATE_DIR, STATE_FILE)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _cache_lock:
+        if _cache["path"] != path or _cache["mtime"] != mtime:
+            with open(path, "rb") as f:
+                _cache.update(path=path, mtime=mtime, state=pickle.load(f))
+        return _cache["state"]
+
+
+class Collector:
+    def __init__(
+        self,
+        symbols: List[str],
+        interval: str = "1h",
+        lookback: int = 500,
+        zwin: int = 120,
+        wF: float = 0.5,
+        wOI: float = 0.3,
+        wR: float = 0.2,
+        thr_mode: str = "percentile",
+        p_stress: float = 0.85,
+        p_extreme: float = 0.95,
+        k_stress: float = 1.0,
+        k_extreme: float = 2.0,
+        thr_window: Optional[int] = None,
+        universe_top: int = 0,
+        min_quote_volume: Optional[float] = None,
+        alert_sinks: Sequence[str] = (),
+        alert_hysteresis: float = 0.0,
+        alert_debounce: float = 0.0,
+        every: float = 30.0,
+        streaming: bool = False,
+        keep_history: bool = True,
+        state_dir: Optional[str] = None,
+    ):
+        s = wF + wOI + wR
+        if s <= 0:
+            wF, wOI, wR, s = 0.5, 0.3, 0.2, 1.0
+        self.config = {
+            "symbols": list(dict.fromkeys(symbols)),
+            "interval": interval,
+            "lookback": lookback,
+            "zwin": zwin,
+            "wF": wF / s,
+            "wOI": wOI / s,
+            "wR": wR / s,
+            "thr_mode": thr_mode,
+            "p_stress": p_stress,
+            "p_extreme": p_extreme,
+            "k_stress": k_stress,
+            "k_extreme": k_extreme,
+            "thr_window": thr_window,
+        }
+        self.universe_top = universe_top
+        self.min_quote_volume = min_quote_volume
+        self.every = every
+        self.streaming = streaming
+        self.keep_history = keep_history
+        self.state_dir = state_dir or STATE_DIR
+        self.alerts = AlertEngine([make_sink(spec) for spec in alert_sinks], alert_hysteresis, alert_debounce)
+        self._stream = None
+        self._stream_alerts = None
+        # Called with each tick's state, e.g. SnapshotStore.publish for --serve.
+        self.listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+    def fetch(self):
+        cfg = self.config
+        if self.streaming:
+            if self._stream is None or self._stream.symbols != cfg["symbols"]:
+                from src.stream import get_stream
+
+                self._stream = get_stream(cfg["symbols"], cfg["interval"], cfg["lookback"])
+                if self._stream_alerts is not None:
+                    self._stream_alerts.stop()
+                self._stream_alerts = StreamAlerts(self.alerts, self._stream, self.score, config_key(self.config))
+            return self._stream.frames(cfg["lookback"])
+
+        frames, errors = {}, {}
+        res = build_merged_frames(cfg["symbols"], interval=cfg["interval"], lookback_limit=cfg["lookback"])
+        for sym, r in res.items():
+            if isinstance(r, Exception):
+                errors[sym] = str(r)
+            else:
+                frames[sym] = r
+        return frames, errors
+
+    def score(self, symbol: str, df: pd.DataFrame):
+        cfg = self.config
+        return compute_snapshot(
+            symbol, cfg["interval"], df, cfg["zwin"],
+            cfg["wF"], cfg["wOI"], cfg["wR"],
+            cfg["thr_mode"], cfg["p_stress"], cfg["p_extreme"],
+            cfg["k_stress"], cfg["k_extreme"],
+            thr_window=cfg["thr_window"],
+        )
+
+    def tick(self) -> Dict[str, Any]:
+        if self.universe_top:
+            from src.universe import MIN_QUOTE_VOLUME, candidates, scan_universe
+
+            scan = scan_universe(
+                self.universe_top, self.min_quote_volume or MIN_QUOTE_VOLUME,
+                self.config["wF"], self.config["wR"],
+            )
+            self.config = {**self.config, "symbols": candidates(scan)}
+        cfg = self.config
+        raw, fetch_errors = self.fetch()
+        snapshots, frames = compute_watchlist(
+            raw, fetch_errors, cfg["symbols"], cfg["interval"], cfg["zwin"],
+            cfg["wF"], cfg["wOI"], cfg["wR"],
+            cfg["thr_mode"], cfg["p_stress"], cfg["p_extreme"],
+            cfg["k_stress"], cfg["k_extreme"],
+            thr_window=cfg["thr_window"],
+        )
+        config = config_key(cfg)
+        universe = universe_key(cfg["symbols"], self.universe_top)
+        self.alerts.evaluate_watchlist(snapshots, cfg["interval"], config=config)
+        with metrics.timer("stage_seconds", stage="cross_section"):
+            get_cross_section(cfg["interval"], universe, config).update(frames)
+        # Frames are kept (and pickled) as compact per-symbol ring buffers.
+        frames = sync_states(frames, cfg["interval"], cfg["lookback"])
+        good = rank_watchlist(pd.DataFrame(snapshots))
+        if self.keep_history and "clp" in good.columns:
+            append_snapshot(good)
+
+        state = {
+            "updated": datetime.now(timezone.utc),
+            "config": cfg,
+            "universe": universe,
+            "snapshots": snapshots,
+            "frames": frames,
+        }
+        write_state(state, self.state_dir)
+        for fn in self.listeners:
+            fn(state)
+        if metrics.ENABLED:
+            # Prometheus textfile-collector format, refreshed every tick.
+            metrics.write_prometheus(os.path.join(self.state_dir, METRICS_FILE))
+        return state
+
+    def run_forever(self) -> None:
+        log.info("collecting %s @ %s every %ss", ",".join(self.config["symbols"]), self.config["interval"], self.every)
+        while True:
+            started = time.time()
+            try:
+                state = self.tick()
+                errors = [s["symbol"] for s in state["snapshots"] if "error" in s]
+                log.info("tick done in %.2fs%s", time.time() - started, f" (failed: {', '.join(errors)})" if errors else "")
+            except Exception:
+                log.exception("tick failed")
+            # Stay on a fixed wall-clock grid so restarts and slow ticks do not drift.
+            time.sleep(max(0.0, self.every - time.time() % self.every))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    p = argparse.ArgumentParser(description="Headless CLP collector shared by all dashboard sessions.")
+    p.add_argument("--symbols", default="BTCUSDT,ETHUSDT,SOLUSDT", help="comma-separated watchlist")
+    p.add_argument("--interval", default="1h")
+    p.add_argument("--lookback", type=int, default=500)
+    p.add_argument("--zwin", type=int, default=120)
+    p.add_argument("--weights", default="0.5,0.3,0.2", help="w(Funding),w(dOI%%),w(|return|)")
+    p.add_argument("--thr-mode", choices=["percentile", "std"], default="percentile")
+    p.add_argument("--p-stress", type=float, default=0.85)
+    p.add_argument("--p-extreme", type=float, default=0.95)
+    p.add_argument("--k-stress", type=float, default=1.0)
+    p.add_argument("--k-extreme", type=float, default=2.0)
+    p.add_argument("--thr-window", type=int, default=None,
+                   help="per-bar thresholds from the last N bars (0 = expanding from the first bar of the lookback); default uses the full history")
+    p.add_argument("--universe-top", type=int, default=0,
+                   help="scan all USDT perpetuals each tick and track the top K instead of --symbols")
+    p.add_argument("--min-quote-volume", type=float, default=None, help="24h USDT volume floor for --universe-top")
+    p.add_argument("--alert-sink", action="append", default=[], metavar="SPEC",
+                   help="send regime flips to stdout, file:<path> or webhook:<url> (repeatable)")
+    p.add_argument("--alert-hysteresis", type=float, default=0.0,
+                   help="CLP must fall this far below a threshold before its regime is left")
+    p.add_argument("--alert-debounce", type=float, default=0.0, help="seconds a new regime must hold before it alerts")
+    p.add_argument("--every", type=float, default=30.0, help="seconds between ticks")
+    p.add_argument("--stream", action="store_true", help="ingest over WebSocket instead of REST polling")
+    p.add_argument("--no-history", action="store_true", help="do not append snapshots to the history db")
+    p.add_argument("--state-dir", default=None)
+    p.add_argument("--once", action="store_true", help="run a single tick and exit")
+    p.add_argument("--serve", default=None, metavar="[HOST:]PORT",
+                   help="also serve each tick's snapshot and CLP series as JSON (see src.api)")
+    args = p.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    wF, wOI, wR = (float(w) for w in args.weights.split(","))
+    collector = Collector(
+        symbols=[s.strip().upper() for s in args.symbols.split(",") if s.strip()],
+        interval=args.interval,
+        lookback=args.lookback,
+        zwin=args.zwin,
+        wF=wF, wOI=wOI, wR=wR,
+        thr_mode=args.thr_mode,
+        p_stress=args.p_stress, p_extreme=args.p_extreme,
+        k_stress=args.k_stress, k_extreme=args.k_extreme,
+        thr_window=args.thr_window,
+        universe_top=args.universe_top,
+        min_quote_volume=args.min_quote_volume,
+        alert_sinks=args.alert_sink,
+        alert_hysteresis=args.alert_hysteresis,
+        alert_debounce=args.alert_debounce,
+        every=args.every,
+        streaming=args.stream,
+        keep_history=not args.no_history,
+        state_dir=args.state_dir,
+    )
+    if args.serve:
+        from src.api import API_HOST, SnapshotServer, SnapshotStore
+
+        host, _, port = args.serve.rpartition(":")
+        store = SnapshotStore()
+        SnapshotServer(store, host or API_HOST, int(port)).start()
+        collector.listeners.append(store.publish)
+    if args.once:
+        collector.tick()
+        collector.alerts.flush()
+    else:
+        collector.run_forever()
+
+
+if __name__ == "__main__":
+    main()
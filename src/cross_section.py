@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.scoring import REGIMES
+from src.state import SNAPSHOT_DB
+from src.symbol_state import SymbolState, as_frame
+
+TOP_PCT = 0.10
+TOP_K = 5
+MIN_N = 3
+XS_COLS = ["n", "mean_clp", "dispersion", "crowding_index", "share_stress", "share_extreme", "breadth"]
+
+
+def heavy_count(n: np.ndarray, top_pct: float = TOP_PCT) -> np.ndarray:
+    # The k for which the k-th largest of n values is the smallest one at or above
+    # np.percentile(x, 100 * (1 - top_pct)), the cut-off crowding_index() uses; the
+    # percentile's rank is (1 - top_pct) * (n - 1). Values tied with it are also "heavy".
+    rank = np.round((1.0 - top_pct) * (np.asarray(n) - 1), 9)
+    return np.asarray(n) - np.ceil(rank).astype(np.int64)
+
+
+def cross_section_rows(
+    clp: np.ndarray,
+    regime: np.ndarray,
+    top_pct: float = TOP_PCT,
+    top_k: int = TOP_K,
+    min_n: int = MIN_N,
+) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    # Market-wide metrics for every row of (time x symbols) CLP and regime-code arrays; NaN
+    # CLP means the symbol has no valid bar there. Partial selection replaces the per-row
+    # sort of nanpercentile. Returns the metric columns and the top_k symbol indices by
+    # |CLP| per row (-1 where fewer symbols are valid).
+    T, S = clp.shape
+    valid = ~np.isnan(clp)
+    n = valid.sum(axis=1)
+    a = np.where(valid, np.abs(clp), -1.0)  # invalid cells sort below every |CLP|
+    safe_n = np.maximum(n, 1)
+
+    mean = np.where(valid, clp, 0.0).sum(axis=1) / safe_n
+    var = np.where(valid, (clp - mean[:, None]) ** 2, 0.0).sum(axis=1) / safe_n
+    abs_mean = np.where(valid, a, 0.0).sum(axis=1) / safe_n
+
+    cut = np.full(T, np.inf)
+    enough = n >= min_n
+    m = heavy_count(n, top_pct)
+    for k in np.unique(m[enough]):
+        rows = enough & (m == k)
+        cut[rows] = np.partition(a[rows], S - k, axis=1)[:, S - k]
+    heavy = a >= cut[:, None]
+    with np.errstate(invalid="ignore"):
+        ci = np.where(heavy, a, 0.0).sum(axis=1) / heavy.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ci = np.where(abs_mean > 0, ci / abs_mean, np.nan)
+
+    stress = (valid & (regime == 1)).sum(axis=1)
+    extreme = (valid & (regime == 2)).sum(axis=1)
+    none = n == 0
+    out = {
+        "n": n,
+        "mean_clp": np.where(none, np.nan, mean),
+        "dispersion": np.where(none, np.nan, np.sqrt(var)),
+        "crowding_index": ci,
+        "share_stress": np.where(none, np.nan, stress / safe_n),
+        "share_extreme": np.where(none, np.nan, extreme / safe_n),
+        "breadth": np.where(none, np.nan, (stress + extreme) / safe_n),
+    }
+
+    k = min(top_k, S)
+    if k == 0:
+        return out, np.empty((T, 0), dtype=np.int64)
+    top = np.argpartition(-a, k - 1, axis=1)[:, :k]
+    vals = np.take_along_axis(a, top, axis=1)
+    order = np.argsort(-vals, axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    top[np.take_along_axis(vals, order, axis=1) < 0] = -1
+    return out, top
+
+
+def cross_section_frame(
+    times: np.ndarray,
+    symbols: List[str],
+    clp: np.ndarray,
+    regime: np.ndarray,
+    top_pct: float = TOP_PCT,
+    top_k: int = TOP_K,
+) -> pd.DataFrame:
+    cols, top = cross_section_rows(clp, regime, top_pct=top_pct, top_k=top_k)
+    names = np.array(list(symbols) + [""], dtype=object)  # -1 picks the blank
+    out = pd.DataFrame({"time": pd.to_datetime(times, unit="ms", utc=True), **cols})
+    out["top_symbols"] = [",".join(s for s in row if s) for row in names[top]]
+    return out
+
+
+def align(
+    frames: Dict[str, Union[pd.DataFrame, SymbolState]],
+    since: Optional[int] = None,
+) -> Tuple[np.ndarray, List[str], np.ndarray, np.ndarray]:
+    # Scored per-symbol frames (clp + regime) on one shared time index, from bar `since` on.
+    parts = {}
+    for sym, f in frames.items():
+        f = as_frame(f)
+        if f is None or f.empty or "clp" not in f.columns:
+            continue
+        t = f["time"].values.astype("datetime64[ms]").astype(np.int64)
+        lo = int(np.searchsorted(t, since)) if since is not None else 0
+        codes = pd.Categorical(f["regime"].iloc[lo:], categories=REGIMES).codes
+        parts[sym] = (t[lo:], f["clp"].to_numpy(dtype=float)[lo:], codes)
+
+    symbols = list(parts)
+    times = np.unique(np.concatenate([p[0] for p in parts.values()])) if parts else np.empty(0, dtype=np.int64)
+    clp = np.full((len(times), len(symbols)), np.nan)
+    regime = np.zeros((len(times), len(symbols)), dtype=np.int8)
+    for j, (t, c, r) in enumerate(parts.values()):
+        pos = np.searchsorted(times, t)
+        clp[pos, j] = c
+        regime[pos, j] = r
+    return times, symbols, clp, regime
+
+
+def universe_key(symbols: Iterable[str], universe_top: int = 0) -> str:
+    # What a history row is "market-wide" over: the top-K universe scan, or a fixed watchlist.
+    if universe_top:
+        return f"top{universe_top}"
+    return "list:" + hashlib.sha1(",".join(sorted(symbols)).encode()).hexdigest()[:12]
+
+
+def _init_db(conn: sqlite3.Connection) -> None:
+    cols = ", ".join(f"{c} {'INTEGER' if c == 'n' else 'REAL'}" for c in XS_COLS)
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS cross_section (interval TEXT NOT NULL, universe TEXT NOT NULL, "
+        f"config TEXT NOT NULL, ts INTEGER NOT NULL, {cols}, top_symbols TEXT, "
+        "PRIMARY KEY (interval, universe, config, ts)) WITHOUT ROWID"
+    )
+    conn.commit()
+
+
+def connect(path: Optional[str] = None) -> sqlite3.Connection:
+    conn = sqlite3.connect(path or SNAPSHOT_DB, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    _init_db(conn)
+    return conn
+
+
+class CrossSectionHistory:
+    # Per-bar market-wide metrics for one interval, universe and set of scoring settings
+    # (alerts.config_key), persisted to snapshots.db so months of market crowding can be
+    # charted. A stored bar is final once a later one exists (its value as of when it
+    # closed); each update re-scores only the last stored bar (it may have been the open
+    # candle) and anything newer, so maintaining it costs a row or two per refresh. A gap
+    # since the last run is backfilled from whatever window is passed in.
+    def __init__(self, interval: str, universe: str, config: str, top_pct: float = TOP_PCT, top_k: int = TOP_K,
+                 path: Optional[str] = None):
+        self.interval = interval
+        self.universe = universe
+        self.config = config
+        self.top_pct = top_pct
+        self.top_k = top_k
+        self.lock = threading.Lock()
+        self.conn = connect(path)
+        self.last: Optional[int] = None
+
+    def update(self, frames: Dict[str, Union[pd.DataFrame, SymbolState]]) -> int:
+        return self.update_arrays(*align(frames, self.last))
+
+    def update_arrays(self, times: np.ndarray, symbols: List[str], clp: np.ndarray, regime: np.ndarray) -> int:
+        with self.lock:
+            # Re-read: another process (collector or dashboard) may feed the same history.
+            self.last = self.conn.execute(
+                "SELECT max(ts) FROM cross_section WHERE interval = ? AND universe = ? AND config = ?",
+                (self.interval, self.universe, self.config),
+            ).fetchone()[0]
+            lo = int(np.searchsorted(times, self.last)) if self.last is not None else 0
+            if lo >= len(times):
+                return 0
+            rows = cross_section_frame(times[lo:], symbols, clp[lo:], regime[lo:], self.top_pct, self.top_k)
+            ts = times[lo:][rows["n"].to_numpy() > 0]  # warm-up bars have no scored symbol yet
+            rows = rows[rows["n"] > 0]
+            values = rows[XS_COLS].astype(object).where(rows[XS_COLS].notna(), None)
+            records = [
+                (self.interval, self.universe, self.config, int(t), *v, top)
+                for t, v, top in zip(ts, values.itertuples(index=False, name=None), rows["top_symbols"])
+            ]
+            names = ", ".join(XS_COLS)
+            updates = ", ".join(f"{c} = excluded.{c}" for c in XS_COLS + ["top_symbols"])
+            with self.conn:
+                self.conn.executemany(
+                    f"INSERT INTO cross_section (interval, universe, config, ts, {names}, top_symbols) "
+                    f"VALUES ({', '.join('?' * (len(XS_COLS) + 5))}) "
+                    f"ON CONFLICT (interval, universe, config, ts) DO UPDATE SET {updates}",
+                    records,
+                )
+            if len(ts):
+                self.last = int(ts[-1])
+            return len(records)
+
+
+def load_cross_section(
+    interval: str,
+    universe: str,
+    config: str,
+    since: Optional[pd.Timestamp] = None,
+    limit: Optional[int] = None,
+    path: Optional[str] = None,
+) -> pd.DataFrame:
+    # Oldest first; `limit` keeps the most recent bars.
+    where, params = "interval = ? AND universe = ? AND config = ?", [interval, universe, config]
+    if since is not None:
+        where += " AND ts >= ?"
+        params.append(int(pd.Timestamp(since).value // 1_000_000))
+    conn = connect(path)
+    try:
+        df = pd.read_sql_query(
+            f"SELECT ts, {', '.join(XS_COLS)}, top_symbols FROM cross_section WHERE {where} "
+            "ORDER BY ts DESC LIMIT ?",
+            conn, params=[*params, -1 if limit is None else int(limit)],
+        )
+    finally:
+        conn.close()
+    df = df.iloc[::-1].reset_index(drop=True)
+    df.insert(0, "time", pd.to_datetime(df.pop("ts"), unit="ms", utc=True))
+    return df
+
+
+_histories: Dict[Tuple[str, str, str], CrossSectionHistory] = {}
+_histories_lock = threading.Lock()
+
+
+def get_cross_section(interval: str, universe: str, config: str) -> CrossSectionHistory:
+    key = (interval, universe, config)
+    with _histories_lock:
+        h = _histories.get(key)
+        if h is None:
+            h = _histories[key] = CrossSectionHistory(interval, universe, config)
+        return h
@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import threading
+from typing import Dict, Hashable, Tuple
+
 import numpy as np
 import pandas as pd
 
@@ -28,4 +31,242 @@ def add_zscores(df: pd.DataFrame, zwin: int = 120) -> pd.DataFrame:
     out["z_funding"] = rolling_zscore(out["fundingRate"], window=zwin)
     out["z_oi"] = rolling_zscore(out["oi_chg_pct"], window=zwin)
     out["z_absret"] = rolling_zscore(out["abs_ret"], window=zwin)
-    return out
\ No newline at end of file
+    return out
+
+
+def _window_sum(a: np.ndarray, window: int) -> np.ndarray:
+    c = np.cumsum(a, axis=0)
+    c[window:] -= c[:-window].copy()
+    return c
+
+
+def rolling_zscore_2d(x: np.ndarray, window: int = 120) -> np.ndarray:
+    # Column-wise rolling_zscore for a (time x symbols) array, with pandas' NaN and
+    # constant-window semantics. Sums run on column-centred data to limit cancellation.
+    nan = np.isnan(x)
+    center = np.nanmean(np.where(nan.all(axis=0), 0.0, x), axis=0) if len(x) else 0.0
+    xc = np.where(nan, 0.0, x - center)
+
+    mean = _window_sum(xc, window) / window
+    var = _window_sum(xc * xc, window) / window
+    var -= mean * mean
+    np.maximum(var, 0.0, out=var)
+
+    changed = np.zeros(x.shape, dtype=np.int64)
+    changed[1:] = x[1:] != x[:-1]
+    constant = _window_sum(changed, window - 1) == 0 if window > 1 else np.ones(x.shape, dtype=bool)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (xc - mean) / np.sqrt(var)
+    z[_window_sum(nan.astype(np.int64), window) > 0] = np.nan
+    z[constant | (var == 0)] = np.nan
+    z[: window - 1] = np.nan
+    return z
+
+
+def pct_change_2d(x: np.ndarray) -> np.ndarray:
+    # pct_change() with its default forward-fill of interior gaps, along axis 0.
+    rows = np.arange(len(x))[:, None]
+    idx = np.maximum.accumulate(np.where(np.isnan(x), 0, rows), axis=0)
+    filled = np.take_along_axis(x, idx, axis=0)
+    out = np.full(x.shape, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[1:] = filled[1:] / filled[:-1] - 1.0
+    return out
+
+
+class RollingZScore:
+    # Welford mean/M2 over a fixed ring buffer; matches rolling(window) with ddof=0.
+    def __init__(self, window: int):
+        self.window = int(window)
+        self.buf = np.full(self.window, np.nan)
+        self.pos = 0
+        self.count = 0
+        self.n = 0
+        self.nans = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.same = 0
+        self._same_prev = 0
+        self._since_resync = 0
+
+    def _add(self, x: float) -> None:
+        if x != x:
+            self.nans += 1
+            return
+        self.n += 1
+        d = x - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (x - self.mean)
+
+    def _remove(self, x: float) -> None:
+        if x != x:
+            self.nans -= 1
+            return
+        self.n -= 1
+        if self.n == 0:
+            self.mean = self.m2 = 0.0
+            return
+        d = x - self.mean
+        self.mean -= d / self.n
+        self.m2 -= d * (x - self.mean)
+
+    def _resync(self) -> None:
+        x = self.buf if self.count == self.window else self.buf[: self.count]
+        x = x[~np.isnan(x)]
+        self.n = len(x)
+        self.mean = float(x.mean()) if self.n else 0.0
+        self.m2 = float(((x - self.mean) ** 2).sum()) if self.n else 0.0
+        self._since_resync = 0
+
+    def _z(self, x: float) -> float:
+        if self.count < self.window or self.nans or x != x or self.same >= self.window:
+            return float("nan")
+        sd = np.sqrt(max(self.m2, 0.0) / self.window)
+        return float((x - self.mean) / sd) if sd > 0 else float("nan")
+
+    def push(self, x: float) -> float:
+        x = float(x)
+        prev = self.buf[(self.pos - 1) % self.window] if self.count else float("nan")
+        if self.count == self.window:
+            self._remove(self.buf[self.pos])
+        else:
+            self.count += 1
+        self.buf[self.pos] = x
+        self.pos = (self.pos + 1) % self.window
+        self._add(x)
+
+        self._same_prev = self.same
+        self.same = self.same + 1 if x == prev else 1
+
+        self._since_resync += 1
+        if self._since_resync >= self.window:
+            self._resync()
+        return self._z(x)
+
+    def replace_last(self, x: float) -> float:
+        x = float(x)
+        i = (self.pos - 1) % self.window
+        self._remove(self.buf[i])
+        self.buf[i] = x
+        self._add(x)
+
+        prev = self.buf[(self.pos - 2) % self.window] if self.count > 1 else float("nan")
+        self.same = self._same_prev + 1 if x == prev else 1
+        return self._z(x)
+
+
+def first_change(times: np.ndarray, inputs: np.ndarray, t: np.ndarray, x: np.ndarray) -> Tuple[int, int]:
+    # Diff a sliding (times, inputs) window against the stored one. Returns (k, m): new row 0
+    # is stored row k, and new row m is the first one that differs (m = 0: start over).
+    if not len(times) or not len(t):
+        return 0, 0
+    k = int(np.searchsorted(times, t[0]))
+    overlap = min(len(times) - k, len(t))
+    if overlap <= 0 or not np.array_equal(times[k:k + overlap], t[:overlap]):
+        return 0, 0
+    old = inputs[k:k + overlap]
+    new = x[:overlap]
+    same = ((old == new) | (np.isnan(old) & np.isnan(new))).all(axis=1)
+    changed = np.flatnonzero(~same)
+    return k, int(changed[0]) if len(changed) else overlap
+
+
+FEATURE_COLS = ["ret", "abs_ret", "oi_chg_pct", "z_funding", "z_oi", "z_absret"]
+INPUT_COLS = ["Close", "fundingRate", "openInterest"]
+
+
+class FeatureEngine:
+    # Incremental add_returns -> add_oi_change -> add_zscores over a sliding merged frame.
+    # Only rows whose inputs changed (normally the open candle) or that are new get
+    # recomputed; a late revision further back replays just the last zwin bars.
+    def __init__(self, zwin: int = 120):
+        self.zwin = int(zwin)
+        self.lock = threading.Lock()
+        self.times = np.empty(0, dtype=np.int64)
+        self.inputs = np.empty((0, len(INPUT_COLS)))
+        self.out = np.empty((0, len(FEATURE_COLS)))
+        self._reset_state()
+
+    def _reset_state(self) -> None:
+        self.z = [RollingZScore(self.zwin) for _ in range(3)]
+        self._log_close = self._prev_log_close = float("nan")
+        self._oi = self._prev_oi = float("nan")
+
+    def _step(self, close: float, funding: float, oi: float, replace: bool = False) -> Tuple[float, ...]:
+        if not replace:
+            self._prev_log_close, self._prev_oi = self._log_close, self._oi
+        log_close = float(np.log(close))
+        ret = log_close - self._prev_log_close
+        oi = oi if oi == oi else self._prev_oi
+        oi_chg = oi / self._prev_oi - 1.0
+        self._log_close, self._oi = log_close, oi
+
+        zf, zo, zr = self.z
+        if replace:
+            z = zf.replace_last(funding), zo.replace_last(oi_chg), zr.replace_last(abs(ret))
+        else:
+            z = zf.push(funding), zo.push(oi_chg), zr.push(abs(ret))
+        return (ret, abs(ret), oi_chg) + z
+
+    def ingest(self, df: pd.DataFrame) -> np.ndarray:
+        t = df["time"].values.astype("datetime64[ms]").astype(np.int64)
+        x = df[INPUT_COLS].to_numpy(dtype=float)
+        n = len(t)
+
+        with self.lock:
+            k, m = first_change(self.times, self.inputs, t, x)
+            stored_last = len(self.times) - 1 - k
+            out = np.empty((n, len(FEATURE_COLS)))
+            out[:m] = self.out[k:k + m]
+
+            if m == stored_last and m < n:
+                out[m] = self._step(*x[m], replace=True)
+                m += 1
+            elif m < stored_last or m == 0:
+                self._reset_state()
+                for i in range(max(0, m - self.zwin - 1), m):
+                    self._step(*x[i])
+            for i in range(m, n):
+                out[i] = self._step(*x[i])
+
+            self.times, self.inputs, self.out = t, x, out
+            return out
+
+
+_engines: Dict[Tuple[Hashable, int], FeatureEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(key: Hashable, zwin: int) -> FeatureEngine:
+    with _engines_lock:
+        eng = _engines.get((key, zwin))
+        if eng is None:
+            eng = _engines[(key, zwin)] = FeatureEngine(zwin)
+        return eng
+
+
+def clear_engines() -> None:
+    with _engines_lock:
+        _engines.clear()
+
+
+def streaming_features(df: pd.DataFrame, key: Hashable, zwin: int = 120) -> np.ndarray:
+    feats = get_engine(key, zwin).ingest(df).copy()
+    # Mirror the batch warm-up so results match add_zscores on the same rows.
+    oi_ok = np.flatnonzero(df["openInterest"].notna().to_numpy())
+    first_oi = int(oi_ok[0]) if len(oi_ok) else len(df)
+    feats[:1, :2] = np.nan
+    feats[: first_oi + 1, 2] = np.nan
+    feats[: zwin - 1, 3] = np.nan
+    feats[: first_oi + zwin, 4] = np.nan
+    feats[:zwin, 5] = np.nan
+    return feats
+
+
+def add_features_streaming(df: pd.DataFrame, key: Hashable, zwin: int = 120) -> pd.DataFrame:
+    feats = streaming_features(df, key=key, zwin=zwin)
+    out = df.copy()
+    for j, c in enumerate(FEATURE_COLS):
+        out[c] = feats[:, j]
+    return out
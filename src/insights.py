@@ -1,35 +1,175 @@
 from __future__ import annotations
 
+import threading
+from collections import OrderedDict
+from typing import Hashable, List, Optional
+
+import numpy as np
 import pandas as pd
 
+from src.scoring import REGIMES
 
-def current_regime_streak(df: pd.DataFrame) -> dict:
+MAX_SEGMENTS = 20_000
+MAX_INDEXES = 256
 
-    if df is None or df.empty or "regime" not in df.columns:
-        return {"current_regime": "NA", "streak_bars": 0}
 
-    r = df["regime"].astype(str).values
-    cur = r[-1]
+def regime_code_array(df: pd.DataFrame) -> np.ndarray:
+    # -1 marks a missing or unknown label.
+    r = df["regime"]
+    if isinstance(r.dtype, pd.CategoricalDtype) and list(r.cat.categories) == REGIMES:
+        return r.cat.codes.to_numpy().astype(np.int8)
+    return r.astype(str).map({name: i for i, name in enumerate(REGIMES)}).fillna(-1).to_numpy().astype(np.int8)
+
+
+def _runs(codes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Run starts (positions) and run codes of a code array.
+    if not len(codes):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int8)
+    starts = np.r_[0, np.flatnonzero(codes[1:] != codes[:-1]) + 1]
+    return starts, codes[starts]
+
+
+class RegimeIndex:
+    # Run-length encoded regime history. Segments live in global bar numbering and
+    # outlive the bars that slide out of the frame, so past episodes keep their true
+    # durations. Each ingest only re-encodes bars from the first changed one onward.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.times = np.empty(0, dtype=np.int64)
+        self.codes = np.empty(0, dtype=np.int8)
+        self.offset = 0  # global index of times[0]
+        self.seg_start: List[int] = []
+        self.seg_code: List[int] = []
+
+    @property
+    def end(self) -> int:
+        return self.offset + len(self.times)
+
+    def _truncate(self, g: int) -> None:
+        # Drop everything from global bar g on.
+        while self.seg_start and self.seg_start[-1] >= g:
+            self.seg_start.pop()
+            self.seg_code.pop()
+
+    def _append(self, g: int, codes: np.ndarray) -> None:
+        starts, run_codes = _runs(codes)
+        if len(starts) and self.seg_code and self.seg_code[-1] == run_codes[0]:
+            starts, run_codes = starts[1:], run_codes[1:]
+        self.seg_start.extend((starts + g).tolist())
+        self.seg_code.extend(run_codes.tolist())
+        if len(self.seg_start) > MAX_SEGMENTS:
+            del self.seg_start[:-MAX_SEGMENTS]
+            del self.seg_code[:-MAX_SEGMENTS]
+
+    def ingest(self, times: np.ndarray, codes: np.ndarray) -> "RegimeIndex":
+        with self.lock:
+            k, m = 0, 0
+            if len(self.times) and len(times):
+                k = int(np.searchsorted(self.times, times[0]))
+                overlap = min(len(self.times) - k, len(times))
+                if overlap > 0 and self.times[k] == times[0]:
+                    same = (self.times[k:k + overlap] == times[:overlap]) & (self.codes[k:k + overlap] == codes[:overlap])
+                    bad = np.flatnonzero(~same)
+                    m = int(bad[0]) if len(bad) else overlap
+                else:
+                    k = -1
+            if k < 0 or (m == 0 and len(self.times)):
+                # Unrelated frame (other symbol, parameters changed at the first bar, gap).
+                self.seg_start, self.seg_code = [], []
+                self.offset = self.end
+                k = 0
+            else:
+                self.offset += k
+            g = self.offset + m
+            self._truncate(g)
+            self._append(g, codes[m:])
+            self.times, self.codes = times, codes
+            return self
+
+    def _lengths(self) -> np.ndarray:
+        return np.diff(np.r_[self.seg_start, self.end])
 
-    streak = 1
-    for i in range(len(r) - 2, -1, -1):
-        if r[i] == cur:
-            streak += 1
-        else:
-            break
+    def current_streak(self) -> dict:
+        if not self.seg_start:
+            return {"current_regime": "NA", "streak_bars": 0}
+        return {"current_regime": REGIMES[self.seg_code[-1]], "streak_bars": self.end - self.seg_start[-1]}
 
-    return {"current_regime": cur, "streak_bars": streak}
+    def time_share(self, lookback: Optional[int] = None) -> pd.DataFrame:
+        # Walks segments back from the newest one; O(segments in the window).
+        n = len(self.times) if lookback is None else min(lookback, len(self.times))
+        lo = self.end - n
+        counts = np.zeros(len(REGIMES), dtype=np.int64)
+        stop = self.end
+        for start, code in zip(reversed(self.seg_start), reversed(self.seg_code)):
+            counts[code] += stop - max(start, lo)
+            if start <= lo:
+                break
+            stop = start
+        out = pd.DataFrame({"regime": REGIMES, "count": counts})
+        out = out[out["count"] > 0].sort_values("count", ascending=False).reset_index(drop=True)
+        out["pct"] = out["count"] / max(n, 1) * 100.0
+        return out
 
+    def episodes(self, complete_only: bool = True) -> pd.DataFrame:
+        lengths = self._lengths()
+        out = pd.DataFrame({
+            "start_bar": self.seg_start,
+            "regime": pd.Categorical.from_codes(self.seg_code, categories=REGIMES),
+            "bars": lengths,
+        })
+        return out.iloc[:-1] if complete_only and len(out) else out
 
-def regime_time_share(df: pd.DataFrame, lookback: int = 300) -> pd.DataFrame:
+    def duration_stats(self) -> pd.DataFrame:
+        ep = self.episodes(complete_only=True)
+        stats = ep.groupby("regime", observed=False)["bars"].describe(percentiles=[0.5, 0.9])
+        return stats.rename(columns={"50%": "median", "90%": "p90"})
 
+    def transition_matrix(self, normalize: bool = True) -> pd.DataFrame:
+        codes = np.asarray(self.seg_code, dtype=np.int64)
+        m = np.zeros((len(REGIMES), len(REGIMES)))
+        if len(codes) > 1:
+            np.add.at(m, (codes[:-1], codes[1:]), 1)
+        if normalize:
+            rows = m.sum(axis=1, keepdims=True)
+            m = np.divide(m, rows, out=np.zeros_like(m), where=rows > 0)
+        return pd.DataFrame(m, index=pd.Index(REGIMES, name="from"), columns=pd.Index(REGIMES, name="to"))
+
+
+_indexes: "OrderedDict[Hashable, RegimeIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_regime_index(key: Hashable) -> RegimeIndex:
+    with _indexes_lock:
+        idx = _indexes.get(key)
+        if idx is None:
+            idx = _indexes[key] = RegimeIndex()
+            while len(_indexes) > MAX_INDEXES:
+                _indexes.popitem(last=False)
+        _indexes.move_to_end(key)
+        return idx
+
+
+def regime_index(df: pd.DataFrame, key: Optional[Hashable] = None) -> Optional[RegimeIndex]:
+    # With a key the index is kept between calls and only new or changed bars are encoded.
     if df is None or df.empty or "regime" not in df.columns:
-        return pd.DataFrame(columns=["regime", "count", "pct"])
+        return None
+    idx = get_regime_index(key) if key is not None else RegimeIndex()
+    times = df["time"].values.astype("datetime64[ms]").astype(np.int64)
+    codes = regime_code_array(df)
+    known = codes >= 0  # unlabelled bars are left out rather than indexed as a regime
+    return idx.ingest(times[known], codes[known])
+
 
-    x = df.tail(lookback).copy()
-    vc = x["regime"].value_counts(dropna=False)
+def current_regime_streak(df: pd.DataFrame, key: Optional[Hashable] = None) -> dict:
+    idx = regime_index(df, key)
+    if idx is None:
+        return {"current_regime": "NA", "streak_bars": 0}
+    return idx.current_streak()
 
-    out = vc.reset_index()
-    out.columns = ["regime", "count"]
-    out["pct"] = out["count"] / out["count"].sum() * 100.0
-    return out
\ No newline at end of file
+
+def regime_time_share(df: pd.DataFrame, lookback: int = 300, key: Optional[Hashable] = None) -> pd.DataFrame:
+    idx = regime_index(df, key)
+    if idx is None:
+        return pd.DataFrame(columns=["regime", "count", "pct"])
+    return idx.time_share(lookback)
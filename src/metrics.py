@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+# Process-wide timers and counters for the refresh path. Everything is a no-op unless
+# ENABLED, so instrumented hot paths cost one global lookup when metrics are off.
+ENABLED = os.environ.get("CLP_METRICS", "1").lower() not in ("0", "false", "no", "off")
+PREFIX = "clp_"
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+_counters: Dict[_Key, float] = {}
+_timers: Dict[_Key, List[float]] = {}  # [count, total seconds, max seconds]
+_lock = threading.Lock()
+
+
+def set_enabled(on: bool) -> None:
+    global ENABLED
+    ENABLED = bool(on)
+
+
+def _key(name: str, labels: Dict[str, Any]) -> _Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1.0, **labels: Any) -> None:
+    if not ENABLED:
+        return
+    k = _key(name, labels)
+    with _lock:
+        _counters[k] = _counters.get(k, 0.0) + value
+
+
+def observe(name: str, seconds: float, **labels: Any) -> None:
+    if not ENABLED:
+        return
+    k = _key(name, labels)
+    with _lock:
+        t = _timers.get(k)
+        if t is None:
+            _timers[k] = [1, seconds, seconds]
+        else:
+            t[0] += 1
+            t[1] += seconds
+            if seconds > t[2]:
+                t[2] = seconds
+
+
+class _Timer:
+    __slots__ = ("name", "labels", "t0")
+
+    def __init__(self, name: str, labels: Dict[str, Any]):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        observe(self.name, time.perf_counter() - self.t0, **self.labels)
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopTimer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+_NOOP = _NoopTimer()
+
+
+def timer(name: str, **labels: Any):
+    return _Timer(name, labels) if ENABLED else _NOOP
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _timers.clear()
+
+
+def counter_rows() -> List[Dict[str, Any]]:
+    with _lock:
+        items = list(_counters.items())
+    return [{"metric": name, **dict(labels), "value": v} for (name, labels), v in sorted(items)]
+
+
+def timer_rows() -> List[Dict[str, Any]]:
+    with _lock:
+        items = [(k, list(v)) for k, v in _timers.items()]
+    return [
+        {"metric": name, **dict(labels), "count": int(n), "total_ms": total * 1000,
+         "mean_ms": total / n * 1000, "max_ms": mx * 1000}
+        for (name, labels), (n, total, mx) in sorted(items)
+    ]
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels) + "}"
+
+
+def prometheus_text() -> str:
+    # Prometheus text exposition format: counters as-is, timers as summaries plus a _max gauge.
+    with _lock:
+        counters = sorted(_counters.items())
+        timers = sorted((k, list(v)) for k, v in _timers.items())
+    lines: List[str] = []
+    seen = set()
+    for (name, labels), v in counters:
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# TYPE {PREFIX}{name} counter")
+        lines.append(f"{PREFIX}{name}{_labels(labels)} {v:g}")
+    # Each family has to be one contiguous group, so the _max gauges get a second pass.
+    for (name, labels), (n, total, _) in timers:
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# TYPE {PREFIX}{name} summary")
+        lab = _labels(labels)
+        lines.append(f"{PREFIX}{name}_count{lab} {int(n)}")
+        lines.append(f"{PREFIX}{name}_sum{lab} {total:.6f}")
+    for (name, labels), (_, _, mx) in timers:
+        if name + "_max" not in seen:
+            seen.add(name + "_max")
+            lines.append(f"# TYPE {PREFIX}{name}_max gauge")
+        lines.append(f"{PREFIX}{name}_max{_labels(labels)} {mx:.6f}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str) -> None:
+    # Atomic replace so a node_exporter textfile collector never reads half a file.
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(prometheus_text())
+    os.replace(tmp, path)
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.cross_section import cross_section_frame
+from src.features import FEATURE_COLS, pct_change_2d, rolling_zscore_2d
+from src.scoring import REGIMES, regime_categorical, rolling_thresholds
+
+PANEL_INPUTS = ["Close", "fundingRate", "openInterest"]
+
+
+class Panel:
+    # Watchlist merged frames aligned on one shared time index as (time x symbols) arrays.
+    def __init__(self, frames: Dict[str, pd.DataFrame]):
+        self.frames = frames
+        self.symbols: List[str] = list(frames)
+        stamps = [f["time"].values.astype("datetime64[ms]").astype(np.int64) for f in frames.values()]
+        self.times = np.unique(np.concatenate(stamps)) if stamps else np.empty(0, dtype=np.int64)
+
+        shape = (len(self.times), len(self.symbols))
+        self.data = {c: np.full(shape, np.nan) for c in PANEL_INPUTS}
+        self.complete = np.zeros(shape, dtype=bool)
+        self.positions: Dict[str, np.ndarray] = {}
+        for j, (sym, f) in enumerate(frames.items()):
+            pos = np.searchsorted(self.times, stamps[j])
+            self.positions[sym] = pos
+            for c in PANEL_INPUTS:
+                self.data[c][pos, j] = f[c].to_numpy(dtype=float)
+            self.complete[pos, j] = f.notna().all(axis=1).to_numpy()
+
+
+class PanelResult:
+    def __init__(self, panel: Panel, feats: Dict[str, np.ndarray], clp: np.ndarray, valid: np.ndarray,
+                 stress_thr: np.ndarray, extreme_thr: np.ndarray):
+        self.panel = panel
+        self.symbols = panel.symbols
+        self.times = panel.times
+        self.feats = feats
+        self.clp = np.where(valid, clp, np.nan)
+        self.valid = valid
+        self.stress_thr = stress_thr
+        self.extreme_thr = extreme_thr
+
+        self.regime = (self.clp > stress_thr).astype(np.uint8)
+        self.regime[self.clp > extreme_thr] = 2
+
+    def cross_section(self, top_pct: float = 0.10) -> pd.DataFrame:
+        return cross_section_frame(self.times, self.symbols, self.clp, self.regime, top_pct=top_pct)
+
+    def symbol_frame(self, symbol: str) -> pd.DataFrame:
+        j = self.symbols.index(symbol)
+        src = self.panel.frames[symbol]
+        pos = self.panel.positions[symbol]
+        keep = self.valid[pos, j]
+        rows = pos[keep]
+
+        cols = {c: src[c].array[keep] for c in src.columns}
+        for c in FEATURE_COLS:
+            cols[c] = self.feats[c][rows, j]
+        cols["clp"] = self.clp[rows, j]
+        if self.stress_thr.ndim == 2:
+            cols["stress_thr"] = self.stress_thr[rows, j]
+            cols["extreme_thr"] = self.extreme_thr[rows, j]
+        cols["regime"] = regime_categorical(self.regime[rows, j])
+        return pd.DataFrame(cols, index=src.index[keep], copy=False)
+
+    def latest_snapshots(self) -> List[dict]:
+        out = []
+        for j, sym in enumerate(self.symbols):
+            rows = np.flatnonzero(self.valid[:, j])
+            if not len(rows):
+                out.append({"symbol": sym, "error": "not enough data for the z-score window"})
+                continue
+            i = rows[-1]
+            thr = (i, j) if self.stress_thr.ndim == 2 else j
+            out.append({
+                "symbol": sym,
+                "time": pd.Timestamp(int(self.times[i]), unit="ms", tz="UTC"),
+                "price": float(self.panel.data["Close"][i, j]),
+                "funding": float(self.panel.data["fundingRate"][i, j]),
+                "oi": float(self.panel.data["openInterest"][i, j]),
+                "clp": float(self.clp[i, j]),
+                "regime": REGIMES[self.regime[i, j]],
+                "stress_thr": float(self.stress_thr[thr]),
+                "extreme_thr": float(self.extreme_thr[thr]),
+            })
+        return out
+
+
+def panel_thresholds(
+    clp: np.ndarray,
+    mode: str,
+    p_stress: float = 0.85,
+    p_extreme: float = 0.95,
+    k_stress: float = 1.0,
+    k_extreme: float = 2.0,
+) -> tuple[np.ndarray, np.ndarray]:
+    # thresholds_from_array() per column; NaN cells are ignored.
+    n = (~np.isnan(clp)).sum(axis=0)
+    stress = np.full(clp.shape[1], 0.8)
+    extreme = np.full(clp.shape[1], 1.8)
+    ok = n >= 80
+    if not ok.any():
+        return stress, extreme
+
+    x = clp[:, ok]
+    if mode == "percentile":
+        qs = np.nanquantile(x, [p_stress, p_extreme], axis=0)
+        stress[ok], extreme[ok] = qs[0], qs[1]
+    elif mode == "std":
+        mu = np.nanmean(x, axis=0)
+        sd = np.nanstd(x, axis=0)
+        stress[ok], extreme[ok] = mu + k_stress * sd, mu + k_extreme * sd
+    else:
+        raise ValueError("mode must be one of: percentile, std")
+    return stress, extreme
+
+
+def compute_panel(
+    panel: Panel,
+    zwin: int,
+    w_funding: float,
+    w_oi: float,
+    w_absret: float,
+    thr_mode: str,
+    p_stress: float = 0.85,
+    p_extreme: float = 0.95,
+    k_stress: float = 1.0,
+    k_extreme: float = 2.0,
+    thr_window: Optional[int] = None,
+) -> PanelResult:
+    close = panel.data["Close"]
+    ret = np.full(close.shape, np.nan)
+    ret[1:] = np.diff(np.log(close), axis=0)
+    abs_ret = np.abs(ret)
+    oi_chg = pct_change_2d(panel.data["openInterest"])
+
+    feats = {
+        "ret": ret,
+        "abs_ret": abs_ret,
+        "oi_chg_pct": oi_chg,
+        "z_funding": rolling_zscore_2d(panel.data["fundingRate"], zwin),
+        "z_oi": rolling_zscore_2d(oi_chg, zwin),
+        "z_absret": rolling_zscore_2d(abs_ret, zwin),
+    }
+    clp = w_funding * feats["z_funding"] + w_oi * feats["z_oi"] + w_absret * feats["z_absret"]
+
+    valid = panel.complete & ~np.isnan(clp)
+    for c in ("ret", "abs_ret", "oi_chg_pct"):
+        valid &= ~np.isnan(feats[c])
+
+    masked = np.where(valid, clp, np.nan)
+    if thr_window is None:
+        stress, extreme = panel_thresholds(
+            masked, thr_mode,
+            p_stress=p_stress, p_extreme=p_extreme,
+            k_stress=k_stress, k_extreme=k_extreme,
+        )
+    else:
+        # Per-bar (time x symbols) thresholds; each column only sees its own valid rows.
+        stress = np.full(clp.shape, np.nan)
+        extreme = np.full(clp.shape, np.nan)
+        for j in range(clp.shape[1]):
+            stress[:, j], extreme[:, j] = rolling_thresholds(
+                masked[:, j], thr_mode, thr_window,
+                p_stress=p_stress, p_extreme=p_extreme,
+                k_stress=k_stress, k_extreme=k_extreme,
+            )
+    return PanelResult(panel, feats, clp, valid, stress, extreme)
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, Hashable, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src import metrics
+from src.features import FEATURE_COLS, streaming_features
+from src.scoring import (
+    DEFAULT_THRESHOLDS,
+    get_threshold_engine,
+    regime_categorical,
+    regime_codes,
+    thresholds_from_array,
+)
+
+
+def compute_clp_frame(
+    df: pd.DataFrame,
+    key: Hashable,
+    zwin: int,
+    w_funding: float,
+    w_oi: float,
+    w_absret: float,
+    thr_mode: str,
+    p_stress: float = 0.85,
+    p_extreme: float = 0.95,
+    k_stress: float = 1.0,
+    k_extreme: float = 2.0,
+    feats: Optional[np.ndarray] = None,
+    thr_window: Optional[int] = None,
+) -> tuple[pd.DataFrame, float, float]:
+    # Fused add_features -> compute_clp -> dropna -> compute_thresholds -> add_regime:
+    # everything runs on arrays and each output column is allocated once, at the end.
+    if feats is None:
+        feats = streaming_features(df, key=key, zwin=zwin)
+    clp = w_funding * feats[:, 3]
+    clp += w_oi * feats[:, 4]
+    clp += w_absret * feats[:, 5]
+
+    valid = ~np.isnan(clp)
+    valid &= ~np.isnan(feats).any(axis=1)
+    for c in df.columns:
+        if df[c].dtype.kind == "f":
+            valid &= ~np.isnan(df[c].to_numpy())
+        else:
+            valid &= df[c].notna().to_numpy()
+
+    clp = clp[valid]
+    cols = {c: df[c].array[valid] for c in df.columns}
+    for j, c in enumerate(FEATURE_COLS):
+        cols[c] = feats[valid, j]
+    cols["clp"] = clp
+
+    if thr_window is None:
+        stress_thr, extreme_thr = thresholds_from_array(
+            clp, thr_mode,
+            p_stress=p_stress, p_extreme=p_extreme,
+            k_stress=k_stress, k_extreme=k_extreme,
+        )
+        cols["regime"] = regime_categorical(regime_codes(clp, stress_thr, extreme_thr))
+    else:
+        # Per-bar thresholds from a trailing (thr_window > 0) or expanding (0) window over
+        # this frame's valid bars, as rolling_thresholds() computes them in panel mode.
+        eng = get_threshold_engine(
+            (key, zwin, w_funding, w_oi, w_absret), thr_mode, thr_window,
+            p_stress, p_extreme, k_stress, k_extreme,
+        )
+        times = df["time"].values[valid].astype("datetime64[ms]").astype(np.int64)
+        stress, extreme = eng.ingest(times, clp)
+        cols["stress_thr"] = stress
+        cols["extreme_thr"] = extreme
+        cols["regime"] = regime_categorical(regime_codes(clp, stress, extreme))
+        stress_thr, extreme_thr = (float(stress[-1]), float(extreme[-1])) if len(clp) else DEFAULT_THRESHOLDS
+
+    out = pd.DataFrame(cols, index=df.index[valid], copy=False)
+    return out, stress_thr, extreme_thr
+
+
+def compute_snapshot(
+    symbol: str,
+    interval: str,
+    df: pd.DataFrame,
+    zwin: int,
+    wF: float,
+    wOI: float,
+    wR: float,
+    thr_mode: str,
+    p_stress: float,
+    p_extreme: float,
+    k_stress: float,
+    k_extreme: float,
+    feats: Optional[np.ndarray] = None,
+    thr_window: Optional[int] = None,
+) -> tuple[pd.DataFrame, dict]:
+    if feats is None:
+        with metrics.timer("stage_seconds", stage="features", symbol=symbol):
+            feats = streaming_features(df, key=(symbol, interval), zwin=zwin)
+    with metrics.timer("stage_seconds", stage="score", symbol=symbol):
+        df, stress_thr, extreme_thr = compute_clp_frame(
+            df, key=(symbol, interval), zwin=zwin,
+            w_funding=wF, w_oi=wOI, w_absret=wR,
+            thr_mode=thr_mode,
+            p_stress=p_stress, p_extreme=p_extreme,
+            k_stress=k_stress, k_extreme=k_extreme,
+            feats=feats, thr_window=thr_window,
+        )
+    latest = df.iloc[-1]
+
+    snap = {
+        "symbol": symbol,
+        "time": latest["time"],
+        "price": float(latest["Close"]),
+        "funding": float(latest.get("fundingRate", float("nan"))),
+        "oi": float(latest.get("openInterest", float("nan"))),
+        "clp": float(latest["clp"]),
+        "regime": str(latest["regime"]),
+        "stress_thr": float(stress_thr),
+        "extreme_thr": float(extreme_thr),
+    }
+    return df, snap
+
+
+def compute_watchlist(
+    raw: Dict[str, pd.DataFrame],
+    fetch_errors: Dict[str, str],
+    symbols: Iterable[str],
+    interval: str,
+    zwin: int,
+    wF: float,
+    wOI: float,
+    wR: float,
+    thr_mode: str,
+    p_stress: float,
+    p_extreme: float,
+    k_stress: float,
+    k_extreme: float,
+    thr_window: Optional[int] = None,
+    compute: Callable[..., tuple[pd.DataFrame, dict]] = compute_snapshot,
+) -> tuple[List[dict], Dict[str, pd.DataFrame]]:
+    snapshots, frames = [], {}
+    for sym in symbols:
+        if sym in fetch_errors:
+            snapshots.append({"symbol": sym, "error": fetch_errors[sym]})
+            continue
+        try:
+            df, snap = compute(
+                sym, interval, raw[sym], zwin,
+                wF, wOI, wR,
+                thr_mode, p_stress, p_extreme,
+                k_stress, k_extreme,
+                thr_window=thr_window,
+            )
+            frames[sym] = df
+            snapshots.append(snap)
+        except Exception as e:
+            snapshots.append({"symbol": sym, "error": str(e)})
+    return snapshots, frames
+
+
+def rank_watchlist(watch: pd.DataFrame) -> pd.DataFrame:
+    good = watch.drop(columns=["error"], errors="ignore")
+    if good.empty or "clp" not in good.columns:
+        return good
+    good = good.sort_values("clp", ascending=False).reset_index(drop=True)
+    good["rank"] = range(1, len(good) + 1)
+    return good
+
+
+def regime_grid(snapshots_by_interval: Dict[str, List[dict]]) -> pd.DataFrame:
+    # symbol x interval table of "Regime (CLP)" cells, one column per timeframe.
+    cells = {}
+    for interval, snapshots in snapshots_by_interval.items():
+        cells[interval] = {
+            s["symbol"]: f"{s['regime']} ({s['clp']:+.2f})" if "error" not in s else "—"
+            for s in snapshots
+        }
+    return pd.DataFrame(cells).rename_axis("symbol")
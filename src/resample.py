@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.bar_store import INTERVAL_MS
+from src.features import first_change
+
+# How each merged-frame column is aggregated into a higher interval. Funding and OI take
+# the value at the bucket open, which is what merge_asof gives a frame fetched directly
+# at that interval, so derived regimes match the single-timeframe ones.
+AGG = {
+    "Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum",
+    "fundingRate": "first", "openInterest": "first",
+}
+RESAMPLE_COLS = list(AGG)
+MAX_BASE_BARS = 20_000
+
+
+def _aggregate(t: np.ndarray, x: np.ndarray, step: int) -> Tuple[np.ndarray, np.ndarray]:
+    if not len(t):
+        return t, np.empty((0, x.shape[1]))
+    b = t // step * step
+    starts = np.r_[0, np.flatnonzero(np.diff(b)) + 1]
+    ends = np.r_[starts[1:], len(t)] - 1
+    out = np.empty((len(starts), x.shape[1]))
+    for j, how in enumerate(AGG.values()):
+        col = x[:, j]
+        if how == "first":
+            out[:, j] = col[starts]
+        elif how == "last":
+            out[:, j] = col[ends]
+        elif how == "max":
+            out[:, j] = np.maximum.reduceat(col, starts)
+        elif how == "min":
+            out[:, j] = np.minimum.reduceat(col, starts)
+        else:
+            out[:, j] = np.add.reduceat(col, starts)
+    return b[starts], out
+
+
+class Resampler:
+    # Incremental aggregation of a sliding base-interval merged frame into one higher
+    # interval. Buckets before the first changed base row (normally all but the open
+    # one) are reused; a leading partial bucket is dropped.
+    def __init__(self, base_interval: str, interval: str):
+        self.base = INTERVAL_MS[base_interval]
+        self.step = INTERVAL_MS[interval]
+        if self.step % self.base:
+            raise ValueError(f"{interval} is not a multiple of {base_interval}")
+        self.lock = threading.Lock()
+        self.times = np.empty(0, dtype=np.int64)
+        self.inputs = np.empty((0, len(RESAMPLE_COLS)))
+        self.out_t = np.empty(0, dtype=np.int64)
+        self.out_x = np.empty((0, len(RESAMPLE_COLS)))
+
+    def ingest(self, df: pd.DataFrame) -> pd.DataFrame:
+        t = df["time"].values.astype("datetime64[ms]").astype(np.int64)
+        x = df[RESAMPLE_COLS].to_numpy(dtype=float)
+        if len(t):
+            first = -(-int(t[0]) // self.step) * self.step
+            lo = int(np.searchsorted(t, first))
+            t, x = t[lo:], x[lo:]
+
+        with self.lock:
+            k, m = first_change(self.times, self.inputs, t, x)
+            if m == 0:
+                out_t, out_x = _aggregate(t, x, self.step)
+            else:
+                # Rebuild from the bucket holding the first changed row (at least the last one).
+                cut = t[min(m, len(t) - 1)] // self.step * self.step
+                i = int(np.searchsorted(t, cut))
+                keep_lo = int(np.searchsorted(self.out_t, t[0]))
+                keep_hi = int(np.searchsorted(self.out_t, cut))
+                new_t, new_x = _aggregate(t[i:], x[i:], self.step)
+                out_t = np.r_[self.out_t[keep_lo:keep_hi], new_t]
+                out_x = np.vstack([self.out_x[keep_lo:keep_hi], new_x])
+            self.times, self.inputs, self.out_t, self.out_x = t, x, out_t, out_x
+
+        out = pd.DataFrame(out_x, columns=RESAMPLE_COLS)
+        out.insert(0, "time", pd.to_datetime(out_t, unit="ms", utc=True))
+        return out
+
+
+MAX_RESAMPLERS = 512
+_resamplers: "OrderedDict[Hashable, Resampler]" = OrderedDict()
+_resamplers_lock = threading.Lock()
+
+
+def get_resampler(symbol: str, base_interval: str, interval: str) -> Resampler:
+    key = (symbol, base_interval, interval)
+    with _resamplers_lock:
+        r = _resamplers.get(key)
+        if r is None:
+            r = _resamplers[key] = Resampler(base_interval, interval)
+            while len(_resamplers) > MAX_RESAMPLERS:
+                _resamplers.popitem(last=False)
+        _resamplers.move_to_end(key)
+        return r
+
+
+def base_interval(intervals: Iterable[str]) -> str:
+    return min(intervals, key=INTERVAL_MS.__getitem__)
+
+
+def base_lookback(lookback: int, intervals: Iterable[str]) -> int:
+    # Enough base bars for every timeframe to get `lookback` bars of its own, capped at
+    # MAX_BASE_BARS (see derived_bars for what the coarser timeframes then get).
+    intervals = list(intervals)
+    ratio = max(INTERVAL_MS[i] for i in intervals) // INTERVAL_MS[base_interval(intervals)]
+    return min(lookback * ratio, MAX_BASE_BARS)
+
+
+def derived_bars(lookback: int, intervals: Iterable[str]) -> Dict[str, int]:
+    # Complete bars each timeframe ends up with from one base fetch (a leading partial
+    # bucket is dropped).
+    intervals = list(intervals)
+    base = INTERVAL_MS[base_interval(intervals)]
+    span = base_lookback(lookback, intervals) * base
+    return {i: min(lookback, span // INTERVAL_MS[i] - (INTERVAL_MS[i] > base)) for i in intervals}
+
+
+def usable_timeframes(lookback: int, intervals: Iterable[str], interval: str, min_bars: int) -> List[str]:
+    # Drops timeframes that would get fewer than min_bars bars. `interval` is always kept,
+    # so if it is the short one, the finer timeframes that forced the cap go first.
+    keep = sorted(set(intervals) | {interval}, key=INTERVAL_MS.__getitem__)
+    if derived_bars(lookback, keep)[interval] < min_bars:
+        keep = [i for i in keep if INTERVAL_MS[i] >= INTERVAL_MS[interval]]
+    bars = derived_bars(lookback, keep)
+    return [i for i in keep if i == interval or bars[i] >= min_bars]
+
+
+def resample_frames(
+    frames: Dict[str, pd.DataFrame],
+    base: str,
+    intervals: List[str],
+    lookback: int,
+) -> Dict[str, Dict[str, pd.DataFrame]]:
+    # {interval: {symbol: merged frame}}, each trimmed to the last `lookback` bars.
+    out: Dict[str, Dict[str, pd.DataFrame]] = {}
+    for interval in intervals:
+        if interval == base:
+            out[interval] = {sym: df.iloc[-lookback:].reset_index(drop=True) for sym, df in frames.items()}
+        else:
+            out[interval] = {
+                sym: get_resampler(sym, base, interval).ingest(df).iloc[-lookback:].reset_index(drop=True)
+                for sym, df in frames.items()
+            }
+    return out
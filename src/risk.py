@@ -19,4 +19,5 @@ def crowding_index(clp_series: pd.Series, top_pct: float = 0.10, min_n: int = 3)
     if len(heavy) == 0:
         return float("nan")
 
-    return float(np.mean(heavy) / denom)
\ No newline at end of file
+    return float(np.mean(heavy) / denom)
+
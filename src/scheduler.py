@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Mapping, Optional
+from urllib.parse import urlparse
+
+PRIORITY_LIVE = 0
+PRIORITY_BACKFILL = 1
+
+WEIGHT_LIMIT_1M = 2400
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+MAX_BLOCK_SECONDS = 60.0
+
+# Request weights per the USD-M futures docs; anything unknown counts as 1.
+ENDPOINT_WEIGHTS = {
+    "/fapi/v1/fundingRate": 1,
+    "/futures/data/openInterestHist": 1,
+    "/fapi/v1/exchangeInfo": 1,
+}
+
+
+class RateLimitedError(RuntimeError):
+    pass
+
+
+def request_weight(url: str, params: Mapping[str, Any]) -> int:
+    path = urlparse(url).path
+    if path == "/fapi/v1/klines":
+        limit = int(params.get("limit") or 500)
+        return 1 if limit < 100 else 2 if limit < 500 else 5 if limit <= 1000 else 10
+    if path == "/fapi/v1/premiumIndex":
+        return 1 if params.get("symbol") else 10
+    if path == "/fapi/v1/ticker/24hr":
+        return 1 if params.get("symbol") else 40
+    return ENDPOINT_WEIGHTS.get(path, 1)
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class WeightBudget:
+    # Client-side view of the 1-minute request-weight budget. Callers queue in priority
+    # order; the server's X-MBX-USED-WEIGHT-1M header keeps the estimate honest, and
+    # 429/418 responses block everyone until Retry-After has passed.
+    def __init__(self, limit: int = WEIGHT_LIMIT_1M, safety: float = 0.9):
+        self.limit = limit
+        self.safety = safety
+        self.used = 0
+        self.minute = int(time.time() // 60)
+        self.blocked_until = 0.0
+        self._cond = threading.Condition()
+        self._waiting: List[tuple] = []
+        self._seq = itertools.count()
+
+    def _roll(self, now: float) -> None:
+        minute = int(now // 60)
+        if minute != self.minute:
+            self.minute = minute
+            self.used = 0
+
+    def acquire(self, weight: int, priority: int = PRIORITY_LIVE) -> None:
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    now = time.time()
+                    self._roll(now)
+                    if now < self.blocked_until:
+                        if self.blocked_until - now > MAX_BLOCK_SECONDS:
+                            raise RateLimitedError(f"Binance rate limit: blocked for {self.blocked_until - now:.0f}s")
+                        timeout = self.blocked_until - now
+                    elif self._waiting[0] != ticket:
+                        timeout = 1.0
+                    elif self.used + weight > self.limit * self.safety:
+                        timeout = 60 - now % 60 + 0.05
+                    else:
+                        heapq.heappop(self._waiting)
+                        self.used += weight
+                        self._cond.notify_all()
+                        return
+                    self._cond.wait(timeout)
+            except BaseException:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+                raise
+
+    def record(self, headers: Mapping[str, str]) -> None:
+        used = headers.get("X-MBX-USED-WEIGHT-1M")
+        if used is None:
+            return
+        with self._cond:
+            self._roll(time.time())
+            self.used = max(self.used, int(used))
+
+    def penalize(self, retry_after: float) -> None:
+        with self._cond:
+            self.blocked_until = max(self.blocked_until, time.time() + retry_after)
+            self._cond.notify_all()
+
+
+class PriorityExecutor:
+    # ThreadPoolExecutor-style submit() with a priority queue in front of the workers.
+    # The priority is read from the call's own `priority` keyword (default live).
+    def __init__(self, max_workers: int, thread_name_prefix: str = "worker"):
+        self.max_workers = max_workers
+        self.thread_name_prefix = thread_name_prefix
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._threads: List[threading.Thread] = []
+        # One permit per worker waiting for a job; each submit claims one (as in
+        # ThreadPoolExecutor), so a burst starts new threads instead of queueing behind
+        # a single idle worker.
+        self._idle = threading.Semaphore(0)
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        fut: Future = Future()
+        self._queue.put((kwargs.get("priority", PRIORITY_LIVE), next(self._seq), fut, fn, args, kwargs))
+        if self._idle.acquire(blocking=False):
+            return fut
+        with self._lock:
+            if len(self._threads) < self.max_workers:
+                t = threading.Thread(
+                    target=self._work,
+                    name=f"{self.thread_name_prefix}_{len(self._threads)}",
+                    daemon=True,
+                )
+                self._threads.append(t)
+                t.start()
+        return fut
+
+    def _work(self) -> None:
+        while True:
+            _, _, fut, fn, args, kwargs = self._queue.get()
+            if fut.set_running_or_notify_cancel():
+                try:
+                    fut.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    fut.set_exception(e)
+            self._idle.release()
+
+
+_budget: Optional[WeightBudget] = None
+_budget_lock = threading.Lock()
+
+
+def get_budget() -> WeightBudget:
+    global _budget
+    if _budget is None:
+        with _budget_lock:
+            if _budget is None:
+                _budget = WeightBudget()
+    return _budget
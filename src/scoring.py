@@ -1,7 +1,18 @@
 from __future__ import annotations
 
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Hashable, List, Tuple
+
+import numpy as np
 import pandas as pd
 
+REGIMES = ["Normal", "Stress", "Extreme"]
+MIN_THRESHOLD_OBS = 80
+DEFAULT_THRESHOLDS = (0.8, 1.8)
+MAX_REWIND = 256
+
 
 def compute_clp(
     df: pd.DataFrame,
@@ -18,32 +29,216 @@ def compute_clp(
     return out
 
 
-def compute_thresholds(
-    series: pd.Series,
+def thresholds_from_array(
+    x: np.ndarray,
     mode: str,
     p_stress: float = 0.85,
     p_extreme: float = 0.95,
     k_stress: float = 1.0,
     k_extreme: float = 2.0,
 ) -> tuple[float, float]:
-    x = series.dropna().astype(float)
-    if len(x) < 80:
-        return 0.8, 1.8
+    x = x[~np.isnan(x)]
+    if len(x) < MIN_THRESHOLD_OBS:
+        return DEFAULT_THRESHOLDS
 
     if mode == "percentile":
-        return float(x.quantile(p_stress)), float(x.quantile(p_extreme))
+        qs = np.quantile(x, [p_stress, p_extreme])
+        return float(qs[0]), float(qs[1])
 
     if mode == "std":
         mu = float(x.mean())
-        sd = float(x.std(ddof=0))
+        sd = float(x.std())
         return mu + k_stress * sd, mu + k_extreme * sd
 
     raise ValueError("mode must be one of: percentile, std")
 
 
-def add_regime(df: pd.DataFrame, stress_thr: float, extreme_thr: float) -> pd.DataFrame:
+def compute_thresholds(
+    series: pd.Series,
+    mode: str,
+    p_stress: float = 0.85,
+    p_extreme: float = 0.95,
+    k_stress: float = 1.0,
+    k_extreme: float = 2.0,
+) -> tuple[float, float]:
+    return thresholds_from_array(
+        series.to_numpy(dtype=float),
+        mode,
+        p_stress=p_stress,
+        p_extreme=p_extreme,
+        k_stress=k_stress,
+        k_extreme=k_extreme,
+    )
+
+
+class RollingThresholds:
+    # Order statistics over a trailing window (window=0 means expanding) kept as a
+    # sorted list: each push/pop is a bisect plus one insert/delete, never a re-sort.
+    def __init__(
+        self,
+        mode: str,
+        window: int = 0,
+        p_stress: float = 0.85,
+        p_extreme: float = 0.95,
+        k_stress: float = 1.0,
+        k_extreme: float = 2.0,
+    ):
+        if mode not in ("percentile", "std"):
+            raise ValueError("mode must be one of: percentile, std")
+        self.mode = mode
+        self.window = int(window)
+        self.p = (p_stress, p_extreme)
+        self.k = (k_stress, k_extreme)
+        self.values: List[float] = []  # tail of the pushed series, enough to undo MAX_REWIND pushes
+        self.sorted: List[float] = []
+        self._sum = self._sumsq = 0.0
+        self._pushes = 0
+
+    def _add(self, x: float) -> None:
+        insort(self.sorted, x)
+        self._sum += x
+        self._sumsq += x * x
+
+    def _remove(self, x: float) -> None:
+        del self.sorted[bisect_left(self.sorted, x)]
+        self._sum -= x
+        self._sumsq -= x * x
+
+    def push(self, x: float) -> Tuple[float, float]:
+        self.values.append(x)
+        self._add(x)
+        if 0 < self.window < len(self.sorted):
+            self._remove(self.values[-1 - self.window])
+
+        keep = self.window + MAX_REWIND
+        if len(self.values) > 2 * keep:
+            del self.values[:-keep]
+        self._pushes += 1
+        if self._pushes % 4096 == 0:
+            # Running sums drift; resync them from the window every so often.
+            self._sum = float(np.sum(self.sorted))
+            self._sumsq = float(np.dot(self.sorted, self.sorted))
+        return self.current()
+
+    def pop(self) -> None:
+        self._remove(self.values.pop())
+        if 0 < self.window <= len(self.values):
+            self._add(self.values[-self.window])
+
+    def quantile(self, q: float) -> float:
+        # Same linear interpolation as np.quantile.
+        s = self.sorted
+        pos = q * (len(s) - 1)
+        lo = int(pos)
+        hi = min(lo + 1, len(s) - 1)
+        return s[lo] + (s[hi] - s[lo]) * (pos - lo)
+
+    def current(self) -> Tuple[float, float]:
+        n = len(self.sorted)
+        if n < MIN_THRESHOLD_OBS:
+            return DEFAULT_THRESHOLDS
+        if self.mode == "percentile":
+            return self.quantile(self.p[0]), self.quantile(self.p[1])
+        mu, sd = self.moments()
+        return mu + self.k[0] * sd, mu + self.k[1] * sd
+
+    def moments(self) -> Tuple[float, float]:
+        n = len(self.sorted)
+        mu = self._sum / n
+        return mu, max(self._sumsq / n - mu * mu, 0.0) ** 0.5
+
+
+def rolling_thresholds(
+    x: np.ndarray,
+    mode: str,
+    window: int = 0,
+    p_stress: float = 0.85,
+    p_extreme: float = 0.95,
+    k_stress: float = 1.0,
+    k_extreme: float = 2.0,
+) -> tuple[np.ndarray, np.ndarray]:
+    # Per-bar thresholds from the trailing window ending at that bar (no look-ahead).
+    # NaN entries are skipped and get NaN thresholds.
+    rt = RollingThresholds(mode, window, p_stress, p_extreme, k_stress, k_extreme)
+    stress = np.full(len(x), np.nan)
+    extreme = np.full(len(x), np.nan)
+    for i in np.flatnonzero(~np.isnan(x)):
+        stress[i], extreme[i] = rt.push(float(x[i]))
+    return stress, extreme
+
+
+class ThresholdEngine:
+    # Cached rolling_thresholds() for a frame that is refreshed in place. The output is a
+    # function of the frame alone: while the frame starts at the same bar, changed rows at
+    # the tail (normally just the open candle) are popped and re-pushed and new rows are
+    # pushed; once the start moves (the frame slid), it is recomputed from the new start.
+    def __init__(self, rt: RollingThresholds):
+        self.rt = rt
+        self.lock = threading.Lock()
+        self.times = np.empty(0, dtype=np.int64)
+        self.x = np.empty(0)
+        self.out = np.empty((0, 2))
+
+    def _reset(self) -> None:
+        rt = self.rt
+        self.rt = RollingThresholds(rt.mode, rt.window, *rt.p, *rt.k)
+
+    def ingest(self, times: np.ndarray, x: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        with self.lock:
+            m = 0
+            if len(self.times) and len(times) and self.times[0] == times[0]:
+                overlap = min(len(self.times), len(times))
+                same = (self.times[:overlap] == times[:overlap]) & (self.x[:overlap] == x[:overlap])
+                bad = np.flatnonzero(~same)
+                m = int(bad[0]) if len(bad) else overlap
+
+            undo = len(self.times) - m
+            if m == 0 or undo > MAX_REWIND:
+                self._reset()
+                m = 0
+            else:
+                for _ in range(undo):
+                    self.rt.pop()
+
+            out = np.empty((len(x), 2))
+            out[:m] = self.out[:m]
+            for i in range(m, len(x)):
+                out[i] = self.rt.push(float(x[i]))
+            self.times, self.x, self.out = times, x, out
+            return out[:, 0], out[:, 1]
+
+
+MAX_THRESHOLD_ENGINES = 512
+_threshold_engines: "OrderedDict[Hashable, ThresholdEngine]" = OrderedDict()
+_threshold_engines_lock = threading.Lock()
+
+
+def get_threshold_engine(key: Hashable, mode: str, window: int, p_stress: float, p_extreme: float,
+                         k_stress: float, k_extreme: float) -> ThresholdEngine:
+    full_key = (key, mode, window, p_stress, p_extreme, k_stress, k_extreme)
+    with _threshold_engines_lock:
+        eng = _threshold_engines.get(full_key)
+        if eng is None:
+            rt = RollingThresholds(mode, window, p_stress, p_extreme, k_stress, k_extreme)
+            eng = _threshold_engines[full_key] = ThresholdEngine(rt)
+            while len(_threshold_engines) > MAX_THRESHOLD_ENGINES:
+                _threshold_engines.popitem(last=False)
+        _threshold_engines.move_to_end(full_key)
+        return eng
+
+
+def regime_codes(clp: np.ndarray, stress_thr, extreme_thr) -> np.ndarray:
+    codes = (clp > stress_thr).astype(np.uint8)
+    codes[clp > extreme_thr] = 2
+    return codes
+
+
+def regime_categorical(codes: np.ndarray) -> pd.Categorical:
+    return pd.Categorical.from_codes(codes, categories=REGIMES)
+
+
+def add_regime(df: pd.DataFrame, stress_thr, extreme_thr) -> pd.DataFrame:
+    # Thresholds are scalars, or per-bar arrays aligned with df (see rolling_thresholds).
     out = df.copy()
-    out["regime"] = "Normal"
-    out.loc[out["clp"] > stress_thr, "regime"] = "Stress"
-    out.loc[out["clp"] > extreme_thr, "regime"] = "Extreme"
-    return out
\ No newline at end of file
+    out["regime"] = regime_categorical(regime_codes(out["clp"].to_numpy(), stress_thr, extreme_thr))
+    return out
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import glob
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Cross-process cache of raw merged frames for multi-worker deployments. Each entry is a
+# (1 + columns) x bars float64 .npy that every process memory-maps read-only, so N
+# Streamlit workers share one copy in the page cache. A small SQLite index holds the
+# current version and expiry per (symbol, interval, lookback); a per-key lock file makes
+# sure only one process refreshes an entry while the others wait and then attach.
+SHARED_CACHE_DIR = os.environ.get("CLP_SHARED_CACHE_DIR", "")
+FRAME_COLS = ["Open", "High", "Low", "Close", "Volume", "fundingRate", "openInterest"]
+
+Fetch = Callable[[List[str]], Tuple[Dict[str, Tuple[pd.DataFrame, float]], Dict[str, str]]]
+
+
+def _entry_key(symbol: str, interval: str, lookback: int) -> str:
+    return f"{symbol}_{interval}_{lookback}"
+
+
+class _KeyLock:
+    __slots__ = ("fd",)
+
+    def __init__(self, path: str):
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    def acquire(self, blocking: bool = True) -> bool:
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            else:
+                os.lseek(self.fd, 0, os.SEEK_SET)
+                while True:
+                    try:
+                        msvcrt.locking(self.fd, msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError:
+                        if not blocking:
+                            raise
+                        time.sleep(0.05)
+        except OSError:
+            os.close(self.fd)
+            return False
+        return True
+
+    def release(self) -> None:
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self.fd, 0, os.SEEK_SET)
+                msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self.fd)
+
+
+class SharedFrameCache:
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(root, "index.db"), timeout=30, check_same_thread=False)
+        # Switching a new index to WAL does not wait on the busy timeout, so workers
+        # starting together create it one at a time.
+        init = _KeyLock(os.path.join(root, "index.lock"))
+        init.acquire()
+        try:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, version INTEGER NOT NULL, rows INTEGER NOT NULL, "
+                "expires REAL NOT NULL, updated REAL NOT NULL) WITHOUT ROWID"
+            )
+            self.conn.commit()
+        finally:
+            init.release()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def _path(self, key: str, version: int) -> str:
+        return os.path.join(self.root, f"{key}.{version}.npy")
+
+    def lookup(self, keys: Iterable[str]) -> Dict[str, Tuple[int, float]]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        q = ",".join("?" * len(keys))
+        with self.lock:
+            rows = self.conn.execute(f"SELECT key, version, expires FROM entries WHERE key IN ({q})", keys).fetchall()
+        return {k: (v, e) for k, v, e in rows}
+
+    def attach(self, key: str, version: int) -> pd.DataFrame:
+        # Value columns are views of the mapping; only the time column is materialised.
+        arr = np.load(self._path(key, version), mmap_mode="r")
+        cols = {"time": pd.to_datetime(np.asarray(arr[0], dtype=np.int64), unit="ms", utc=True)}
+        cols.update({c: arr[j + 1] for j, c in enumerate(FRAME_COLS)})
+        return pd.DataFrame(cols, copy=False)
+
+    def publish(self, key: str, df: pd.DataFrame, expires: float) -> int:
+        # Caller holds the key lock. Old versions are unlinked, which leaves existing
+        # mappings in other processes valid (POSIX); on Windows the next publish retries.
+        arr = np.empty((1 + len(FRAME_COLS), len(df)))
+        arr[0] = df["time"].values.astype("datetime64[ms]").astype(np.int64)
+        for j, c in enumerate(FRAME_COLS):
+            arr[j + 1] = df[c].to_numpy(dtype=float)
+        prev = self.lookup([key]).get(key)
+        version = prev[0] + 1 if prev else 1
+        path = self._path(key, version)
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, arr)
+        os.replace(path + ".tmp", path)
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO entries (key, version, rows, expires, updated) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET version = excluded.version, rows = excluded.rows, "
+                "expires = excluded.expires, updated = excluded.updated",
+                (key, version, len(df), expires, time.time()),
+            )
+            self.conn.commit()
+        for old in glob.glob(os.path.join(self.root, glob.escape(key) + ".*.npy")):
+            if old != path:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+        return version
+
+    def _fresh(self, keys: Dict[str, str], now: float) -> Dict[str, Tuple[pd.DataFrame, float]]:
+        out = {}
+        for key, (version, expires) in self.lookup(keys).items():
+            if now < expires:
+                try:
+                    out[keys[key]] = (self.attach(key, version), expires)
+                except OSError:
+                    pass  # replaced between lookup and attach; refresh it
+        return out
+
+    def _refresh(self, symbols: List[str], keys: Dict[str, str], fetch: Fetch, now: float):
+        # Single-flight: re-check under the lock, since another process may have just published.
+        found = self._fresh({k: s for k, s in keys.items() if s in symbols}, now)
+        todo = [s for s in symbols if s not in found]
+        errors: Dict[str, str] = {}
+        if todo:
+            fetched, errors = fetch(todo)
+            self.refreshes += len(fetched)
+            inverse = {s: k for k, s in keys.items()}
+            for sym, (df, expires) in fetched.items():
+                key = inverse[sym]
+                found[sym] = (self.attach(key, self.publish(key, df, expires)), expires)
+        return found, errors
+
+    def frames(
+        self,
+        symbols: Iterable[str],
+        interval: str,
+        lookback: int,
+        fetch: Fetch,
+        now: Optional[float] = None,
+    ) -> Tuple[Dict[str, Tuple[pd.DataFrame, float]], Dict[str, str]]:
+        now = time.time() if now is None else now
+        keys = {_entry_key(s, interval, lookback): s for s in dict.fromkeys(symbols)}
+        out = self._fresh(keys, now)
+        for sym in keys.values():
+            hit = sym in out
+            self.hits += hit
+            self.misses += not hit
+            metrics.inc("cache_requests_total", layer="shared", symbol=sym, result="hit" if hit else "miss")
+
+        # Keys are locked in sorted order so waiters holding some locks cannot deadlock.
+        stale = sorted(k for k, s in keys.items() if s not in out)
+        errors: Dict[str, str] = {}
+        for blocking in (False, True):
+            locks = {k: _KeyLock(os.path.join(self.root, k + ".lock")) for k in stale}
+            with metrics.timer("shared_cache_lock_seconds", blocking=blocking):
+                held = [k for k in stale if locks[k].acquire(blocking)]
+            try:
+                # First pass refreshes what nobody else is refreshing in one batch; the
+                # second waits for the other holders and usually just attaches their result.
+                found, errs = self._refresh([keys[k] for k in held], keys, fetch, time.time())
+                out.update(found)
+                errors.update(errs)
+            finally:
+                for k in held:
+                    locks[k].release()
+            stale = [k for k in stale if k not in held]
+            if not stale:
+                break
+        for k in stale:
+            errors[keys[k]] = "could not lock shared cache entry"
+        return out, errors
+
+    def stats(self) -> Dict[str, object]:
+        with self.lock:
+            n, rows = self.conn.execute("SELECT count(*), coalesce(sum(rows), 0) FROM entries").fetchone()
+        return {"layer": "shared", "entries": n, "maxsize": None, "hits": self.hits, "misses": self.misses,
+                "refreshes": self.refreshes, "bytes": rows * 8 * (1 + len(FRAME_COLS))}
+
+
+_shared: Optional[SharedFrameCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_cache() -> Optional[SharedFrameCache]:
+    global _shared
+    if not SHARED_CACHE_DIR:
+        return None
+    with _shared_lock:
+        if _shared is None or _shared.root != SHARED_CACHE_DIR:
+            _shared = SharedFrameCache(SHARED_CACHE_DIR)
+        return _shared
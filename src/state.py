@@ -1,30 +1,279 @@
 from __future__ import annotations
 
 import os
-from datetime import datetime, timezone
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
 
 import pandas as pd
 
+from src import metrics
+
 SNAPSHOT_FILE = "snapshots.csv"
+SNAPSHOT_DB = "snapshots.db"
+
+COLUMNS = {
+    "symbol": "TEXT NOT NULL",
+    "rank": "INTEGER",
+    "price": "REAL",
+    "funding": "REAL",
+    "oi": "REAL",
+    "clp": "REAL",
+    "regime": "TEXT",
+    "stress_thr": "REAL",
+    "extreme_thr": "REAL",
+}
+
+# Per-symbol buckets maintained on every write, so history views never scan the raw log.
+ROLLUPS = {"1m": 60_000, "15m": 900_000, "1h": 3_600_000, "1d": 86_400_000}
+MAX_HISTORY_POINTS = 500
+
+_ROLLUP_UPSERT = """
+INSERT INTO snapshot_rollups
+    (resolution, bucket, symbol, n, n_clp, clp_min, clp_max, clp_sum, clp_last, price_last, last_ts,
+     n_normal, n_stress, n_extreme)
+VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (resolution, bucket, symbol) DO UPDATE SET
+    n = n + 1,
+    n_clp = n_clp + excluded.n_clp,
+    clp_min = CASE WHEN clp_min IS NULL OR excluded.clp_min < clp_min THEN excluded.clp_min ELSE clp_min END,
+    clp_max = CASE WHEN clp_max IS NULL OR excluded.clp_max > clp_max THEN excluded.clp_max ELSE clp_max END,
+    clp_sum = coalesce(clp_sum, 0) + coalesce(excluded.clp_sum, 0),
+    clp_last = CASE WHEN excluded.last_ts >= last_ts THEN excluded.clp_last ELSE clp_last END,
+    price_last = CASE WHEN excluded.last_ts >= last_ts THEN excluded.price_last ELSE price_last END,
+    last_ts = max(last_ts, excluded.last_ts),
+    n_normal = n_normal + excluded.n_normal,
+    n_stress = n_stress + excluded.n_stress,
+    n_extreme = n_extreme + excluded.n_extreme
+"""
+
+_init_lock = threading.Lock()
+_initialized: set = set()
+
+
+def _ms(ts: datetime) -> int:
+    ts = pd.Timestamp(ts)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+    return int(ts.value // 1_000_000)
+
+
+def connect(path: Optional[str] = None) -> sqlite3.Connection:
+    path = path or SNAPSHOT_DB
+    conn = sqlite3.connect(path, timeout=30)
+    with _init_lock:
+        if path not in _initialized:
+            _init_db(conn)
+            migrate_csv(conn)
+            _initialized.add(path)
+    return conn
+
+
+def _init_db(conn: sqlite3.Connection) -> None:
+    cols = ", ".join(f"{c} {t}" for c, t in COLUMNS.items())
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"CREATE TABLE IF NOT EXISTS snapshots (timestamp INTEGER NOT NULL, {cols})")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_snapshots_ts_symbol ON snapshots (timestamp, symbol)")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS snapshot_rollups ("
+        "resolution TEXT NOT NULL, bucket INTEGER NOT NULL, symbol TEXT NOT NULL, n INTEGER NOT NULL, "
+        "n_clp INTEGER NOT NULL, clp_min REAL, clp_max REAL, clp_sum REAL, clp_last REAL, price_last REAL, last_ts INTEGER NOT NULL, "
+        "n_normal INTEGER NOT NULL, n_stress INTEGER NOT NULL, n_extreme INTEGER NOT NULL, "
+        "PRIMARY KEY (resolution, bucket, symbol)) WITHOUT ROWID"
+    )
+    conn.commit()
+    # Databases written before rollups existed get them built once from the raw log.
+    if conn.execute("SELECT 1 FROM snapshot_rollups LIMIT 1").fetchone() is None:
+        with conn:
+            rebuild_rollups(conn)
+
+
+def rebuild_rollups(conn: sqlite3.Connection) -> None:
+    conn.execute("DELETE FROM snapshot_rollups")
+    for res, ms in ROLLUPS.items():
+        conn.execute(
+            "INSERT INTO snapshot_rollups "
+            "SELECT ?, b, symbol, count(*), count(clp), min(clp), max(clp), sum(clp), "
+            "max(CASE WHEN rn = 1 THEN clp END), max(CASE WHEN rn = 1 THEN price END), max(timestamp), "
+            "sum(regime = 'Normal'), sum(regime = 'Stress'), sum(regime = 'Extreme') "
+            "FROM (SELECT timestamp / ? * ? AS b, symbol, timestamp, clp, price, regime, "
+            "row_number() OVER (PARTITION BY timestamp / ?, symbol ORDER BY timestamp DESC) AS rn "
+            "FROM snapshots) GROUP BY b, symbol",
+            (res, ms, ms, ms),
+        )
+
+
+def _insert(conn: sqlite3.Connection, df: pd.DataFrame, ts_ms: Iterable[int]) -> None:
+    cols = list(COLUMNS)
+    rows = df.reindex(columns=cols)
+    rows = rows.astype(object).where(rows.notna(), None)
+    records = [(int(t), *r) for t, r in zip(ts_ms, rows.itertuples(index=False, name=None))]
+    conn.executemany(
+        f"INSERT INTO snapshots (timestamp, {', '.join(cols)}) VALUES ({', '.join('?' * (len(cols) + 1))})",
+        records,
+    )
 
+    i_sym, i_price, i_clp, i_regime = (cols.index(c) + 1 for c in ("symbol", "price", "clp", "regime"))
+    conn.executemany(_ROLLUP_UPSERT, [
+        (res, r[0] // ms * ms, r[i_sym], int(r[i_clp] is not None), r[i_clp], r[i_clp], r[i_clp], r[i_clp], r[i_price], r[0],
+         int(r[i_regime] == "Normal"), int(r[i_regime] == "Stress"), int(r[i_regime] == "Extreme"))
+        for r in records
+        for res, ms in ROLLUPS.items()
+    ])
 
-def append_snapshot(watch_df: pd.DataFrame) -> None:
+
+def migrate_csv(conn: sqlite3.Connection, csv_path: Optional[str] = None) -> int:
+    csv_path = csv_path or SNAPSHOT_FILE
+    if not os.path.exists(csv_path):
+        return 0
+
+    # Take the write lock first so two processes starting together cannot import twice.
+    conn.execute("BEGIN IMMEDIATE")
+    if not os.path.exists(csv_path):
+        conn.rollback()
+        return 0
+
+    old = pd.read_csv(csv_path)
+    if not old.empty and "timestamp" in old.columns:
+        ts = pd.to_datetime(old["timestamp"], utc=True, format="mixed")
+        _insert(conn, old, ts.astype("int64") // 1_000_000)
+    os.replace(csv_path, csv_path + ".migrated")
+    conn.commit()
+    return len(old)
+
+
+def append_snapshot(watch_df: pd.DataFrame, every_ms: Optional[int] = None) -> None:
+    # With every_ms, at most one row per symbol lands in each every_ms bucket, however many
+    # dashboard sessions log the same watchlist; the check runs under the write lock.
     if watch_df is None or watch_df.empty:
         return
 
-    snap = watch_df.copy()
-    snap["timestamp"] = datetime.now(timezone.utc)
+    ts = int(datetime.now(timezone.utc).timestamp() * 1000)
+    with metrics.timer("stage_seconds", stage="snapshot_write"):
+        conn = connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if every_ms:
+                day = ROLLUPS["1d"]
+                done = {s for (s,) in conn.execute(
+                    "SELECT symbol FROM snapshot_rollups WHERE resolution = '1d' AND bucket = ? AND last_ts >= ?",
+                    (ts // day * day, ts // every_ms * every_ms),
+                )}
+                watch_df = watch_df[~watch_df["symbol"].isin(done)]
+            if not watch_df.empty:
+                _insert(conn, watch_df, [ts] * len(watch_df))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+def _filters(
+    col: str,
+    hours: Optional[float],
+    since: Optional[datetime],
+    until: Optional[datetime],
+    symbols: Optional[Iterable[str]],
+) -> Tuple[List[str], list]:
+    if hours is not None:
+        since = datetime.now(timezone.utc) - timedelta(hours=hours)
+
+    where, params = [], []
+    if since is not None:
+        where.append(f"{col} >= ?")
+        params.append(_ms(since))
+    if until is not None:
+        where.append(f"{col} < ?")
+        params.append(_ms(until))
+    if symbols is not None:
+        symbols = list(symbols)
+        where.append(f"symbol IN ({', '.join('?' * len(symbols))})")
+        params.extend(symbols)
+    return where, params
 
-    if os.path.exists(SNAPSHOT_FILE):
-        old = pd.read_csv(SNAPSHOT_FILE)
-        snap = pd.concat([old, snap], ignore_index=True)
 
-    snap.to_csv(SNAPSHOT_FILE, index=False)
+def pick_resolution(span_ms: float, max_points: int = MAX_HISTORY_POINTS) -> str:
+    # Finest rollup that still fits the span into max_points buckets.
+    for res, ms in ROLLUPS.items():
+        if span_ms / ms <= max_points:
+            return res
+    return list(ROLLUPS)[-1]
 
 
-def load_snapshots() -> pd.DataFrame:
-    if not os.path.exists(SNAPSHOT_FILE):
+def load_history(
+    hours: Optional[float] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    symbols: Optional[Iterable[str]] = None,
+    resolution: Optional[str] = None,
+    max_points: int = MAX_HISTORY_POINTS,
+) -> Tuple[pd.DataFrame, str]:
+    # Bucketed history from the rollups; resolution=None picks one from the time range.
+    if not os.path.exists(SNAPSHOT_DB) and not os.path.exists(SNAPSHOT_FILE):
+        return pd.DataFrame(), resolution or list(ROLLUPS)[0]
+    if resolution is not None and resolution not in ROLLUPS:
+        raise ValueError(f"resolution must be one of: {', '.join(ROLLUPS)}")
+
+    where, params = _filters("bucket", hours, since, until, symbols)
+    with metrics.timer("stage_seconds", stage="history_read"):
+        conn = connect()
+        try:
+            if resolution is None:
+                lo, hi = conn.execute(
+                    "SELECT min(bucket), max(last_ts) FROM snapshot_rollups WHERE resolution = ?"
+                    + "".join(f" AND {w}" for w in where),
+                    [list(ROLLUPS)[-1], *params],
+                ).fetchone()
+                if hours is not None:
+                    lo = _ms(datetime.now(timezone.utc) - timedelta(hours=hours))
+                resolution = pick_resolution((hi - lo) if lo is not None and hi is not None else 0, max_points)
+            df = pd.read_sql_query(
+                "SELECT * FROM snapshot_rollups WHERE resolution = ?"
+                + "".join(f" AND {w}" for w in where) + " ORDER BY bucket",
+                conn, params=[resolution, *params],
+            )
+        finally:
+            conn.close()
+
+    if df.empty:
+        return pd.DataFrame(), resolution
+    df["bucket"] = pd.to_datetime(df["bucket"], unit="ms", utc=True)
+    df["last_ts"] = pd.to_datetime(df["last_ts"], unit="ms", utc=True)
+    # Rows logged without a CLP are in n but add nothing to clp_sum.
+    df["clp_mean"] = df["clp_sum"] / df["n_clp"].where(df["n_clp"] > 0)
+    return df.drop(columns=["resolution", "clp_sum", "n_clp"]), resolution
+
+
+def load_snapshots(
+    hours: Optional[float] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    symbols: Optional[Iterable[str]] = None,
+    limit: Optional[int] = None,
+) -> pd.DataFrame:
+    # limit keeps only the newest rows (still returned oldest first).
+    if not os.path.exists(SNAPSHOT_DB) and not os.path.exists(SNAPSHOT_FILE):
         return pd.DataFrame()
 
-    df = pd.read_csv(SNAPSHOT_FILE, parse_dates=["timestamp"])
-    return df.sort_values("timestamp")
\ No newline at end of file
+    where, params = _filters("timestamp", hours, since, until, symbols)
+    sql = "SELECT * FROM snapshots"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    if limit is not None:
+        sql = f"SELECT * FROM ({sql} ORDER BY timestamp DESC LIMIT {int(limit)})"
+    sql += " ORDER BY timestamp"
+
+    with metrics.timer("stage_seconds", stage="snapshot_read"):
+        conn = connect()
+        try:
+            df = pd.read_sql_query(sql, conn, params=params)
+        finally:
+            conn.close()
+
+    if df.empty:
+        return pd.DataFrame()
+    df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms", utc=True)
+    return df
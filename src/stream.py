@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from src.bar_store import get_store
+from src.binance_api import build_merged_frames, merge_frames
+from src.scheduler import backoff_delay
+
+FSTREAM_BASE = os.environ.get("CLP_FSTREAM_BASE", "wss://fstream.binance.com")
+MAX_STREAMS_PER_CONN = 200
+OI_POLL_SECONDS = 60.0
+IDLE_STOP_SECONDS = 300.0
+
+
+def stream_names(symbols: Iterable[str], interval: str) -> List[str]:
+    out = []
+    for sym in symbols:
+        s = sym.lower()
+        out += [f"{s}@kline_{interval}", f"{s}@markPrice@1s"]
+    return out
+
+
+class MarketStream:
+    # Keeps the watchlist's BarStores current from the combined kline + markPrice streams.
+    # OI still comes from REST, on a slower cadence, as does the exact settled funding: the
+    # stream's row is the last predicted rate and only stands in until REST returns it.
+    def __init__(self, symbols: Iterable[str], interval: str, lookback: int, oi_poll_seconds: float = OI_POLL_SECONDS):
+        self.symbols = list(dict.fromkeys(symbols))
+        self.interval = interval
+        self.lookback = lookback
+        self.oi_poll_seconds = oi_poll_seconds
+        self.errors: Dict[str, str] = {}
+        self.last_message = 0.0
+        self.last_access = time.time()
+        self.reconnects = 0
+        self.listeners: List[Callable[[str], None]] = []  # called with the symbol after each kline update
+        self._next_funding: Dict[str, Tuple[int, float]] = {}
+        self._stop = threading.Event()
+        self._catch_up = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._sockets: List[object] = []
+
+    def start(self) -> "MarketStream":
+        try:
+            import websocket  # noqa: F401
+        except ImportError as e:
+            raise RuntimeError("Streaming mode needs the websocket-client package") from e
+
+        self.refresh()
+        names = stream_names(self.symbols, self.interval)
+        for i in range(0, len(names), MAX_STREAMS_PER_CONN):
+            chunk = names[i:i + MAX_STREAMS_PER_CONN]
+            self._threads.append(threading.Thread(target=self._run_socket, args=(chunk,), daemon=True))
+        self._threads.append(threading.Thread(target=self._run_rest, daemon=True))
+        for t in self._threads:
+            t.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._catch_up.set()
+        for ws in list(self._sockets):
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+    @property
+    def running(self) -> bool:
+        return not self._stop.is_set()
+
+    def refresh(self) -> None:
+        res = build_merged_frames(self.symbols, interval=self.interval, lookback_limit=self.lookback)
+        self.errors = {sym: str(r) for sym, r in res.items() if isinstance(r, Exception)}
+
+    def frame(self, symbol: str, lookback: Optional[int] = None) -> Optional[pd.DataFrame]:
+        store = get_store(symbol, self.interval)
+        if symbol in self.errors or store.price is None:
+            return None
+        return merge_frames(*store.frames(min(lookback or self.lookback, self.lookback)))
+
+    def frames(self, lookback: Optional[int] = None) -> Tuple[Dict[str, pd.DataFrame], Dict[str, str]]:
+        self.last_access = time.time()
+        frames, errors = {}, dict(self.errors)
+        for sym in self.symbols:
+            try:
+                df = self.frame(sym, lookback)
+            except Exception as e:
+                errors[sym] = str(e)
+                continue
+            if df is not None:
+                frames[sym] = df
+        return frames, errors
+
+    def handle(self, msg: Union[str, bytes, dict]) -> None:
+        if not isinstance(msg, dict):
+            msg = json.loads(msg)
+        data = msg.get("data", msg)
+        event = data.get("e")
+        if event == "kline":
+            k = data["k"]
+            ok = get_store(data["s"], self.interval).apply_kline(
+                int(k["t"]), float(k["o"]), float(k["h"]), float(k["l"]), float(k["c"]), float(k["v"])
+            )
+            if not ok:
+                self._catch_up.set()
+            for fn in self.listeners:
+                fn(data["s"])
+        elif event == "markPriceUpdate":
+            sym, rate, next_time = data["s"], float(data["r"]), int(data["T"])
+            prev = self._next_funding.get(sym)
+            if prev is not None and next_time > prev[0]:
+                # The previous funding time has passed; its last predicted rate stands in
+                # (provisionally) for the settled one.
+                get_store(sym, self.interval).apply_funding(prev[0], prev[1])
+            self._next_funding[sym] = (next_time, rate)
+        else:
+            return
+        self.last_message = time.time()
+
+    def _run_socket(self, names: List[str]) -> None:
+        import websocket
+
+        attempt = 0
+        while not self._stop.is_set():
+            ws = None
+            try:
+                ws = websocket.create_connection(f"{FSTREAM_BASE}/stream", timeout=30)
+                self._sockets.append(ws)
+                ws.send(json.dumps({"method": "SUBSCRIBE", "params": names, "id": 1}))
+                if attempt:
+                    self.reconnects += 1
+                    self._catch_up.set()
+                attempt = 0
+                while not self._stop.is_set():
+                    raw = ws.recv()
+                    if raw:
+                        self.handle(raw)
+            except Exception:
+                if self._stop.is_set():
+                    break
+                attempt += 1
+                time.sleep(backoff_delay(min(attempt, 6), base=1.0, cap=30.0))
+            finally:
+                if ws is not None:
+                    if ws in self._sockets:
+                        self._sockets.remove(ws)
+                    try:
+                        ws.close()
+                    except Exception:
+                        pass
+
+    def _run_rest(self) -> None:
+        while not self._stop.is_set():
+            self._catch_up.wait(self.oi_poll_seconds)
+            self._catch_up.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.refresh()
+            except Exception:
+                pass
+
+
+_streams: Dict[Tuple[Tuple[str, ...], str], MarketStream] = {}
+_streams_lock = threading.Lock()
+
+
+def get_stream(symbols: Iterable[str], interval: str, lookback: int) -> MarketStream:
+    key = (tuple(symbols), interval)
+    with _streams_lock:
+        now = time.time()
+        for k, s in list(_streams.items()):
+            if k != key and now - s.last_access > IDLE_STOP_SECONDS:
+                s.stop()
+                del _streams[k]
+
+        stream = _streams.get(key)
+        if stream is not None and stream.running and lookback <= stream.lookback:
+            return stream
+        if stream is not None:
+            stream.stop()
+        stream = _streams[key] = MarketStream(key[0], interval, lookback).start()
+        return stream
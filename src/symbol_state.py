@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.features import FEATURE_COLS
+from src.scoring import REGIMES, regime_categorical
+
+PRICE_COLS = ["Close"]
+VALUE_COLS = ["fundingRate", "openInterest"] + FEATURE_COLS + ["clp", "stress_thr", "extreme_thr"]
+
+
+class SymbolState:
+    # Scored bars of one (symbol, interval) in preallocated fixed-capacity buffers: int64 ms
+    # times, float64 close, float32 inputs/features/CLP and uint8 regime codes. The buffers
+    # carry some slack past capacity and the live rows are shifted back to the front when
+    # the tail is reached, so the window is always one contiguous slice and frame() can
+    # hand pandas views instead of copies.
+    __slots__ = ("symbol", "interval", "capacity", "n", "head", "has_thresholds", "time", "cols", "regime")
+
+    def __init__(self, symbol: str, interval: str, capacity: int, slack: Optional[int] = None):
+        self.symbol = symbol
+        self.interval = interval
+        self.capacity = int(capacity)
+        self.n = 0
+        self.head = 0  # live rows are [head, head + n)
+        self.has_thresholds = False
+        size = self.capacity + (max(self.capacity // 4, 16) if slack is None else slack)
+        self.time = np.zeros(size, dtype=np.int64)
+        self.cols = {c: np.full(size, np.nan, dtype=np.float64) for c in PRICE_COLS}
+        self.cols.update({c: np.full(size, np.nan, dtype=np.float32) for c in VALUE_COLS})
+        self.regime = np.zeros(size, dtype=np.uint8)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, symbol: str, interval: str) -> "SymbolState":
+        # Exact-size, read-mostly copy (no slack), e.g. for cache entries.
+        return cls(symbol, interval, max(len(df), 1), slack=0).sync(df)
+
+    @property
+    def nbytes(self) -> int:
+        return self.time.nbytes + self.regime.nbytes + sum(a.nbytes for a in self.cols.values())
+
+    def _buffers(self):
+        yield self.time
+        yield self.regime
+        yield from self.cols.values()
+
+    def sync(self, df: pd.DataFrame) -> "SymbolState":
+        # Bring the buffers in line with a scored frame. Stored rows that are unchanged are
+        # kept (the window just slides); usually only the open candle and new bars are written.
+        df = df.iloc[-self.capacity:]
+        times = df["time"].values.astype("datetime64[ms]").astype(np.int64)
+        codes = _regime_codes(df["regime"])
+        values = {
+            c: (df[c].to_numpy(dtype=arr.dtype) if c in df.columns else np.full(len(df), np.nan, dtype=arr.dtype))
+            for c, arr in self.cols.items()
+        }
+        self.has_thresholds = "stress_thr" in df.columns
+
+        m = 0
+        if self.n and len(times):
+            lo = self.head
+            k = int(np.searchsorted(self.time[lo:lo + self.n], times[0]))
+            if k < self.n and self.time[lo + k] == times[0]:
+                a, b = lo + k, lo + min(self.n, k + len(times))
+                w = b - a
+                same = (self.time[a:b] == times[:w]) & (self.regime[a:b] == codes[:w])
+                for c, arr in self.cols.items():
+                    old, new = arr[a:b], values[c][:w]
+                    same &= (old == new) | (np.isnan(old) & np.isnan(new))
+                bad = np.flatnonzero(~same)
+                m = int(bad[0]) if len(bad) else w
+                self.head = a
+        if self.head + len(times) > len(self.time):
+            for buf in self._buffers():
+                buf[:m] = buf[self.head:self.head + m]
+            self.head = 0
+        self._write(m, times[m:], {c: v[m:] for c, v in values.items()}, codes[m:])
+        self.n = len(times)
+        return self
+
+    def _write(self, i: int, times: np.ndarray, values: Dict[str, np.ndarray], codes: np.ndarray) -> None:
+        sl = slice(self.head + i, self.head + i + len(times))
+        self.time[sl] = times
+        self.regime[sl] = codes
+        for c, arr in self.cols.items():
+            arr[sl] = values[c]
+
+    def frame(self, tail: Optional[int] = None) -> pd.DataFrame:
+        # Views into the buffers, valid until the next sync(); copy to keep or mutate.
+        n = self.n if tail is None else min(tail, self.n)
+        lo, hi = self.head + self.n - n, self.head + self.n
+        t = pd.DatetimeIndex(self.time[lo:hi].view("datetime64[ms]")).tz_localize("UTC")
+        cols = {"time": t}
+        for c, arr in self.cols.items():
+            if c in ("stress_thr", "extreme_thr") and not self.has_thresholds:
+                continue
+            cols[c] = arr[lo:hi]
+        cols["regime"] = regime_categorical(self.regime[lo:hi])
+        return pd.DataFrame(cols, copy=False)
+
+    def __getstate__(self) -> dict:
+        # Pickle only the live rows, not the whole preallocated buffers.
+        lo, hi = self.head, self.head + self.n
+        return {
+            "symbol": self.symbol, "interval": self.interval, "capacity": self.capacity,
+            "has_thresholds": self.has_thresholds, "time": self.time[lo:hi].copy(),
+            "cols": {c: a[lo:hi].copy() for c, a in self.cols.items()}, "regime": self.regime[lo:hi].copy(),
+        }
+
+    def __setstate__(self, d: dict) -> None:
+        SymbolState.__init__(self, d["symbol"], d["interval"], d["capacity"])
+        self._write(0, d["time"], d["cols"], d["regime"])
+        self.n = len(d["time"])
+        self.has_thresholds = d["has_thresholds"]
+
+
+def _regime_codes(r: pd.Series) -> np.ndarray:
+    if isinstance(r.dtype, pd.CategoricalDtype) and list(r.cat.categories) == REGIMES:
+        return r.cat.codes.to_numpy().astype(np.uint8)
+    return r.astype(str).map({name: i for i, name in enumerate(REGIMES)}).fillna(0).to_numpy().astype(np.uint8)
+
+
+MAX_STATES = 1024
+_states: "OrderedDict[Tuple[str, str], SymbolState]" = OrderedDict()
+_states_lock = threading.Lock()
+
+
+def get_state(symbol: str, interval: str, capacity: int) -> SymbolState:
+    key = (symbol, interval)
+    with _states_lock:
+        st = _states.get(key)
+        if st is None or st.capacity != capacity:
+            st = _states[key] = SymbolState(symbol, interval, capacity)
+            while len(_states) > MAX_STATES:
+                _states.popitem(last=False)
+        _states.move_to_end(key)
+        return st
+
+
+def sync_states(frames: Dict[str, pd.DataFrame], interval: str, capacity: int) -> Dict[str, SymbolState]:
+    return {sym: get_state(sym, interval, capacity).sync(df) for sym, df in frames.items()}
+
+
+def as_frame(x: Union[SymbolState, pd.DataFrame, None]) -> Optional[pd.DataFrame]:
+    return x.frame() if isinstance(x, SymbolState) else x
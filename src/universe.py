@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.binance_api import fetch_exchange_info, fetch_premium_index, fetch_ticker_24h
+
+EXCHANGE_INFO_TTL = 3600.0
+SCAN_TTL = 30.0
+MIN_QUOTE_VOLUME = 20_000_000.0  # USDT traded over 24h
+
+_lock = threading.Lock()
+_symbols: Tuple[float, List[str]] = (0.0, [])
+_scans: Dict[tuple, Tuple[float, pd.DataFrame]] = {}
+
+
+def perpetual_symbols(max_age: float = EXCHANGE_INFO_TTL) -> List[str]:
+    global _symbols
+    with _lock:
+        fetched, syms = _symbols
+    if syms and time.time() - fetched < max_age:
+        return syms
+    info = fetch_exchange_info()
+    keep = (info["contractType"] == "PERPETUAL") & (info["status"] == "TRADING") & (info["quoteAsset"] == "USDT")
+    syms = sorted(info.loc[keep, "symbol"])
+    with _lock:
+        _symbols = (time.time(), syms)
+    return syms
+
+
+def robust_z(x: pd.Series) -> pd.Series:
+    # Cross-sectional z-score around the median, scaled by MAD, so one outlier
+    # does not squash everyone else towards zero.
+    med = x.median()
+    mad = 1.4826 * (x - med).abs().median()
+    if not np.isfinite(mad) or mad == 0:
+        sd = x.std(ddof=0)
+        mad = sd if np.isfinite(sd) and sd > 0 else 1.0
+    return (x - med) / mad
+
+
+def scan_universe(
+    top_k: int = 20,
+    min_quote_volume: float = MIN_QUOTE_VOLUME,
+    w_funding: float = 0.5,
+    w_absret: float = 0.2,
+) -> pd.DataFrame:
+    # Three bulk requests (exchangeInfo is cached) instead of three per symbol. The
+    # prefilter is the CLP recipe minus the OI term, computed across symbols from the
+    # latest funding and 24h move; only the top_k go through the full history pipeline.
+    syms = set(perpetual_symbols())
+    df = fetch_premium_index().merge(fetch_ticker_24h(), on="symbol", how="inner")
+    df = df[df["symbol"].isin(syms)].copy()
+    df["liquid"] = df["quoteVolume"] >= min_quote_volume
+
+    liquid = df["liquid"]
+    df["z_funding"] = np.nan
+    df["z_absret"] = np.nan
+    if liquid.any():
+        df.loc[liquid, "z_funding"] = robust_z(df.loc[liquid, "lastFundingRate"])
+        df.loc[liquid, "z_absret"] = robust_z(df.loc[liquid, "priceChangePercent"].abs())
+
+    s = w_funding + w_absret
+    wf, wr = (w_funding / s, w_absret / s) if s > 0 else (0.5, 0.5)
+    df["score"] = wf * df["z_funding"] + wr * df["z_absret"]
+    df = df.sort_values("score", ascending=False, na_position="last").reset_index(drop=True)
+    df["candidate"] = False
+    df.loc[df.index[df["liquid"]][:top_k], "candidate"] = True
+    return df
+
+
+def cached_scan(
+    top_k: int = 20,
+    min_quote_volume: float = MIN_QUOTE_VOLUME,
+    w_funding: float = 0.5,
+    w_absret: float = 0.2,
+    max_age: float = SCAN_TTL,
+) -> pd.DataFrame:
+    key = (top_k, min_quote_volume, round(w_funding, 6), round(w_absret, 6))
+    with _lock:
+        hit = _scans.get(key)
+    if hit is not None and time.time() - hit[0] < max_age:
+        return hit[1]
+    df = scan_universe(top_k, min_quote_volume, w_funding, w_absret)
+    with _lock:
+        _scans.clear()
+        _scans[key] = (time.time(), df)
+    return df
+
+
+def candidates(scan: pd.DataFrame) -> List[str]:
+    return scan.loc[scan["candidate"], "symbol"].tolist()
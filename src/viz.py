@@ -1,24 +1,87 @@
 from __future__ import annotations
 
+from typing import Optional, Tuple
+
+import numpy as np
 import plotly.graph_objects as go
 import pandas as pd
 
+# Roughly two points per horizontal pixel of a wide chart; more is invisible.
+DEFAULT_MAX_POINTS = 2000
 
-def fig_price_and_clp(df: pd.DataFrame, stress_thr: float, extreme_thr: float) -> go.Figure:
-    fig = go.Figure()
 
-    fig.add_trace(go.Scatter(
-        x=df["time"], y=df["Close"],
-        name="Price (Close)", mode="lines", yaxis="y1"
-    ))
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    # Largest-Triangle-Three-Buckets: indices of n_out points that keep the visual shape
+    # (peaks and troughs survive, flat stretches collapse). First and last are always kept.
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    every = (n - 2) / (n_out - 2)
+    edges = (np.arange(n_out - 1) * every).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = hi, (edges[i + 2] if i + 2 < len(edges) else n)
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def downsample(
+    df: pd.DataFrame,
+    col: str,
+    max_points: Optional[int],
+    x_range: Optional[Tuple[pd.Timestamp, pd.Timestamp]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    d = df
+    if x_range is not None:
+        t = d["time"]
+        d = d[(t >= x_range[0]) & (t <= x_range[1])]
+    y = d[col].to_numpy(dtype=float)
+    rows = np.flatnonzero(~np.isnan(y))
+    if max_points and len(rows) > max_points:
+        # int64 view of the timestamps; to_numpy() on tz-aware times would box every value.
+        t = d["time"].values.astype("datetime64[ms]").astype(np.int64)
+        rows = rows[lttb(t[rows], y[rows], max_points)]
+    return d["time"].iloc[rows], y[rows]
+
 
-    fig.add_trace(go.Scatter(
-        x=df["time"], y=df["clp"],
-        name="CLP (Pressure)", mode="lines", yaxis="y2"
-    ))
+def _line(df: pd.DataFrame, col: str, max_points: Optional[int], x_range, gl: bool, **kw):
+    x, y = downsample(df, col, max_points, x_range)
+    trace = go.Scattergl if gl else go.Scatter
+    return trace(x=x, y=y, mode="lines", **kw)
 
-    fig.add_hline(y=stress_thr, line_dash="dash", annotation_text="Stress", yref="y2")
-    fig.add_hline(y=extreme_thr, line_dash="dot", annotation_text="Extreme", yref="y2")
+
+def fig_price_and_clp(
+    df: pd.DataFrame,
+    stress_thr: float,
+    extreme_thr: float,
+    max_points: Optional[int] = None,
+    x_range: Optional[Tuple[pd.Timestamp, pd.Timestamp]] = None,
+    gl: bool = False,
+) -> go.Figure:
+    fig = go.Figure()
+
+    fig.add_trace(_line(df, "Close", max_points, x_range, gl, name="Price (Close)", yaxis="y1"))
+    fig.add_trace(_line(df, "clp", max_points, x_range, gl, name="CLP (Pressure)", yaxis="y2"))
+
+    if "stress_thr" in df.columns:
+        # Rolling/expanding thresholds move bar by bar.
+        fig.add_trace(_line(df, "stress_thr", max_points, x_range, gl,
+                            name="Stress", line=dict(dash="dash"), yaxis="y2"))
+        fig.add_trace(_line(df, "extreme_thr", max_points, x_range, gl,
+                            name="Extreme", line=dict(dash="dot"), yaxis="y2"))
+    else:
+        fig.add_hline(y=stress_thr, line_dash="dash", annotation_text="Stress", yref="y2")
+        fig.add_hline(y=extreme_thr, line_dash="dot", annotation_text="Extreme", yref="y2")
 
     fig.update_layout(
         title="Price vs CLP (Crowded Leverage Pressure)",
@@ -27,15 +90,21 @@ def fig_price_and_clp(df: pd.DataFrame, stress_thr: float, extreme_thr: float) -
         yaxis2=dict(title="CLP", overlaying="y", side="right"),
         legend=dict(orientation="h"),
         margin=dict(l=30, r=30, t=60, b=30),
+        uirevision="price_clp",
     )
     return fig
 
 
-def fig_components(df: pd.DataFrame) -> go.Figure:
+def fig_components(
+    df: pd.DataFrame,
+    max_points: Optional[int] = None,
+    x_range: Optional[Tuple[pd.Timestamp, pd.Timestamp]] = None,
+    gl: bool = False,
+) -> go.Figure:
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=df["time"], y=df["z_funding"], name="z(Funding)", mode="lines"))
-    fig.add_trace(go.Scatter(x=df["time"], y=df["z_oi"], name="z(ΔOI%)", mode="lines"))
-    fig.add_trace(go.Scatter(x=df["time"], y=df["z_absret"], name="z(|return|)", mode="lines"))
+    fig.add_trace(_line(df, "z_funding", max_points, x_range, gl, name="z(Funding)"))
+    fig.add_trace(_line(df, "z_oi", max_points, x_range, gl, name="z(ΔOI%)"))
+    fig.add_trace(_line(df, "z_absret", max_points, x_range, gl, name="z(|return|)"))
 
     fig.update_layout(
         title="Components (Rolling Z-scores)",
@@ -43,5 +112,6 @@ def fig_components(df: pd.DataFrame) -> go.Figure:
         yaxis_title="Z-score",
         legend=dict(orientation="h"),
         margin=dict(l=30, r=30, t=60, b=30),
+        uirevision="components",
     )
-    return fig
\ No newline at end of file
+    return fig
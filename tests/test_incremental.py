@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+from src.features import FEATURE_COLS, add_oi_change, add_returns, add_zscores, clear_engines, streaming_features
+from src.insights import RegimeIndex, _runs
+from src.scoring import ThresholdEngine, RollingThresholds, regime_categorical, rolling_thresholds
+from src.symbol_state import SymbolState
+
+N, WINDOW = 700, 300
+HOUR = 3_600_000
+
+
+def _history(seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, N)))
+    oi = 1e6 * np.exp(np.cumsum(rng.normal(0, 0.02, N)))
+    oi[:5] = np.nan
+    funding = np.repeat(rng.normal(1e-4, 5e-5, N // 8 + 1), 8)[:N]
+    clp = np.cumsum(rng.normal(0, 0.3, N)) / 5
+    return pd.DataFrame({
+        "time": pd.to_datetime(np.arange(N) * HOUR, unit="ms", utc=True),
+        "Close": close, "fundingRate": funding, "openInterest": oi, "clp": clp,
+    })
+
+
+def _frames(hist: pd.DataFrame):
+    # What a live session sees: a sliding window whose last row is first a provisional
+    # open candle, then the bar as it closed.
+    for i in range(1, len(hist)):
+        frame = hist.iloc[max(0, i + 1 - WINDOW): i + 1].reset_index(drop=True)
+        live = frame.copy()
+        live.loc[len(live) - 1, ["Close", "clp"]] *= 1.003
+        live.loc[len(live) - 1, "openInterest"] *= 0.998
+        yield live
+        yield frame
+
+
+def _ms(df: pd.DataFrame) -> np.ndarray:
+    return df["time"].values.astype("datetime64[ms]").astype(np.int64)
+
+
+def test_threshold_engine_matches_batch():
+    hist = _history()
+    for mode, window in [("percentile", 0), ("percentile", 100), ("std", 0), ("std", 100)]:
+        eng = ThresholdEngine(RollingThresholds(mode, window))
+        for df in _frames(hist):
+            x = df["clp"].to_numpy()
+            got = eng.ingest(_ms(df), x)
+            want = rolling_thresholds(x, mode, window)
+            for g, w in zip(got, want):
+                np.testing.assert_allclose(g, w, rtol=1e-9, atol=1e-12)
+
+
+def test_threshold_engine_rewinds_a_revised_tail():
+    hist = _history()
+    eng = ThresholdEngine(RollingThresholds("percentile", 100))
+    x = hist["clp"].to_numpy()
+    eng.ingest(_ms(hist), x)
+    x = x.copy()
+    x[-50:] += 0.5
+    got = eng.ingest(_ms(hist), x)
+    for g, w in zip(got, rolling_thresholds(x, "percentile", 100)):
+        np.testing.assert_allclose(g, w, rtol=1e-9, atol=1e-12)
+
+
+def test_regime_index_matches_batch_runs():
+    hist = _history()
+    codes = np.digitize(hist["clp"].to_numpy(), [0.5, 1.5]).astype(np.int8)
+    idx = RegimeIndex()
+    for i in range(1, N):
+        lo = max(0, i + 1 - WINDOW)
+        live = codes[lo:i + 1].copy()
+        live[-1] = (live[-1] + 1) % 3
+        idx.ingest(_ms(hist)[lo:i + 1], live)
+        idx.ingest(_ms(hist)[lo:i + 1], codes[lo:i + 1])
+
+        starts, run_codes = _runs(codes[:i + 1])
+        assert idx.seg_start == starts.tolist()
+        assert idx.seg_code == run_codes.tolist()
+        assert idx.end == i + 1
+
+
+def test_symbol_state_sync_matches_frame():
+    hist = _history()
+    hist["regime"] = regime_categorical(np.digitize(hist["clp"].to_numpy(), [0.5, 1.5]))
+    st = SymbolState("BTCUSDT", "1h", WINDOW, slack=7)
+    for df in _frames(hist):
+        df["regime"] = regime_categorical(np.digitize(df["clp"].to_numpy(), [0.5, 1.5]))
+        out = st.sync(df).frame()
+        assert np.array_equal(_ms(out), _ms(df))
+        assert np.array_equal(out["regime"].cat.codes, df["regime"].cat.codes)
+        for c in ["Close", "fundingRate", "openInterest", "clp"]:
+            want = df[c].to_numpy(dtype=st.cols[c].dtype)
+            assert np.array_equal(out[c].to_numpy(), want, equal_nan=True), c
+
+
+def test_feature_engine_matches_batch():
+    clear_engines()
+    hist = _history()
+    zwin = 48
+    for df in _frames(hist):
+        got = streaming_features(df, key=("BTCUSDT", "1h"), zwin=zwin)
+        want = add_zscores(add_oi_change(add_returns(df)), zwin=zwin)[FEATURE_COLS].to_numpy()
+        np.testing.assert_allclose(got, want, rtol=1e-7, atol=1e-9)
+    clear_engines()
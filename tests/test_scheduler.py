@@ -0,0 +1,35 @@
+import threading
+import time
+
+from src.scheduler import PriorityExecutor
+
+
+def test_burst_after_warmup_runs_concurrently():
+    ex = PriorityExecutor(max_workers=32)
+    ex.submit(time.sleep, 0.01).result()  # leaves one idle worker behind
+
+    lock = threading.Lock()
+    active = [0, 0]  # current, peak
+
+    def job():
+        with lock:
+            active[0] += 1
+            active[1] = max(active[1], active[0])
+        time.sleep(0.2)
+        with lock:
+            active[0] -= 1
+
+    started = time.time()
+    for f in [ex.submit(job) for _ in range(48)]:
+        f.result()
+    assert active[1] == 32
+    assert time.time() - started < 1.0
+
+
+def test_idle_workers_are_reused():
+    ex = PriorityExecutor(max_workers=8)
+    for _ in range(3):
+        for f in [ex.submit(time.sleep, 0.05) for _ in range(4)]:
+            f.result()
+        time.sleep(0.05)  # let the workers go idle again
+    assert len(ex._threads) == 4